@@ -0,0 +1,257 @@
+"""
+Hackathon announcements stored as their own documents.
+
+Each announcement is `announcements/{id}` with its hackCode and a timestamp
+`expiresAt` next to the original `expiryDate` string, so the active ones come
+from a range query on the composite index (hackCode ASC, expiresAt ASC)
+instead of downloading the hackathon document and parsing every expiry. The
+index is declared in firestore.indexes.json; create it before deploying:
+
+    firebase deploy --only firestore:indexes
+
+A small feed document per hackathon, `announcementFeeds/{hackCode}`, keeps
+the expiry of every stored announcement and when the feed last changed.
+Pollers are answered from it alone: the ETag is derived from the announcement
+ids visible right now, and `since` compares against its timestamps, so an
+unchanged feed is a 304 after one small read.
+
+Expired announcements are moved to `announcementsArchive` by the sweeper,
+which runs in its own process:
+
+    python announcements.py
+
+or on a background thread of the app when ANNOUNCEMENT_SWEEPER_INPROCESS=true.
+Hackathons that still carry an `announcements` array are migrated the first
+time an announcement is posted to them, or all at once with:
+
+    python announcements.py migrate
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ANNOUNCEMENTS_COLLECTION = "announcements"
+ARCHIVE_COLLECTION = "announcementsArchive"
+FEEDS_COLLECTION = "announcementFeeds"
+SWEEP_INTERVAL = float(os.getenv("ANNOUNCEMENT_SWEEP_INTERVAL", "300"))
+SWEEP_BATCH_SIZE = 200  # up to two writes per announcement plus the feeds; Firestore allows 500 per batch
+SWEEPER_INPROCESS = os.getenv("ANNOUNCEMENT_SWEEPER_INPROCESS", "false").lower() == "true"
+
+# Fields kept only for indexing, not part of the API response
+_INDEX_FIELDS = ("hackCode", "expiresAt")
+
+
+def parse_expiry(value: str) -> datetime:
+    """ISO-8601 expiry ("Z" allowed) as an aware UTC datetime; raises ValueError"""
+    expiry = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if expiry.tzinfo is None:
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return expiry.astimezone(timezone.utc)
+
+
+def feed_ref(db, hack_code: str):
+    return db.collection(FEEDS_COLLECTION).document(hack_code)
+
+
+def public(record: Dict) -> Dict:
+    return {key: value for key, value in record.items() if key not in _INDEX_FIELDS}
+
+
+def _add_to_batch(db, batch, hack_code: str, announcements: List[Dict]):
+    now = datetime.now(timezone.utc)
+    expiries = {}
+    for announcement in announcements:
+        expires_at = parse_expiry(announcement["expiryDate"])
+        batch.set(db.collection(ANNOUNCEMENTS_COLLECTION).document(announcement["id"]),
+                  dict(announcement, hackCode=hack_code, expiresAt=expires_at))
+        expiries[announcement["id"]] = expires_at
+    batch.set(feed_ref(db, hack_code),
+              {"updatedAt": now, "expiries": expiries}, merge=True)
+
+
+def create(db, hack_code: str, announcement: Dict, legacy: Optional[List[Dict]] = None):
+    """Store an announcement; `legacy` is the hackathon's old announcements array, moved along with it"""
+    from google.cloud.firestore_v1 import DELETE_FIELD
+
+    legacy = list(_valid(legacy)) if legacy is not None else None
+    if legacy and len(legacy) >= SWEEP_BATCH_SIZE:
+        _migrate_hackathon(db, hack_code, legacy)
+        legacy = None
+    batch = db.batch()
+    _add_to_batch(db, batch, hack_code, (legacy or []) + [announcement])
+    if legacy is not None:
+        batch.update(db.collection("hackathons").document(hack_code), {"announcements": DELETE_FIELD})
+    metrics.commit(batch, f"{ANNOUNCEMENTS_COLLECTION},{FEEDS_COLLECTION}")
+
+
+def _migrate_hackathon(db, hack_code: str, legacy: List[Dict]):
+    from google.cloud.firestore_v1 import DELETE_FIELD
+
+    for i in range(0, len(legacy), SWEEP_BATCH_SIZE):
+        batch = db.batch()
+        _add_to_batch(db, batch, hack_code, legacy[i:i + SWEEP_BATCH_SIZE])
+        metrics.commit(batch, f"{ANNOUNCEMENTS_COLLECTION},{FEEDS_COLLECTION}")
+    db.collection("hackathons").document(hack_code).update({"announcements": DELETE_FIELD})
+
+
+def _valid(announcements: List[Dict]):
+    for announcement in announcements:
+        try:
+            parse_expiry(announcement["expiryDate"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning("Dropping announcement with unreadable expiry: %s", announcement.get("id"))
+            continue
+        yield announcement
+
+
+def visible_ids(feed: Dict, include_expired: bool, now: datetime) -> List[str]:
+    expiries = feed.get("expiries") or {}
+    return sorted(i for i, expires_at in expiries.items() if include_expired or expires_at > now)
+
+
+def version(feed: Dict, include_expired: bool, now: datetime) -> str:
+    """Announcements never change once posted, so the visible ids identify the response"""
+    return ",".join(visible_ids(feed, include_expired, now))
+
+
+def last_change(feed: Dict, include_expired: bool, now: datetime) -> datetime:
+    """When the response last changed: the latest post, sweep or (for active ones) expiry up to now"""
+    changes = [feed.get("updatedAt")]
+    if include_expired:
+        changes.append(feed.get("sweptAt"))
+    else:
+        changes.extend(e for e in (feed.get("expiries") or {}).values() if e <= now)
+    return max((c for c in changes if c is not None), default=now)
+
+
+def changed_since(feed: Dict, since: datetime, include_expired: bool, now: datetime) -> bool:
+    """Whether the response could differ from one served at `since`"""
+    if (feed.get("updatedAt") or since) > since:
+        return True
+    if include_expired:
+        return (feed.get("sweptAt") or since) > since
+    return any(since < expires_at <= now for expires_at in (feed.get("expiries") or {}).values())
+
+
+def active(db, hack_code: str, now: datetime) -> List[Dict]:
+    """Unexpired announcements of a hackathon, oldest first, from one range query"""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    query = (db.collection(ANNOUNCEMENTS_COLLECTION)
+             .where(filter=FieldFilter("hackCode", "==", hack_code))
+             .where(filter=FieldFilter("expiresAt", ">", now))
+             .order_by("expiresAt"))
+    records = [public(snapshot.to_dict()) for snapshot in metrics.stream(query, ANNOUNCEMENTS_COLLECTION)]
+    return sorted(records, key=lambda record: record.get("createdAt") or "")
+
+
+def stored(db, hack_code: str) -> List[Dict]:
+    """Every announcement of a hackathon not archived yet, oldest first"""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    query = db.collection(ANNOUNCEMENTS_COLLECTION).where(filter=FieldFilter("hackCode", "==", hack_code))
+    records = [public(snapshot.to_dict()) for snapshot in metrics.stream(query, ANNOUNCEMENTS_COLLECTION)]
+    return sorted(records, key=lambda record: record.get("createdAt") or "")
+
+
+def legacy_active(announcements: List[Dict], now: datetime) -> List[Dict]:
+    """Filter an old embedded announcements array"""
+    return [announcement for announcement in _valid(announcements)
+            if parse_expiry(announcement["expiryDate"]) > now]
+
+
+def sweep(db, now: Optional[datetime] = None) -> int:
+    """Move expired announcements to the archive; returns how many were moved"""
+    from google.cloud.firestore_v1 import DELETE_FIELD
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    now = now or datetime.now(timezone.utc)
+    moved = 0
+    while True:
+        query = (db.collection(ANNOUNCEMENTS_COLLECTION)
+                 .where(filter=FieldFilter("expiresAt", "<=", now)).limit(SWEEP_BATCH_SIZE))
+        expired = list(metrics.stream(query, ANNOUNCEMENTS_COLLECTION))
+        if not expired:
+            return moved
+        batch = db.batch()
+        feeds = {}
+        for snapshot in expired:
+            record = snapshot.to_dict()
+            batch.set(db.collection(ARCHIVE_COLLECTION).document(snapshot.id), dict(record, archivedAt=now))
+            batch.delete(snapshot.reference)
+            feed = feeds.setdefault(record["hackCode"], {"sweptAt": now, "expiries": {}})
+            feed["expiries"][snapshot.id] = DELETE_FIELD
+        for hack_code, fields in feeds.items():
+            # A merge, as in _add_to_batch: a missing feed must not fail the batch and stall every later sweep
+            batch.set(feed_ref(db, hack_code), fields, merge=True)
+        metrics.commit(batch, f"{ANNOUNCEMENTS_COLLECTION},{ARCHIVE_COLLECTION},{FEEDS_COLLECTION}")
+        moved += len(expired)
+
+
+def migrate(db) -> int:
+    """Move every hackathon's embedded announcements array into the collection; safe to re-run"""
+    migrated = 0
+    for hack_doc in db.collection("hackathons").stream():
+        legacy = (hack_doc.to_dict() or {}).get("announcements")
+        if legacy is None:
+            continue
+        valid = list(_valid(legacy))
+        _migrate_hackathon(db, hack_doc.id, valid)
+        migrated += len(valid)
+    return migrated
+
+
+class AnnouncementSweeper:
+    """Background thread that archives expired announcements every SWEEP_INTERVAL seconds"""
+
+    def __init__(self, db_factory, interval: float = SWEEP_INTERVAL):
+        self.db_factory = db_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="announcement-sweeper", daemon=True)
+        self._thread.start()
+        logger.info("Sweeping expired announcements every %.0f s", self.interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                moved = sweep(self.db_factory())
+                if moved:
+                    logger.info("Archived %d expired announcements", moved)
+            except Exception as e:
+                logger.error("Announcement sweep failed: %s", str(e))
+            self._stop.wait(self.interval)
+
+
+if __name__ == "__main__":
+    import sys
+    from logging_config import configure_logging
+    from app import get_db
+
+    configure_logging()
+    if sys.argv[1:] == ["migrate"]:
+        logger.info("Migrated %d announcements", migrate(get_db()))
+    else:
+        sweeper = AnnouncementSweeper(get_db)
+        sweeper.start()
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            sweeper.stop()
@@ -1,61 +1,147 @@
+import time
+_import_started = time.perf_counter()
+
 import os
-import jwt
+import copy
 import uuid
 import logging
 import re
 import sqlite3
-from flask import Flask, request, jsonify, render_template_string, g
+import threading
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, render_template_string, g
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
-from google.cloud import firestore
-from google.cloud.firestore import ArrayUnion, ArrayRemove, SERVER_TIMESTAMP, Transaction
 import json
 from email.message import EmailMessage
 import ssl
 import smtplib
 from datetime import datetime, timezone
-from plagiarism_checker import PlagiarismChecker, Config as PlagiarismConfig
-
-# --- Logging setup ---
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
+from auth import create_token, token_required
+from logging_config import configure_logging
+from services import cooperative_io, get_service
+from memberships import MEMBERSHIP_INDEX_FALLBACK, TeamIndex, membership_data, membership_ref
+import announcements
+import certificate_mail
+import certificates
+import compression
+import http_cache
+import json_provider
+import sponsors
+import submission_log
+from submission_buffer import BUFFER_READS, SaveNotConfirmed, SubmissionBuffer
+import metrics
+import tracing
+
+# --- Logging setup (LOG_LEVEL / LOG_LEVELS / LOG_SAMPLE_RATES / LOG_FORMAT) ---
+configure_logging()
 logger = logging.getLogger(__name__)
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "https://thecodeworks.in/hatch", "http://localhost:8000"]}})
+api = Blueprint("api", __name__)
 
-# --- Config ---
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
+# --- Service clients ---
+# Created lazily, once per process; see services.py
 
 # Firestore connection - Hybrid approach for local/cloud compatibility
-try:
-    # Try Firebase Admin SDK first (better for Cloud Run/App Engine)
-    import firebase_admin
-    from firebase_admin import credentials, firestore as admin_firestore
-    
-    cred = credentials.Certificate("firestore_credentials.json")
-    if not firebase_admin._apps:  # Prevent reinitialization
-        firebase_admin.initialize_app(cred)
-    db = admin_firestore.client()
-    
-    # Collections
-    hackathons_collection = db.collection("hackathons")
-    users_collection = db.collection("users")
-    logger.info("✅ Using Firebase Admin SDK")
-    
-except Exception as e:
-    # Fallback to client SDK (for local development)
-    logger.warning(f"⚠️ Falling back to client SDK: {e}")
+def connect_firestore():
     from google.cloud import firestore
-    db = firestore.Client.from_service_account_json("firestore_credentials.json")
-    hackathons_collection = db.collection("hackathons")
-    users_collection = db.collection("users")
+
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        # Local emulator (benchmarks, development): no credentials needed
+        logger.info("Using Firestore emulator at %s", os.getenv("FIRESTORE_EMULATOR_HOST"))
+        return firestore.Client(project=os.getenv("FIRESTORE_PROJECT", "hatch-local"))
+    try:
+        # Try Firebase Admin SDK first (better for Cloud Run/App Engine)
+        import firebase_admin
+        from firebase_admin import credentials, firestore as admin_firestore
+
+        cred = credentials.Certificate("firestore_credentials.json")
+        if not firebase_admin._apps:  # Prevent reinitialization
+            firebase_admin.initialize_app(cred)
+        client = admin_firestore.client()
+        logger.info("✅ Using Firebase Admin SDK")
+        return client
+    except Exception as e:
+        # Fallback to client SDK (for local development)
+        logger.warning(f"⚠️ Falling back to client SDK: {e}")
+        return firestore.Client.from_service_account_json("firestore_credentials.json")
+
+def get_db():
+    return get_service("firestore", connect_firestore)
+
+class LazyCollection:
+    """Firestore collection that connects on first use instead of at import"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        collection = get_service(f"collection:{self.name}",
+                                 lambda: metrics.InstrumentedCollection(get_db().collection(self.name)))
+        return getattr(collection, attr)
+
+# Collections
+hackathons_collection = LazyCollection("hackathons")
+users_collection = LazyCollection("users")
+
+# Firestore field transforms; the client library is only imported when one is used
+def ArrayUnion(values):
+    from google.cloud.firestore import ArrayUnion as _ArrayUnion
+    return _ArrayUnion(values)
+
+def ArrayRemove(values):
+    from google.cloud.firestore import ArrayRemove as _ArrayRemove
+    return _ArrayRemove(values)
+
+def server_timestamp():
+    from google.cloud.firestore import SERVER_TIMESTAMP
+    return SERVER_TIMESTAMP
+
+# Team registrations retried when a member document changes under them
+REGISTRATION_ATTEMPTS = int(os.getenv("REGISTRATION_ATTEMPTS", "3"))
+
+# teamId -> team lookups within a hackathon's registrations
+team_index = TeamIndex()
+
+def registered_team_id(db, hack_code, email, membership):
+    """teamId from a membership snapshot, falling back to the user's record for
+    registrations made before the membership index existed"""
+    if membership.exists:
+        return membership.to_dict().get("teamId")
+    if not MEMBERSHIP_INDEX_FALLBACK:
+        return None
+    user_doc = users_collection.document(email).get()
+    if not user_doc.exists:
+        return None
+    reg_entry = next(
+        (h for h in user_doc.to_dict().get("hackathonsRegistered", []) if h["hackCode"] == hack_code),
+        None
+    )
+    if not reg_entry:
+        return None
+    membership_ref(db, hack_code, email).set(membership_data(hack_code, email, reg_entry["teamId"]))
+    return reg_entry["teamId"]
+
+# Plagiarism checks run in-process through the plagiarism blueprint unless
+# PLAGIARISM_SERVICE_URL points at a separately deployed plagiarism service
+PLAGIARISM_SERVICE_URL = os.getenv("PLAGIARISM_SERVICE_URL", "").rstrip("/")
+PLAGIARISM_CHECK_TIMEOUT = int(os.getenv("PLAGIARISM_CHECK_TIMEOUT", "180"))
+
+def get_submission_buffer():
+    return get_service("submission_buffer", lambda: SubmissionBuffer(get_db))
+
+def get_certificate_renderer():
+    return get_service("certificate_renderer",
+                       lambda: certificates.CertificateRenderer(certificates.load_template(current_app.jinja_env)))
+
+def get_plagiarism_session():
+    import requests
+    return get_service("plagiarism_session", requests.Session)
 
 # Email credentials (use env vars ideally)
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS", "adi.profile1@gmail.com")  # Replace with your Gmail address
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "gwaryitmlyzygepr")   # Use app password (not your login password)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"  # false: plain SMTP, no login (local sinks)
 
 # --- DB helpers ---
 # --- SQLite setup for user authentication ---
@@ -74,38 +160,40 @@ def init_sqlite_db():
     conn.commit()
     conn.close()
 
-init_sqlite_db()
-
 def get_db_connection():
     """Get SQLite database connection"""
+    get_service("sqlite_users", init_sqlite_db)
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row  # Enable column access by name
     return conn
 
 # --- Auth helpers ---
-def create_token(user_id, email):
-    payload = {"user_id": user_id, "email": email}
-    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-
-def decode_token(token):
-    return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-
-def token_required(f):
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        auth_header = request.headers.get("Authorization", "")
-        if not auth_header.startswith("Bearer "):
-            return jsonify({"error": "Missing or invalid Authorization header"}), 401
-        token = auth_header.split(" ", 1)[1].strip()
-        try:
-            user = decode_token(token)
-            g.user = user
-        except jwt.InvalidTokenError:
-            return jsonify({"error": "Invalid token"}), 401
-        return f(*args, **kwargs)
-    return wrapper
+# create_token and token_required live in auth.py, shared with the plagiarism service
 
 # --- Email functionality ---
+def open_smtp():
+    """A connected (and, over SSL, logged in) SMTP session"""
+    if SMTP_USE_SSL:
+        smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT,
+                                context=get_service("smtp_ssl_context", ssl.create_default_context))
+        try:
+            smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+    return smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+
+def send_email(em, kind="generic"):
+    """Send a prepared EmailMessage over SMTP, recording latency and failures"""
+    try:
+        with tracing.span("smtp.send", kind=kind), metrics.SMTP_SEND_SECONDS.time(kind=kind):
+            with open_smtp() as smtp:
+                smtp.sendmail(EMAIL_ADDRESS, em["To"], em.as_string())
+    except Exception:
+        metrics.SMTP_SEND_FAILURES.inc(kind=kind)
+        raise
+
 def send_added_to_team_email(email_to, creator_name="Your team leader"):
     subject = "You're part of a team on Hatch!"
     body = f"""
@@ -126,10 +214,7 @@ def send_added_to_team_email(email_to, creator_name="Your team leader"):
     em["Subject"] = subject
     em.set_content(body, subtype="html")
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as smtp:
-        smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        smtp.sendmail(EMAIL_ADDRESS, email_to, em.as_string())
+    send_email(em, kind="team_added")
 
 # --- YouTube utility functions ---
 def extract_youtube_video_id(url):
@@ -171,11 +256,11 @@ def validate_youtube_url(url):
     return True, video_id, None
 
 # --- Routes ---
-@app.route("/", methods=["GET"])
+@api.route("/", methods=["GET"])
 def health():
     return jsonify({"status": "ok"})
 
-@app.route("/signup", methods=["POST"])
+@api.route("/signup", methods=["POST"])
 def signup():
     data = request.get_json(silent=True) or {}
     email = (data.get("email") or "").strip().lower()
@@ -206,7 +291,7 @@ def signup():
     except Exception as e:
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
-@app.route("/login", methods=["POST"])
+@api.route("/login", methods=["POST"])
 def login():
     data = request.get_json(silent=True) or {}
     email = (data.get("email") or "").strip().lower()
@@ -230,14 +315,14 @@ def login():
     except Exception as e:
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
-@app.route("/hack-create", methods=["POST"])
+@api.route("/hack-create", methods=["POST"])
 @token_required
 def hack_create():
     """Create a hackathon entry in Firestore"""
     data = request.get_json(silent=True) or {}
     user_email = g.user["email"]
 
-    logger.debug("Received hackathon create request from user=%s, data=%s", user_email, data)
+    logger.debug("Received hackathon create request from user=%s, fields=%s", user_email, sorted(data))
 
     # generate unique code
     hack_code = "HACK-" + uuid.uuid4().hex[:8].upper()
@@ -246,7 +331,9 @@ def hack_create():
     hackathon_doc = data.copy()
     hackathon_doc["hackCode"] = hack_code
     hackathon_doc["admins"] = [user_email]
-    hackathon_doc["createdAt"] = SERVER_TIMESTAMP
+    hackathon_doc["createdAt"] = server_timestamp()
+    if "sponsors" in hackathon_doc:
+        hackathon_doc["sponsors"] = sponsors.registry(hackathon_doc["sponsors"])
 
     try:
         doc_ref = hackathons_collection.document(hack_code)
@@ -265,159 +352,183 @@ def hack_create():
             "event": hackathon_doc
         }), 500
 
-@app.route("/allHacks", methods=["GET"])
+@api.route("/allHacks", methods=["GET"])
 def get_all_hacks():
     try:
-        docs = hackathons_collection.stream()
-        hacks = []
-        for doc in docs:
-            hack_data = doc.to_dict()
-            hack_data["id"] = doc.id  # Add document ID
-            hacks.append(hack_data)
-        return jsonify(hacks)
+        docs = list(hackathons_collection.stream())
+
+        def build():
+            hacks = []
+            for doc in docs:
+                hack_data = sponsors.with_list(doc.to_dict())
+                hack_data["id"] = doc.id  # Add document ID
+                hacks.append(hack_data)
+            return hacks
+
+        return http_cache.cached_json("allHacks", [(doc.id, doc.update_time) for doc in docs], build)
     except Exception as e:
         logger.error("Error fetching hackathons: %s", str(e))
         return jsonify({"error": "Failed to fetch hackathons", "details": str(e)}), 500
 
-@app.route("/fetchhack", methods=["GET"])
+@api.route("/fetchhack", methods=["GET"])
 def fetch_hack():
     hack_code = request.args.get("hackCode")  # expects ?hackCode=HACK-12345
     if not hack_code:
         return jsonify({"error": "hackCode is required"}), 400
     
+    db = get_db()
+    now = datetime.now(timezone.utc)
     try:
-        doc = hackathons_collection.document(hack_code).get()
+        doc, feed_doc = metrics.get_all(db, [db.collection("hackathons").document(hack_code),
+                                             announcements.feed_ref(db, hack_code)])
         if not doc.exists:
             return jsonify({"error": "Hackathon not found"}), 404
-        
-        hack = doc.to_dict()
-        hack["id"] = doc.id
-        return jsonify(hack)
+        pointers = submission_log.latest_snapshots(db, hack_code)
+        feed = feed_doc.to_dict() or {}
+
+        def build():
+            hack = sponsors.with_list(submission_log.overlay_latest(db, hack_code, doc.to_dict(), pointers))
+            hack["id"] = doc.id
+            if "announcements" not in hack:
+                try:
+                    hack["announcements"] = announcements.active(db, hack_code, now)
+                except Exception as e:
+                    # e.g. the announcements index is missing or building; the hackathon is still served
+                    logger.error("Error fetching announcements of %s: %s", hack_code, str(e))
+                    hack["announcements"] = []
+                    raise http_cache.Degraded(hack)
+            return hack
+
+        # The hackathon, its teams' latest submissions and its visible announcements
+        version = (doc.update_time, sorted((p.id, p.update_time) for p in pointers),
+                   announcements.version(feed, False, now))
+        return http_cache.cached_json(f"fetchhack:{hack_code}", version, build)
     except Exception as e:
         logger.error("Error fetching hackathon %s: %s", hack_code, str(e))
         return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
 
 
-@app.route("/registerteam", methods=["POST"])
+@api.route("/registerteam", methods=["POST"])
 @token_required
 def register_team():
+    from google.api_core.exceptions import AlreadyExists
+
     data = request.get_json(silent=True) or {}
     hack_code = data.get("hackCode")
     if not hack_code:
         return jsonify({"error": "hackathonCode is required"}), 400
 
-    # Fetch hackathon
-    try:
-        hack_doc = hackathons_collection.document(hack_code).get()
-        if not hack_doc.exists:
-            return jsonify({"error": "Hackathon not found"}), 404
-        hack = hack_doc.to_dict()
-    except Exception as e:
-        logger.error("Error fetching hackathon: %s", str(e))
-        return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
-
     team_leader = data.get("teamLeader", {})
     team_members = data.get("teamMembers", [])
-    all_members = [team_leader] + team_members
-    final_members = []
-    
+
     # validate leader first
     leader_email = (team_leader.get("email") or "").lower().strip()
     if not leader_email:
         return jsonify({"error": "Team leader email required"}), 400
 
-    try:
-        leader_doc = users_collection.document(leader_email).get()
-        if leader_doc.exists:
-            leader_data = leader_doc.to_dict()
-            if any(h["hackCode"] == hack_code for h in leader_data.get("hackathonsRegistered", [])):
-                return jsonify({"error": f"Leader {leader_email} already registered in this hackathon"}), 400
-    except Exception as e:
-        logger.error("Error checking leader registration: %s", str(e))
-        return jsonify({"error": "Failed to validate leader", "details": str(e)}), 500
+    # Normalized emails, leader first; a member listed twice is registered once
+    members = []
+    seen = set()
+    for member in [team_leader] + team_members:
+        email = (member.get("email") or "").lower().strip()
+        if email and email not in seen:
+            seen.add(email)
+            members.append((email, member))
 
     # Generate unique teamId (before looping so we can use it for each user)
     team_id = str(uuid.uuid4())
-
-    # check and update each member
-    for member in all_members:
-        email = (member.get("email") or "").lower().strip()
-        if not email:
-            continue
-        
+    registration = {"hackCode": hack_code, "teamId": team_id}
+
+    db = get_db()
+    hack_ref = db.collection("hackathons").document(hack_code)
+    membership_refs = [membership_ref(db, hack_code, email) for email, _ in members]
+    user_refs = [db.collection("users").document(email) for email, _ in members]
+
+    # One read for the hackathon, every membership and every member, one
+    # atomic commit for all writes. Membership documents are created, not
+    # overwritten, so a concurrent registration of the same person makes the
+    # commit fail as a whole and the check runs again.
+    for attempt in range(1, REGISTRATION_ATTEMPTS + 1):
         try:
-            user_doc = users_collection.document(email).get()
+            snapshots = metrics.get_all(db, [hack_ref] + membership_refs + user_refs)
+        except Exception as e:
+            logger.error("Error fetching registration documents: %s", str(e))
+            return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
+
+        hack_snapshot = snapshots[0]
+        if not hack_snapshot.exists:
+            return jsonify({"error": "Hackathon not found"}), 404
+        membership_docs = snapshots[1:len(members) + 1]
+        user_docs = snapshots[len(members) + 1:]
+
+        batch = db.batch()
+        final_members = []
+        for (email, member), membership, user_ref, user_doc in zip(members, membership_docs, user_refs, user_docs):
+            user_data = user_doc.to_dict() if user_doc.exists else {}
+            already_registered = membership.exists or (
+                MEMBERSHIP_INDEX_FALLBACK
+                and any(h["hackCode"] == hack_code for h in user_data.get("hackathonsRegistered", []))
+            )
+            if already_registered:
+                # skip member already registered
+                if email == leader_email:
+                    return jsonify({"error": f"Leader {leader_email} already registered in this hackathon"}), 400
+                continue
+            batch.create(membership.reference, membership_data(hack_code, email, team_id))
             if user_doc.exists:
-                user_data = user_doc.to_dict()
-                if any(h["hackCode"] == hack_code for h in user_data.get("hackathonsRegistered", [])):
-                    # skip member already registered
-                    if email == leader_email:
-                        return jsonify({"error": f"Leader {email} already registered"}), 400
-                    continue
-                else:
-                    # add hackathon with teamId (atomic operation)
-                    users_collection.document(email).update({
-                        "hackathonsRegistered": ArrayUnion([{
-                            "hackCode": hack_code,
-                            "teamId": team_id
-                        }])
-                    })
+                # add hackathon with teamId
+                batch.update(user_ref, {"hackathonsRegistered": ArrayUnion([registration])})
             else:
-                # create new user (with proper timestamp)
-                users_collection.document(email).set({
+                # create new user (with proper timestamp); fails if someone created it meanwhile
+                batch.create(user_ref, {
                     "email": email,
-                    "hackathonsRegistered": [{
-                        "hackCode": hack_code,
-                        "teamId": team_id
-                    }],
+                    "hackathonsRegistered": [registration],
                     "hackathonsCreated": [],
-                    "createdAt": SERVER_TIMESTAMP
+                    "createdAt": server_timestamp()
                 })
             final_members.append(member)
+
+        if not final_members or (final_members[0].get("email") or "").lower().strip() != leader_email:
+            return jsonify({"error": "Team leader missing or invalid after validation"}), 400
+
+        # Construct team registration object
+        team_obj = {
+            "teamId": team_id,
+            "teamName": data.get("teamName"),
+            "teamLeader": final_members[0],
+            "teamMembers": final_members[1:],  # rest after leader
+            "paymentDetails": data.get("paymentDetails", {}),
+        }
+        batch.update(hack_ref, {"registrations": ArrayUnion([team_obj])})
+
+        try:
+            metrics.commit(batch, "hackathons,memberships,users")
+            break
+        except AlreadyExists as e:
+            logger.warning("Registration for %s conflicted with a concurrent write (attempt %d): %s",
+                           hack_code, attempt, str(e))
         except Exception as e:
-            logger.error("Error processing member %s: %s", email, str(e))
-            return jsonify({"error": f"Failed to process member {email}", "details": str(e)}), 500
+            logger.error("Error registering team: %s", str(e))
+            return jsonify({"error": "Failed to register team", "details": str(e)}), 500
+    else:
+        return jsonify({"error": "Team members changed during registration, please retry"}), 409
 
-        # Send email notification
+    # Send email notifications once the registration is committed
+    creator_name = team_leader.get("name", "Your team leader")
+    for member in final_members:
+        email = (member.get("email") or "").lower().strip()
         try:
-            creator_name = team_leader.get("name", "Your team leader")
             send_added_to_team_email(email_to=email, creator_name=creator_name)
         except Exception as e:
             logger.error(f"❌ Email failed to {email}: {str(e)}")
 
-    if not final_members or final_members[0].get("email") != leader_email:
-        return jsonify({"error": "Team leader missing or invalid after validation"}), 400
-
-    # Construct team registration object
-    team_obj = {
-        "teamId": team_id,
-        "teamName": data.get("teamName"),
-        "teamLeader": final_members[0],
-        "teamMembers": final_members[1:],  # rest after leader
-        "paymentDetails": data.get("paymentDetails", {}),
-    }
-
-    # Insert into hackathon registrations
-    try:
-        hack_ref = hackathons_collection.document(hack_code)
-        hack_data = hack_doc.to_dict()
-        
-        # Initialize registrations array if it doesn't exist
-        if "registrations" not in hack_data:
-            hack_data["registrations"] = []
-        
-        hack_ref.update({"registrations": ArrayUnion([team_obj])})
-    except Exception as e:
-        logger.error("Error updating hackathon registrations: %s", str(e))
-        return jsonify({"error": "Failed to register team", "details": str(e)}), 500
-
     return jsonify({
         "message": "Team registered successfully",
         "team": team_obj
     }), 201
 
 
-@app.route("/managehack", methods=["POST"])
+@api.route("/managehack", methods=["POST"])
 @token_required
 def manage_hack():
     """
@@ -454,13 +565,20 @@ def manage_hack():
     # --- handle actions ---
     if action == "view":
         # show hackathon details including registrations
+        try:
+            hack = sponsors.with_list(submission_log.overlay_latest(get_db(), hack_code, hack))
+        except Exception as e:
+            logger.error("Error fetching submissions: %s", str(e))
+            return jsonify({"error": "Failed to fetch submissions", "details": str(e)}), 500
         hack["id"] = hack_code  # make JSON safe
-        return jsonify(hack), 200
+        return json_provider.stream_response(current_app.json, hack), 200
 
     elif action == "update":
         update_fields = data.get("updateFields", {})
         if not update_fields:
             return jsonify({"error": "updateFields is required for update action"}), 400
+        if "sponsors" in update_fields:
+            update_fields["sponsors"] = sponsors.registry(update_fields["sponsors"])
         try:
             hackathons_collection.document(hack_code).update(update_fields)
             return jsonify({"message": "Hackathon updated successfully"}), 200
@@ -498,7 +616,7 @@ def manage_hack():
 
     else:
         return jsonify({"error": f"Unknown action: {action}"}), 400
-@app.route("/getTeamDetails", methods=["POST"])
+@api.route("/getTeamDetails", methods=["POST"])
 @token_required
 def get_team_details():
     data = request.get_json(silent=True) or {}
@@ -508,55 +626,29 @@ def get_team_details():
     if not email or not hack_code:
         return jsonify({"error": "email and hackCode are required"}), 400
 
-    # --- Step 1: Check users collection for email ---
+    # --- Membership and hackathon, in one round trip ---
+    db = get_db()
     try:
-        user_doc_ref = users_collection.document(email)
-        user_doc = user_doc_ref.get()
-        if not user_doc.exists:
-            return jsonify({
-                "message": "User not found",
-                "registrationStatus": "no",
-                "team": None
-            }), 200
-        user_data = user_doc.to_dict()
+        membership, hackathon_doc = metrics.get_all(
+            db, [membership_ref(db, hack_code, email), db.collection("hackathons").document(hack_code)])
+        team_id = registered_team_id(db, hack_code, email, membership)
     except Exception as e:
-        logger.error("Error fetching user: %s", str(e))
+        logger.error("Error fetching membership: %s", str(e))
         return jsonify({"error": "Failed to fetch user", "details": str(e)}), 500
 
-    # --- Step 2: Verify hackCode in hackathonsRegistered ---
-    user_data = user_doc.to_dict()
-    hackathons_registered = user_data.get("hackathonsRegistered", [])
-    reg_entry = next(
-        (h for h in hackathons_registered if h["hackCode"] == hack_code),
-        None
-    )
-
-    if not reg_entry:
+    if not team_id:
         return jsonify({
             "message": f"User {email} is not registered in hackathon {hack_code}",
             "registrationStatus": "no",
             "team": None
         }), 200
 
-    team_id = reg_entry["teamId"]
-
-    # --- Step 3: Fetch hackathon from Firestore ---
-    try:
-        hackathon_doc_ref = hackathons_collection.document(hack_code)
-        hackathon_doc = hackathon_doc_ref.get()
-        if not hackathon_doc.exists:
-            return jsonify({"error": "Hackathon not found"}), 404
-        hackathon_data = hackathon_doc.to_dict()
-        hackathon_data["id"] = hackathon_doc.id
-    except Exception as e:
-        logger.error("Error fetching hackathon: %s", str(e))
-        return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
+    if not hackathon_doc.exists:
+        return jsonify({"error": "Hackathon not found"}), 404
+    hackathon_data = hackathon_doc.to_dict()
+    hackathon_data["id"] = hackathon_doc.id
 
-    # --- Step 4: Find team details inside hackathon.registrations ---
-    team_details = next(
-        (t for t in hackathon_data.get("registrations", []) if t["teamId"] == team_id),
-        None
-    )
+    team_details = team_index.find(hack_code, hackathon_doc, hackathon_data.get("registrations", []), team_id)
 
     return jsonify({
         "message": "Team details fetched successfully",
@@ -571,7 +663,7 @@ def get_team_details():
         "team": team_details
     }), 200
 
-@app.route("/leaveTeam", methods=["POST"])
+@api.route("/leaveTeam", methods=["POST"])
 @token_required
 def leave_team():
     data = request.get_json(silent=True) or {}
@@ -581,88 +673,63 @@ def leave_team():
     if not hack_code or not email:
         return jsonify({"error": "hackCode and email are required"}), 400
 
-    # --- Users collection ---
+    # --- Membership and hackathon, in one round trip ---
+    db = get_db()
+    hack_ref = db.collection("hackathons").document(hack_code)
     try:
-        user_doc_ref = users_collection.document(email)
-        user_doc = user_doc_ref.get()
-        if not user_doc.exists:
-            return jsonify({"error": f"User {email} not found"}), 404
-        user_data = user_doc.to_dict()
+        membership, hack_doc = metrics.get_all(db, [membership_ref(db, hack_code, email), hack_ref])
+        team_id = registered_team_id(db, hack_code, email, membership)
     except Exception as e:
-        logger.error("Error fetching user: %s", str(e))
+        logger.error("Error fetching membership: %s", str(e))
         return jsonify({"error": "Failed to fetch user", "details": str(e)}), 500
 
-    reg_entry = next(
-        (h for h in user_data.get("hackathonsRegistered", []) if h["hackCode"] == hack_code),
-        None
-    )
-    if not reg_entry:
+    if not team_id:
         return jsonify({"error": f"User {email} not registered in hackathon {hack_code}"}), 404
+    if not hack_doc.exists:
+        return jsonify({"error": "Hackathon not found"}), 404
+    hack = hack_doc.to_dict()
 
-    team_id = reg_entry["teamId"]
-
-    # --- Hackathon collection ---
-    try:
-        hack_doc = hackathons_collection.document(hack_code).get()
-        if not hack_doc.exists:
-            return jsonify({"error": "Hackathon not found"}), 404
-        hack = hack_doc.to_dict()
-    except Exception as e:
-        logger.error("Error fetching hackathon: %s", str(e))
-        return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
-
-    team = next((t for t in hack.get("registrations", []) if t["teamId"] == team_id), None)
+    registrations = hack.get("registrations", [])
+    team = team_index.find(hack_code, hack_doc, registrations, team_id)
     if not team:
         return jsonify({"error": "Team not found"}), 404
 
     # --- Remove user from team ---
-    try:
-        if team.get("teamLeader", {}).get("email") == email:
-            # If leader leaves, promote first member if exists, else delete team
-            if team.get("teamMembers"):
-                new_leader = team["teamMembers"].pop(0)
-                team["teamLeader"] = new_leader
-                hackathons_collection.document(hack_code).update({"registrations": hack["registrations"]})
-            else:
-                # delete team entirely
-                registrations = [r for r in hack.get("registrations", []) if r["teamId"] != team_id]
-                hackathons_collection.document(hack_code).update({"registrations": registrations})
+    if team.get("teamLeader", {}).get("email") == email:
+        # If leader leaves, promote first member if exists, else delete team
+        if team.get("teamMembers"):
+            team["teamLeader"] = team["teamMembers"].pop(0)
         else:
-            # Remove from teamMembers
-            team["teamMembers"] = [m for m in team.get("teamMembers", []) if m.get("email") != email]
+            registrations = [r for r in registrations if r["teamId"] != team_id]
+    else:
+        # Remove from teamMembers
+        team["teamMembers"] = [m for m in team.get("teamMembers", []) if m.get("email") != email]
 
-            # If no members + no leader → delete team
-            if not team.get("teamMembers") and not team.get("teamLeader"):
-                registrations = [r for r in hack.get("registrations", []) if r["teamId"] != team_id]
-                hackathons_collection.document(hack_code).update({"registrations": registrations})
-            else:
-                # Otherwise, update team with new members
-                for i, reg in enumerate(hack.get("registrations", [])):
-                    if reg["teamId"] == team_id:
-                        hack["registrations"][i] = team
-                        break
-                hackathons_collection.document(hack_code).update({"registrations": hack["registrations"]})
-    except Exception as e:
-        logger.error("Error updating team: %s", str(e))
-        return jsonify({"error": "Failed to update team", "details": str(e)}), 500
+        # If no members + no leader → delete team
+        if not team.get("teamMembers") and not team.get("teamLeader"):
+            registrations = [r for r in registrations if r["teamId"] != team_id]
 
-    # --- Remove hackathon from user's record (atomic operation) ---
+    # --- Team, user record and membership change together ---
     try:
-        users_collection.document(email).update({
+        batch = db.batch()
+        batch.update(hack_ref, {"registrations": registrations})
+        batch.update(db.collection("users").document(email), {
             "hackathonsRegistered": ArrayRemove([{
                 "hackCode": hack_code,
                 "teamId": team_id
             }])
         })
+        batch.delete(membership_ref(db, hack_code, email))
+        metrics.commit(batch, "hackathons,memberships,users")
     except Exception as e:
-        logger.error("Error updating user record: %s", str(e))
-        return jsonify({"error": "Failed to update user record", "details": str(e)}), 500
+        logger.error("Error updating team: %s", str(e))
+        return jsonify({"error": "Failed to update team", "details": str(e)}), 500
 
     return jsonify({
         "message": f"{email} left team {team_id} in hackathon {hack_code} successfully"
     }), 200
 
-@app.route("/submissions", methods=["POST"])
+@api.route("/submissions", methods=["POST"])
 @token_required
 def submissions():
     data = request.get_json(silent=True) or {}
@@ -685,52 +752,49 @@ def submissions():
         return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
 
     # Find the team inside registrations
-    team = next((t for t in hack.get("registrations", []) if t["teamId"] == team_id), None)
+    team = team_index.find(hack_code, hack_doc, hack.get("registrations", []), team_id)
     if not team:
         return jsonify({"error": "Team not found"}), 404
 
-    # Ensure submissions array exists
-    if "submissions" not in team:
-        team["submissions"] = []
-
-    # Check if phaseIndex already exists
-    existing = next((s for s in team["submissions"] if s["phaseId"] == phase_index), None)
-    if existing:
-        existing["submissions"] = submission_content
-    else:
-        team["submissions"].append({
-            "phaseId": phase_index,
-            "submissions": submission_content
-        })
-
-    # Update team in DB
+    # Append a new version; earlier ones stay in the team's submission log.
+    # Saves arriving together are written in one batch, and this returns once
+    # the batch holding this save (or a newer one of the same phase) is committed.
     try:
-        # Find and update the specific team
-        for i, reg in enumerate(hack.get("registrations", [])):
-            if reg["teamId"] == team_id:
-                hack["registrations"][i] = team
-                break
-        hackathons_collection.document(hack_code).update({"registrations": hack["registrations"]})
+        version = get_submission_buffer().save(
+            hack_code, team_id, phase_index, submission_content, g.user["email"])
+    except SaveNotConfirmed as e:
+        logger.error("Submission not confirmed: %s", str(e))
+        return jsonify({"error": "Submission not confirmed yet, please retry", "details": str(e)}), 503
     except Exception as e:
-        logger.error("Error updating submission: %s", str(e))
+        logger.error("Error saving submission: %s", str(e))
         return jsonify({"error": "Failed to save submission", "details": str(e)}), 500
 
     return jsonify({
         "message": "Submission saved successfully",
         "teamId": team_id,
         "phaseIndex": phase_index,
-        "submission": submission_content
+        "versionId": version["versionId"],
+        "submission": version["submissions"]
     }), 200
 
 
-@app.route("/fetchsubmissions", methods=["GET"])
+@api.route("/fetchsubmissions", methods=["GET"])
 @token_required
 def fetch_submissions():
+    """
+    Latest submission of every phase, or with ?phaseId=N&history=true the
+    saved versions of one phase, newest first (?limit=, and ?before=<nextCursor>
+    for the following page).
+    """
     hack_code = request.args.get("hackCode")
     team_id = request.args.get("teamId")
+    phase_id = request.args.get("phaseId", type=int)
+    want_history = request.args.get("history", "false").lower() == "true"
 
     if not hack_code or not team_id:
         return jsonify({"error": "hackCode and teamId are required"}), 400
+    if want_history and phase_id is None:
+        return jsonify({"error": "phaseId is required for history"}), 400
 
     try:
         hack_doc = hackathons_collection.document(hack_code).get()
@@ -741,16 +805,41 @@ def fetch_submissions():
         logger.error("Error fetching hackathon: %s", str(e))
         return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
 
-    team = next((t for t in hack.get("registrations", []) if t["teamId"] == team_id), None)
+    team = team_index.find(hack_code, hack_doc, hack.get("registrations", []), team_id)
     if not team:
         return jsonify({"error": "Team not found"}), 404
 
+    try:
+        if want_history:
+            versions, next_cursor = submission_log.history(
+                get_db(), hack_code, team_id, phase_id,
+                limit=request.args.get("limit", submission_log.HISTORY_PAGE_SIZE, type=int),
+                before=request.args.get("before"))
+            return jsonify({
+                "teamId": team_id,
+                "phaseId": phase_id,
+                "versions": versions,
+                "nextCursor": next_cursor
+            }), 200
+
+        # Submissions saved before the log existed are still embedded in the team
+        pointers = submission_log.team_latest(get_db(), hack_code, team_id)
+        if BUFFER_READS:
+            pointers += get_submission_buffer().pending(hack_code, team_id)
+        entries = submission_log.merge_entries(list(team.get("submissions", [])), pointers)
+    except Exception as e:
+        logger.error("Error fetching submissions: %s", str(e))
+        return jsonify({"error": "Failed to fetch submissions", "details": str(e)}), 500
+
+    if phase_id is not None:
+        entries = [entry for entry in entries if entry.get("phaseId") == phase_id]
+
     return jsonify({
         "teamId": team_id,
-        "submissions": team.get("submissions", [])
+        "submissions": entries
     }), 200
 
-@app.route("/announcements", methods=["POST"])
+@api.route("/announcements", methods=["POST"])
 def create_announcement():
     data = request.json
     hack_code = data.get("hackCode")
@@ -783,15 +872,10 @@ def create_announcement():
         hack_doc = hackathons_collection.document(hack_code).get()
         if not hack_doc.exists:
             return jsonify({"error": "Hackathon not found"}), 404
-        
-        hack_data = hack_doc.to_dict()
-        
-        # Initialize announcements array if it doesn't exist
-        if "announcements" not in hack_data:
-            hack_data["announcements"] = []
-        
-        hackathons_collection.document(hack_code).update({"announcements": ArrayUnion([announcement])})
-        
+
+        # Announcements still embedded in the hackathon move to the collection with this one
+        announcements.create(get_db(), hack_code, announcement, legacy=hack_doc.to_dict().get("announcements"))
+
         return jsonify({"message": "Announcement created successfully", "announcement": announcement}), 201
         
     except Exception as e:
@@ -799,43 +883,57 @@ def create_announcement():
         return jsonify({"error": "Failed to create announcement", "details": str(e)}), 500
 
 
-@app.route("/announcements", methods=["GET"])
+@api.route("/announcements", methods=["GET"])
 def get_announcements():
+    """
+    Active announcements (all not yet archived with ?includeExpired=true).
+    Pollers send If-None-Match with the last ETag, or ?since=<asOf of the
+    last response>, and get a 304 when nothing changed.
+    """
     hack_code = request.args.get("hackCode")
     include_expired = request.args.get("includeExpired", "false").lower() == "true"
 
     if not hack_code:
         return jsonify({"error": "hackCode is required"}), 400
 
+    since = request.args.get("since")
+    if since:
+        try:
+            since = announcements.parse_expiry(since)
+        except ValueError:
+            return jsonify({"error": "Invalid since format"}), 400
+
+    now = datetime.now(timezone.utc)
+    db = get_db()
     try:
-        hackathon_doc = hackathons_collection.document(hack_code).get()
-        if not hackathon_doc.exists:
-            return jsonify({"error": "Hackathon not found"}), 404
-        hackathon = hackathon_doc.to_dict()
+        feed_doc = announcements.feed_ref(db, hack_code).get()
+        if not feed_doc.exists:
+            # Nothing posted since announcements moved out of the hackathon document
+            hackathon_doc = hackathons_collection.document(hack_code).get()
+            if not hackathon_doc.exists:
+                return jsonify({"error": "Hackathon not found"}), 404
+            legacy = hackathon_doc.to_dict().get("announcements", [])
+            items = list(legacy) if include_expired else announcements.legacy_active(legacy, now)
+            return jsonify({"announcements": items}), 200
+
+        feed = feed_doc.to_dict()
+        key = f"announcements:{hack_code}:{include_expired}"
+        version = announcements.version(feed, include_expired, now)
+        if since and not announcements.changed_since(feed, since, include_expired, now):
+            return http_cache.not_modified(http_cache.etag_for(key, version))
+
+        def build():
+            items = announcements.stored(db, hack_code) if include_expired else announcements.active(db, hack_code, now)
+            as_of = announcements.last_change(feed, include_expired, now)
+            return {"announcements": items, "asOf": as_of.isoformat().replace("+00:00", "Z")}
+
+        return http_cache.cached_json(key, version, build)
     except Exception as e:
-        logger.error("Error fetching hackathon: %s", str(e))
-        return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
-
-    announcements = hackathon.get("announcements", [])
-
-    if not include_expired:
-        current_time = datetime.now(timezone.utc)
-        active_announcements = []
-        for announcement in announcements:
-            try:
-                expiry_datetime = datetime.fromisoformat(
-                    announcement["expiryDate"].replace("Z", "+00:00")
-                )
-                if expiry_datetime > current_time:
-                    active_announcements.append(announcement)
-            except (ValueError, KeyError):
-                continue
-        announcements = active_announcements
-
-    return jsonify({"announcements": announcements}), 200
+        logger.error("Error fetching announcements: %s", str(e))
+        return jsonify({"error": "Failed to fetch announcements", "details": str(e)}), 500
 
 
-@app.route("/grading", methods=["POST"])
+@api.route("/grading", methods=["POST"])
 @token_required
 def grading():
     data = request.get_json(silent=True) or {}
@@ -847,9 +945,13 @@ def grading():
     if not hack_code or not team_id or phase_id is None or score is None:
         return jsonify({"error": "hackCode, teamId, phaseId, and score are required"}), 400
 
-    # Fetch hackathon
+    # Fetch hackathon and the phase's latest submission in one round trip
+    db = get_db()
     try:
-        hack_doc = hackathons_collection.document(hack_code).get()
+        hack_doc, latest_doc = metrics.get_all(db, [
+            db.collection("hackathons").document(hack_code),
+            submission_log.latest_ref(db, hack_code, team_id, phase_id),
+        ])
         if not hack_doc.exists:
             return jsonify({"error": "Hackathon not found"}), 404
         hack = hack_doc.to_dict()
@@ -858,33 +960,19 @@ def grading():
         return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
 
     # Find the team
-    team = next((t for t in hack.get("registrations", []) if t["teamId"] == team_id), None)
+    team = team_index.find(hack_code, hack_doc, hack.get("registrations", []), team_id)
     if not team:
         return jsonify({"error": "Team not found"}), 404
 
-    # Ensure team has submissions
-    if "submissions" not in team or not team["submissions"]:
-        return jsonify({"error": "No submissions found for this team"}), 404
-
-    # Find the submission for given phaseId
-    submission = next((s for s in team["submissions"] if s["phaseId"] == phase_id), None)
-    if not submission:
+    # The submission is either in the log or, if saved before it existed, embedded in the team
+    has_submission = (latest_doc.exists and "submissions" in latest_doc.to_dict()) or any(
+        s.get("phaseId") == phase_id for s in team.get("submissions") or [])
+    if not has_submission:
         return jsonify({"error": "Submission for this phase not found"}), 404
 
-    # Attach/Update score
-    if "score" not in submission:
-        submission["score"] = score
-    else:
-        submission["score"] = score  # overwrite (if you only want first-time set, remove this line)
-
-    # Save back
+    # Scores live on the phase's latest pointer, so re-submitting keeps them
     try:
-        # Find and update the specific team
-        for i, reg in enumerate(hack.get("registrations", [])):
-            if reg["teamId"] == team_id:
-                hack["registrations"][i] = team
-                break
-        hackathons_collection.document(hack_code).update({"registrations": hack["registrations"]})
+        submission_log.record_score(db, hack_code, team_id, phase_id, score)
     except Exception as e:
         logger.error("Error updating score: %s", str(e))
         return jsonify({"error": "Failed to save score", "details": str(e)}), 500
@@ -893,10 +981,10 @@ def grading():
         "message": "Score added successfully",
         "teamId": team_id,
         "phaseId": phase_id,
-        "score": submission["score"]
+        "score": score
     }), 200
 
-@app.route("/eliminate", methods=["POST"])
+@api.route("/eliminate", methods=["POST"])
 def eliminate():
     hack_code = request.args.get("hackCode")
     phase_id = request.args.get("phaseId", type=int)
@@ -921,8 +1009,16 @@ def eliminate():
         "inactive": []
     }
 
+    # Scores come from the submission log; only team statuses are written back
+    try:
+        scored = submission_log.overlay_latest(get_db(), hack_code, copy.deepcopy(hackathon))
+    except Exception as e:
+        logger.error("Error fetching scores: %s", str(e))
+        return jsonify({"error": "Failed to fetch scores", "details": str(e)}), 500
+    submissions_by_team = {t.get("teamId"): t.get("submissions", []) for t in scored.get("registrations", [])}
+
     for team in hackathon.get("registrations", []):
-        submissions = team.get("submissions", [])
+        submissions = submissions_by_team.get(team.get("teamId"), [])
         submission = next(
             (s for s in submissions if int(s.get("phaseId", -1)) == phase_id),
             None
@@ -950,7 +1046,7 @@ def eliminate():
     }), 200
 # Enhanced /publishresults endpoint - Replace the existing one in your app.py
 
-@app.route("/publishresults", methods=["POST"])
+@api.route("/publishresults", methods=["POST"])
 @token_required
 def publish_results():
     """
@@ -1008,9 +1104,16 @@ def publish_results():
     try:
         hackathons_collection.document(hack_code).update({"results": results})
         logger.info(f"Results published for hackathon {hack_code} by {user_email}")
+        published = dict(hack, results=results)
+        
+        # Render every certificate in the background before the emails linking to them go out
+        try:
+            get_certificate_renderer().render_results(hack_code, published, results["leaderboard"])
+        except Exception as e:
+            logger.error("Failed to queue certificates for %s: %s", hack_code, str(e))
         
         # 🎯 NEW: Automatically send certificates to all participants
-        certificate_status = send_certificates_to_all_participants(hack_code, results["leaderboard"], hack)
+        certificate_status = send_certificates_to_all_participants(hack_code, results["leaderboard"], published)
         
         return jsonify({
             "message": "Results published successfully",
@@ -1025,295 +1128,147 @@ def publish_results():
 
 def send_certificates_to_all_participants(hack_code, leaderboard, hackathon_doc):
     """
-    Send certificates to all participants based on their ranking
+    Email every member of every ranked team their certificate link. The emails go out
+    in the background (see certificate_mail.py); delivery is reported per recipient
+    by GET /certificate-deliveries.
     """
     logger.info(f"Starting certificate distribution for hackathon {hack_code}")
     
-    certificate_status = {
-        "total_teams": len(leaderboard),
-        "certificates_sent": 0,
-        "failed_sends": 0,
-        "details": []
-    }
+    recipients, skipped = certificate_mail.recipients(hack_code, hackathon_doc, leaderboard, request.url_root)
+    for team in skipped:
+        logger.warning(f"No certificate email for team {team['teamName']}: {team['reason']}")
     
-    event_name = hackathon_doc.get("eventName", "Hackathon Event")
-    organizers = hackathon_doc.get("organisers", [])
-    organizer_name = organizers[0].get("name", "Event Organizer") if organizers else "Event Organizer"
+    if recipients:
+        mailing = certificate_mail.CertificateMailing(get_db, open_smtp, EMAIL_ADDRESS)
+        mailing.start(hack_code, hackathon_doc, recipients)
     
-    for team_result in leaderboard:
-        team_id = team_result.get("teamId")
-        rank = team_result.get("rank", 999)
-        team_name = team_result.get("teamName", "Team")
-        
-        try:
-            # Find the actual team details in registrations
-            team_details = None
-            for registration in hackathon_doc.get("registrations", []):
-                if registration.get("teamId") == team_id:
-                    team_details = registration
-                    break
-            
-            if not team_details:
-                logger.warning(f"Team details not found for teamId: {team_id}")
-                certificate_status["failed_sends"] += 1
-                certificate_status["details"].append({
-                    "teamId": team_id,
-                    "teamName": team_name,
-                    "status": "failed",
-                    "reason": "Team details not found"
-                })
-                continue
-            
-            # Send certificate to team leader
-            team_leader = team_details.get("teamLeader", {})
-            participant_email = team_leader.get("email", "")
-            participant_name = team_leader.get("name", "Participant")
-            
-            if not participant_email:
-                logger.warning(f"No email found for team leader of team {team_name}")
-                certificate_status["failed_sends"] += 1
-                certificate_status["details"].append({
-                    "teamId": team_id,
-                    "teamName": team_name,
-                    "status": "failed",
-                    "reason": "No email address found"
-                })
-                continue
-            
-            # Generate certificate URL
-            certificate_url = f"{request.url_root}certificate?hackCode={hack_code}&teamId={team_id}&rank={rank}"
-            
-            # Determine achievement text based on rank
-            if rank == 1:
-                achievement = "🥇 First Place Winner"
-                subject_prefix = "🏆 WINNER!"
-            elif rank == 2:
-                achievement = "🥈 Second Place Winner"
-                subject_prefix = "🥈 RUNNER-UP!"
-            elif rank == 3:
-                achievement = "🥉 Third Place Winner"
-                subject_prefix = "🥉 THIRD PLACE!"
-            else:
-                achievement = "Certificate of Participation"
-                subject_prefix = "🎉 PARTICIPANT!"
-            
-            # Send email with certificate
-            success = send_certificate_email(
-                participant_email, 
-                participant_name, 
-                event_name, 
-                certificate_url, 
-                achievement,
-                subject_prefix,
-                organizer_name
-            )
-            
-            if success:
-                certificate_status["certificates_sent"] += 1
-                certificate_status["details"].append({
-                    "teamId": team_id,
-                    "teamName": team_name,
-                    "participantName": participant_name,
-                    "participantEmail": participant_email,
-                    "rank": rank,
-                    "achievement": achievement,
-                    "status": "sent",
-                    "certificate_url": certificate_url
-                })
-                logger.info(f"Certificate sent to {participant_email} for team {team_name} (Rank: {rank})")
-            else:
-                certificate_status["failed_sends"] += 1
-                certificate_status["details"].append({
-                    "teamId": team_id,
-                    "teamName": team_name,
-                    "participantName": participant_name,
-                    "participantEmail": participant_email,
-                    "status": "failed",
-                    "reason": "Email sending failed"
-                })
-                
-        except Exception as e:
-            logger.error(f"Error sending certificate to team {team_id}: {str(e)}")
-            certificate_status["failed_sends"] += 1
-            certificate_status["details"].append({
-                "teamId": team_id,
-                "teamName": team_name,
-                "status": "failed",
-                "reason": f"Exception: {str(e)}"
-            })
-    
-    logger.info(f"Certificate distribution completed. Sent: {certificate_status['certificates_sent']}, Failed: {certificate_status['failed_sends']}")
-    return certificate_status
+    return {
+        "status": "sending" if recipients else "nothing_to_send",
+        "total_teams": len(leaderboard),
+        "total_recipients": len(recipients),
+        "skipped_teams": skipped,
+        "report": f"{request.url_root}certificate-deliveries?hackCode={hack_code}"
+    }
 
 
-def send_certificate_email(participant_email, participant_name, event_name, certificate_url, achievement, subject_prefix, organizer_name):
+@api.route("/certificate-deliveries", methods=["GET"])
+@token_required
+def get_certificate_deliveries():
     """
-    Send individual certificate email
+    Per-recipient delivery report of the last certificate mailing (admins only).
+    Query params: ?hackCode=HACK-XXXX
     """
+    hack_code = request.args.get("hackCode")
+    if not hack_code:
+        return jsonify({"error": "hackCode is required"}), 400
+    
+    db = get_db()
     try:
-        subject = f"{subject_prefix} Your Certificate from {event_name}"
-        
-        body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; border-radius: 15px; text-align: center; margin-bottom: 30px;">
-                <h1 style="color: white; font-size: 2.5rem; margin: 0; text-shadow: 2px 2px 4px rgba(0,0,0,0.3);">
-                    🎉 Congratulations!
-                </h1>
-                <p style="color: white; font-size: 1.2rem; margin: 10px 0 0 0; opacity: 0.9;">
-                    {event_name} Results
-                </p>
-            </div>
-            
-            <div style="background: #f8f9fa; padding: 25px; border-radius: 10px; margin-bottom: 25px;">
-                <p style="font-size: 1.1rem; margin: 0 0 15px 0;">Dear <strong>{participant_name}</strong>,</p>
-                <p style="font-size: 1rem; margin: 0 0 15px 0;">
-                    The results for <strong>{event_name}</strong> have been published, and we're excited to share your achievement!
-                </p>
-                <div style="background: white; padding: 20px; border-radius: 8px; border-left: 5px solid #27ae60;">
-                    <p style="margin: 0; font-size: 1.1rem; color: #27ae60; font-weight: bold;">
-                        🏆 Your Achievement: {achievement}
-                    </p>
-                </div>
-            </div>
-            
-            <div style="text-align: center; margin: 30px 0;">
-                <p style="font-size: 1rem; margin-bottom: 20px;">Your official certificate is ready for download:</p>
-                <a href="{certificate_url}" 
-                   style="background: linear-gradient(45deg, #667eea, #764ba2); 
-                          color: white; 
-                          padding: 15px 30px; 
-                          text-decoration: none; 
-                          border-radius: 25px; 
-                          font-weight: bold;
-                          display: inline-block;
-                          font-size: 1.1rem;
-                          box-shadow: 0 5px 15px rgba(102, 126, 234, 0.4);">
-                    📜 View & Download Your Certificate
-                </a>
-            </div>
-            
-            <div style="background: #e8f4fd; padding: 20px; border-radius: 8px; margin: 25px 0;">
-                <h3 style="color: #2980b9; margin: 0 0 10px 0;">📋 What you can do:</h3>
-                <ul style="margin: 0; padding-left: 20px; color: #2c3e50;">
-                    <li>View your personalized certificate online</li>
-                    <li>Download it as a high-quality PDF</li>
-                    <li>Share it on social media and LinkedIn</li>
-                    <li>Add it to your professional portfolio</li>
-                </ul>
-            </div>
-            
-            <div style="margin: 30px 0; text-align: center;">
-                <p style="font-size: 1rem; margin-bottom: 10px;">
-                    Thank you for your participation and congratulations once again! 🎊
-                </p>
-                <p style="font-size: 0.9rem; color: #7f8c8d; margin: 0;">
-                    Best regards,<br>
-                    <strong>{organizer_name}</strong><br>
-                    {event_name} Organizing Team
-                </p>
-            </div>
-            
-            <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
-            <div style="text-align: center;">
-                <p style="color: #7f8c8d; font-size: 0.8rem; margin: 0;">
-                    This is an automated message sent upon publishing of hackathon results.<br>
-                    If you have any questions, please contact the organizing team.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        em = EmailMessage()
-        em["From"] = EMAIL_ADDRESS
-        em["To"] = participant_email
-        em["Subject"] = subject
-        em.set_content(body, subtype="html")
-        
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as smtp:
-            smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            smtp.sendmail(EMAIL_ADDRESS, participant_email, em.as_string())
-        
-        return True
-        
+        hack_doc, report_doc = metrics.get_all(db, [
+            db.collection("hackathons").document(hack_code),
+            db.collection(certificate_mail.DELIVERIES_COLLECTION).document(hack_code)])
     except Exception as e:
-        logger.error(f"Failed to send certificate email to {participant_email}: {str(e)}")
-        return False
+        logger.error("Error fetching certificate deliveries: %s", str(e))
+        return jsonify({"error": "Failed to fetch certificate deliveries", "details": str(e)}), 500
+    
+    if not hack_doc.exists:
+        return jsonify({"error": "Hackathon not found"}), 404
+    if g.user["email"] not in hack_doc.to_dict().get("admins", []):
+        return jsonify({"error": "Not authorized. Only admins can view certificate deliveries."}), 403
+    if not report_doc.exists:
+        return jsonify({"error": "No certificates have been sent for this hackathon"}), 404
+    
+    report = report_doc.to_dict()
+    report["recipients"] = sorted(({"key": key, **recipient} for key, recipient in report["recipients"].items()),
+                                  key=lambda recipient: (recipient.get("rank") if isinstance(recipient.get("rank"), int)
+                                                         else float("inf"), recipient["email"]))
+    return jsonify(report), 200
+
+
+def certificate_response(hack_code, version, team_id, rank, member, fmt, cache_control):
+    """A stored certificate (or a 304 for it), None if it was not rendered"""
+    path = certificates.artifact_path(hack_code, version, team_id, rank, member, fmt)
+    etag = http_cache.etag_for(path, version)
+    tag = http_cache.client_tag(etag)
+    if tag is not None and os.path.exists(path):
+        response = Response(status=304)
+        response.set_etag(tag)
+    else:
+        try:
+            with open(path, "rb") as f:
+                response = Response(f.read(), content_type=certificates.FORMATS[fmt])
+        except FileNotFoundError:
+            return None
+        response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
 
 
-# Keep the existing certificate generation endpoint as well
-@app.route("/certificate", methods=["GET"])
+@api.route("/certificate", methods=["GET"])
 def generate_certificate():
     """
-    Alternative approach using templates folder
-    Place the certificate.html template in your Flask templates/ directory
+    Certificate of a team, rendered once per results version and then served from disk.
+    Query params: ?hackCode=HACK-XXXX&teamId=...&rank=1&m=<member id>&v=<results version>&format=html|pdf
+    Without m, the certificate is the team leader's.
     """
     hack_code = request.args.get("hackCode")
     team_id = request.args.get("teamId")
     rank = request.args.get("rank", "Participant")
+    member = request.args.get("m")
+    version = request.args.get("v")
+    fmt = request.args.get("format", "html")
     
     if not hack_code or not team_id:
         return jsonify({"error": "hackCode and teamId are required"}), 400
+    if not all(certificates.valid_id(value) for value in (hack_code, team_id, member or "leader")):
+        return jsonify({"error": "Invalid hackCode, teamId or m"}), 400
+    if fmt not in certificates.FORMATS:
+        return jsonify({"error": "format must be 'html' or 'pdf'"}), 400
+    if fmt == "pdf" and certificates.weasyprint is None:
+        return jsonify({"error": "PDF certificates are not available on this server"}), 501
+    
+    # Links from certificate emails name the results version: served without reading the hackathon
+    if member and certificates.valid_id(version):
+        response = certificate_response(hack_code, version, team_id, rank, member, fmt,
+                                        certificates.VERSIONED_CACHE_CONTROL)
+        if response is not None:
+            return response
     
     try:
-        # Same data processing logic...
         hackathon_doc = hackathons_collection.document(hack_code).get()
         if not hackathon_doc.exists:
             return jsonify({"error": "Hackathon not found"}), 404
         hackathon = hackathon_doc.to_dict()
         
-        team = None
-        for registration in hackathon.get("registrations", []):
-            if registration.get("teamId") == team_id:
-                team = registration
-                break
+        team = team_index.find(hack_code, hackathon_doc, hackathon.get("registrations", []), team_id)
         
         if not team:
             return jsonify({"error": "Team not found"}), 404
+        person = certificates.find_person(team, member)
+        if person is None:
+            return jsonify({"error": "Team member not found"}), 404
         
-        participant_name = team.get("teamLeader", {}).get("name", "Participant")
-        team_name = team.get("teamName", "Team")
-        event_name = hackathon.get("eventName", "Hackathon Event")
-        organizers = hackathon.get("organisers", [])
-        organizer_name = organizers[0].get("name", "Event Organizer") if organizers else "Event Organizer"
-        
-        try:
-            rank_int = int(rank)
-            if rank_int == 1:
-                achievement = "First Place Winner"
-            elif rank_int == 2:
-                achievement = "Second Place Winner"  
-            elif rank_int == 3:
-                achievement = "Third Place Winner"
-            else:
-                achievement = "Certificate of Participation"
-        except:
-            achievement = "Certificate of Participation"
-        
-        current_date = datetime.now().strftime("%B %d, %Y")
-        
-        template_data = {
-            'participant_name': participant_name,
-            'team_name': team_name,
-            'event_name': event_name,
-            'achievement': achievement,
-            'organizer_name': organizer_name,
-            'certificate_date': current_date,
-            'hack_code': hack_code
-        }
+        renderer = get_certificate_renderer()
+        current = certificates.results_version(hackathon)
+        if current == certificates.PREVIEW_VERSION:
+            # Results not published yet: rendered on every request and not stored
+            if fmt == "pdf":
+                return jsonify({"error": "PDF certificates are available once results are published"}), 404
+            html = renderer.render_html(certificates.template_data(hack_code, hackathon, team, rank, person))
+            return Response(html, content_type=certificates.FORMATS["html"], headers={"Cache-Control": "no-cache"})
         
-        # Use Flask's render_template for external template file
-        # Make sure certificate.html is in your templates/ directory
-        from flask import render_template
-        return render_template('certificate.html', **template_data)
+        # Usually already rendered at publish time; otherwise waits for the one render of it
+        renderer.submit(hack_code, hackathon, team, rank, person).result(timeout=certificates.RENDER_TIMEOUT)
+        cache_control = (certificates.VERSIONED_CACHE_CONTROL if member and version == current
+                         else certificates.UNVERSIONED_CACHE_CONTROL)
+        return certificate_response(hack_code, current, team_id, rank, certificates.member_id(person.get("email", "")),
+                                    fmt, cache_control)
             
     except Exception as e:
         logger.error(f"Error generating certificate: {str(e)}")
         return jsonify({"error": "Failed to generate certificate", "details": str(e)}), 500
 
-@app.route("/results", methods=["GET"])
+@api.route("/results", methods=["GET"])
 def get_results():
     """
     Get published results for a hackathon.
@@ -1338,102 +1293,62 @@ def get_results():
     if "results" not in hack:
         return jsonify({"error": "Results not published yet for this hackathon"}), 404
     
-    return jsonify({
+    return http_cache.cached_json(f"results:{hack_code}", hack_doc.update_time, lambda: {
         "hackCode": hack_code,
         "results": hack["results"]
-    }), 200
-
-@app.route("/check-plagiarism", methods=["POST"])
-def check_plagiarism():
-    """Check a GitHub repository for plagiarism"""
+    })
+
+# --- Plagiarism service proxy (used when PLAGIARISM_SERVICE_URL is set) ---
+plagiarism_proxy = Blueprint("plagiarism_proxy", __name__)
+
+@plagiarism_proxy.route("/check-plagiarism", methods=["POST"])
+@plagiarism_proxy.route("/plagiarism-jobs", methods=["POST"])
+@plagiarism_proxy.route("/plagiarism-jobs/<job_id>", methods=["GET", "DELETE"])
+def forward_to_plagiarism_service(job_id=None):
+    """Forward a plagiarism request to the plagiarism service and relay its response"""
+    import requests
+
+    # Local hop: skip compressing a response we decompress right away
+    headers = {"Content-Type": request.headers.get("Content-Type", "application/json"), "Accept-Encoding": "identity"}
+    if "Authorization" in request.headers:
+        headers["Authorization"] = request.headers["Authorization"]
+    traceparent = tracing.traceparent()
+    if traceparent:
+        headers["traceparent"] = traceparent
     try:
-        data = request.get_json(silent=True) or {}
-        repo_url = data.get('repository_url')
-        
-        if not repo_url:
-            return jsonify({"error": "repository_url is required"}), 400
-        
-        # Validate GitHub URL
-        if 'github.com' not in repo_url:
-            return jsonify({"error": "Only GitHub repositories are supported"}), 400
-        
-        # Import plagiarism checker
-        try:
-            from plagiarism_checker import PlagiarismChecker
-        except ImportError:
-            logger.error("PlagiarismChecker module not found")
-            return jsonify({
-                "success": False,
-                "error": "Plagiarism checker service unavailable",
-                "message": "Internal service configuration error"
-            }), 503
-        
-        # Initialize plagiarism checker with GitHub token
-        github_token = os.getenv('GITHUB_TOKEN', '')
-        if not github_token:
-            logger.warning("No GitHub token provided, analysis may be limited")
-        
-        checker = PlagiarismChecker(github_token)
-        
-        # Run plagiarism check with cross-platform timeout protection
-        import threading
-        import time
-        
-        result_container = {'result': None, 'exception': None}
-        thread_done = threading.Event()
-        
-        def run_check():
-            try:
-                result_container['result'] = checker.check_repository(repo_url)
-            except Exception as e:
-                result_container['exception'] = e
-            finally:
-                thread_done.set()
-        
-        # Start the check in a separate thread
-        check_thread = threading.Thread(target=run_check)
-        check_thread.daemon = True
-        check_thread.start()
-        
-        # Wait for completion with timeout (3 minutes)
-        if not thread_done.wait(timeout=180):  # 3 minutes timeout
-            logger.error(f"Plagiarism check timed out for repository: {repo_url}")
-            return jsonify({
-                "success": False,
-                "error": "Analysis timed out",
-                "message": "Repository analysis took too long. Try with a smaller repository."
-            }), 408
-        
-        # If thread completed, check for exceptions
-        if result_container['exception']:
-            raise result_container['exception']
-        
-        result = result_container['result']
-        
-        return jsonify({
-            "success": True,
-            "data": result
-        })
-        
-    except ValueError as e:
-        logger.error(f"Invalid repository URL: {str(e)}")
-        return jsonify({
-            "success": False,
-            "error": "Invalid repository URL",
-            "message": str(e)
-        }), 400
-        
-    except Exception as e:
-        logger.error(f"Plagiarism check failed: {str(e)}")
+        with tracing.span("plagiarism_service.request", path=request.path):
+            response = get_plagiarism_session().request(
+                request.method,
+                f"{PLAGIARISM_SERVICE_URL}{request.full_path.rstrip('?')}",
+                data=request.get_data(),
+                headers=headers,
+                # The service enforces the check deadline; allow it time to answer
+                timeout=(5, PLAGIARISM_CHECK_TIMEOUT + 15),
+            )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Plagiarism service unavailable: {str(e)}")
         return jsonify({
             "success": False,
-            "error": "Analysis failed",
-            "message": str(e)
-        }), 500
+            "error": "Plagiarism service unavailable",
+            "message": "Please retry shortly."
+        }), 503
+
+    return response.content, response.status_code, {
+        "Content-Type": response.headers.get("Content-Type", "application/json")
+    }
 
 # --- Sponsor Showcase Management Endpoints ---
 
-@app.route("/sponsor-showcase", methods=["POST"])
+def update_sponsors(hackathon_doc, fields):
+    """Apply sponsor registry update fields; a hackathon still holding the old sponsors list is
+    converted by the same update, only if unchanged since it was read (FailedPrecondition otherwise)"""
+    option = None
+    if sponsors.is_legacy((hackathon_doc.to_dict() or {}).get("sponsors")):
+        option = get_db().write_option(last_update_time=hackathon_doc.update_time)
+    hackathons_collection.document(hackathon_doc.id).update(fields, option=option)
+
+
+@api.route("/sponsor-showcase", methods=["POST"])
 @token_required
 def add_sponsor_showcase():
     """
@@ -1452,6 +1367,8 @@ def add_sponsor_showcase():
         "website": "https://website.com" // optional
     }
     """
+    from google.api_core.exceptions import FailedPrecondition
+
     data = request.get_json(silent=True) or {}
     user_email = g.user["email"]
     
@@ -1496,37 +1413,10 @@ def add_sponsor_showcase():
         "isActive": True
     }
     
-    # Find existing sponsor or create new one
-    sponsors = hackathon.get("sponsors", [])
-    sponsor_found = False
-    
-    for sponsor in sponsors:
-        if sponsor.get("name", "").lower() == sponsor_name.lower():
-            # Update existing sponsor
-            sponsor["showcase"] = showcase_data
-            if tier:
-                sponsor["tier"] = tier
-            if logo:
-                sponsor["logo"] = logo
-            if website:
-                sponsor["website"] = website
-            sponsor_found = True
-            break
-    
-    if not sponsor_found:
-        # Create new sponsor entry
-        new_sponsor = {
-            "name": sponsor_name,
-            "tier": tier,
-            "logo": logo,
-            "website": website,
-            "showcase": showcase_data
-        }
-        sponsors.append(new_sponsor)
-    
-    # Update hackathon document
+    # Update hackathon document: the sponsor's entry only
     try:
-        hackathons_collection.document(hack_code).update({"sponsors": sponsors})
+        update_sponsors(hackathon_doc, sponsors.upsert_fields(
+            hackathon.get("sponsors"), sponsor_name, showcase_data, tier, logo, website))
         logger.info(f"Sponsor showcase added/updated for {sponsor_name} in hackathon {hack_code} by {user_email}")
         
         return jsonify({
@@ -1536,12 +1426,14 @@ def add_sponsor_showcase():
             "showcase": showcase_data
         }), 201
         
+    except FailedPrecondition:
+        return jsonify({"error": "Sponsors changed while updating, please retry"}), 409
     except Exception as e:
         logger.error(f"Error updating sponsor showcase: {str(e)}")
         return jsonify({"error": "Failed to update sponsor showcase", "details": str(e)}), 500
 
 
-@app.route("/sponsor-showcase", methods=["GET"])
+@api.route("/sponsor-showcase", methods=["GET"])
 def get_sponsor_showcases():
     """
     Get all sponsor showcases for a hackathon.
@@ -1562,56 +1454,35 @@ def get_sponsor_showcases():
         logger.error("Error fetching hackathon: %s", str(e))
         return jsonify({"error": "Failed to fetch hackathon", "details": str(e)}), 500
     
-    sponsors = hackathon.get("sponsors", [])
-    showcases = []
-    
-    # Check if we need to migrate any sponsors missing isActive field
-    migration_needed = False
-    for sponsor in sponsors:
-        if "showcase" in sponsor and "isActive" not in sponsor["showcase"]:
-            sponsor["showcase"]["isActive"] = True
-            migration_needed = True
-    
-    # If migration was needed, update the database
-    if migration_needed:
-        try:
-            hackathons_collection.document(hack_code).update({"sponsors": sponsors})
-            logger.info(f"Migrated isActive field for sponsors in hackathon {hack_code}")
-        except Exception as e:
-            logger.error(f"Error migrating sponsor data: {str(e)}")
-    
-    for sponsor in sponsors:
-        if "showcase" in sponsor:
-            showcase = sponsor["showcase"]
-            # Ensure isActive is always explicitly set (default to True for backwards compatibility)
-            if "isActive" not in showcase:
-                showcase["isActive"] = True
-            
-            if not active_only or showcase.get("isActive", True):
-                sponsor_info = {
-                    "name": sponsor.get("name", ""),
-                    "tier": sponsor.get("tier", "bronze"),
-                    "logo": sponsor.get("logo", ""),
-                    "website": sponsor.get("website", ""),
-                    "showcase": showcase
-                }
-                showcases.append(sponsor_info)
-    
-    return jsonify({
-        "hackCode": hack_code,
-        "eventName": hackathon.get("eventName", ""),
-        "showcases": showcases,
-        "total": len(showcases)
-    }), 200
+    def build():
+        # Showcases stored before isActive existed are active (sponsors.as_list fills it in)
+        showcases = [{
+            "name": sponsor.get("name", ""),
+            "tier": sponsor.get("tier", "bronze"),
+            "logo": sponsor.get("logo", ""),
+            "website": sponsor.get("website", ""),
+            "showcase": sponsor["showcase"]
+        } for sponsor in sponsors.as_list(hackathon.get("sponsors"))
+            if "showcase" in sponsor and (not active_only or sponsor["showcase"].get("isActive", True))]
+        return {
+            "hackCode": hack_code,
+            "eventName": hackathon.get("eventName", ""),
+            "showcases": showcases,
+            "total": len(showcases)
+        }
 
+    return http_cache.cached_json(f"sponsor-showcase:{hack_code}:{active_only}", hackathon_doc.update_time, build)
 
-@app.route("/sponsor-showcase/<sponsor_name>", methods=["DELETE"])
+
+@api.route("/sponsor-showcase/<sponsor_name>", methods=["DELETE"])
 @token_required
 def remove_sponsor_showcase(sponsor_name):
     """
     Remove sponsor showcase or deactivate it.
     Query params: ?hackCode=HACK-XXXX&action=remove|deactivate
     """
+    from google.api_core.exceptions import FailedPrecondition
+
     hack_code = request.args.get("hackCode")
     action = request.args.get("action", "deactivate")  # remove or deactivate
     user_email = g.user["email"]
@@ -1636,25 +1507,13 @@ def remove_sponsor_showcase(sponsor_name):
     if user_email not in hackathon.get("admins", []):
         return jsonify({"error": "Not authorized. Only admins can manage sponsor showcases."}), 403
     
-    sponsors = hackathon.get("sponsors", [])
-    sponsor_found = False
-    
-    for sponsor in sponsors:
-        if sponsor.get("name", "").lower() == sponsor_name.lower():
-            if "showcase" in sponsor:
-                if action == "remove":
-                    del sponsor["showcase"]
-                elif action == "deactivate":
-                    sponsor["showcase"]["isActive"] = False
-                sponsor_found = True
-                break
-    
-    if not sponsor_found:
+    fields = sponsors.showcase_fields(hackathon.get("sponsors"), sponsor_name, action)
+    if fields is None:
         return jsonify({"error": f"Sponsor '{sponsor_name}' or their showcase not found"}), 404
     
     # Update hackathon document
     try:
-        hackathons_collection.document(hack_code).update({"sponsors": sponsors})
+        update_sponsors(hackathon_doc, fields)
         logger.info(f"Sponsor showcase {action}d for {sponsor_name} in hackathon {hack_code} by {user_email}")
         
         return jsonify({
@@ -1663,12 +1522,14 @@ def remove_sponsor_showcase(sponsor_name):
             "action": action
         }), 200
         
+    except FailedPrecondition:
+        return jsonify({"error": "Sponsors changed while updating, please retry"}), 409
     except Exception as e:
         logger.error(f"Error {action}ing sponsor showcase: {str(e)}")
         return jsonify({"error": f"Failed to {action} sponsor showcase", "details": str(e)}), 500
 
 
-@app.route("/sponsor-showcase/reorder", methods=["POST"])
+@api.route("/sponsor-showcase/reorder", methods=["POST"])
 @token_required
 def reorder_sponsor_showcases():
     """
@@ -1680,6 +1541,8 @@ def reorder_sponsor_showcases():
         "sponsorOrder": ["Sponsor1", "Sponsor2", "Sponsor3"]
     }
     """
+    from google.api_core.exceptions import FailedPrecondition
+
     data = request.get_json(silent=True) or {}
     user_email = g.user["email"]
     
@@ -1703,37 +1566,77 @@ def reorder_sponsor_showcases():
     if user_email not in hackathon.get("admins", []):
         return jsonify({"error": "Not authorized. Only admins can manage sponsor showcases."}), 403
     
-    sponsors = hackathon.get("sponsors", [])
-    reordered_sponsors = []
-    
-    # Reorder sponsors based on the provided order
-    for sponsor_name in sponsor_order:
-        for sponsor in sponsors:
-            if sponsor.get("name", "").lower() == sponsor_name.lower():
-                reordered_sponsors.append(sponsor)
-                break
-    
-    # Add any remaining sponsors not in the order list
-    for sponsor in sponsors:
-        sponsor_name = sponsor.get("name", "")
-        if not any(s.get("name", "").lower() == sponsor_name.lower() for s in reordered_sponsors):
-            reordered_sponsors.append(sponsor)
+    # Listed sponsors first, the rest after them; every order field in one update
+    fields, new_order = sponsors.reorder_fields(hackathon.get("sponsors"), sponsor_order)
     
     # Update hackathon document
     try:
-        hackathons_collection.document(hack_code).update({"sponsors": reordered_sponsors})
+        if fields:
+            update_sponsors(hackathon_doc, fields)
         logger.info(f"Sponsor showcases reordered in hackathon {hack_code} by {user_email}")
         
         return jsonify({
             "message": "Sponsor showcases reordered successfully",
-            "newOrder": [s.get("name", "") for s in reordered_sponsors]
+            "newOrder": new_order
         }), 200
         
+    except FailedPrecondition:
+        return jsonify({"error": "Sponsors changed while updating, please retry"}), 409
     except Exception as e:
         logger.error(f"Error reordering sponsor showcases: {str(e)}")
         return jsonify({"error": "Failed to reorder sponsor showcases", "details": str(e)}), 500
     
 
     
+# --- Application factory ---
+def start_background_tasks():
+    """Start the in-process sweeper, migration and job workers that are enabled"""
+    if not PLAGIARISM_SERVICE_URL:
+        import plagiarism_service
+
+        if plagiarism_service.PLAGIARISM_JOB_WORKERS_INPROCESS:
+            plagiarism_service.start_job_workers()
+    if announcements.SWEEPER_INPROCESS:
+        announcements.AnnouncementSweeper(get_db).start()
+    if sponsors.MIGRATION_INPROCESS:
+        sponsors.start_migration(get_db)
+    return True
+
+def create_app():
+    """Build the Flask app; service clients are created lazily on first use"""
+    started = time.perf_counter()
+    flask_app = Flask(__name__)
+    flask_app.json = json_provider.FastJSONProvider(flask_app)
+    CORS(flask_app, resources={r"/*": {"origins": ["http://localhost:3000", "https://thecodeworks.in/hatch", "http://localhost:8000"]}})
+    metrics.init_app(flask_app)
+    tracing.init_app(flask_app)
+    compression.init_app(flask_app)
+    flask_app.register_blueprint(api)
+
+    if PLAGIARISM_SERVICE_URL:
+        flask_app.register_blueprint(plagiarism_proxy)
+        logger.info("Forwarding plagiarism checks to %s", PLAGIARISM_SERVICE_URL)
+    else:
+        import plagiarism_service
+
+        flask_app.register_blueprint(plagiarism_service.plagiarism_api)
+        if cooperative_io():
+            logger.warning("Plagiarism checks run in this gevent worker and their CPU-bound scoring "
+                           "stalls other requests; set PLAGIARISM_SERVICE_URL to run them separately")
+
+    # Once per process, however many apps are built in it
+    get_service("background_tasks", start_background_tasks)
+
+    import_seconds = started - _import_started
+    create_seconds = time.perf_counter() - started
+    metrics.APP_STARTUP_SECONDS.set(import_seconds, phase="import")
+    metrics.APP_STARTUP_SECONDS.set(create_seconds, phase="create_app")
+    logger.info("App ready: imports %.0f ms, create_app %.0f ms", import_seconds * 1000, create_seconds * 1000)
+    return flask_app
+
+
+# Built by wsgi.py (gunicorn wsgi:app), not on import, so scripts importing
+# app.py (e.g. python sponsors.py) start no server threads
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+Bearer-token authentication shared by the API and the plagiarism service.
+
+Tokens are HS256 JWTs signed with SECRET_KEY; both services must be deployed
+with the same key so a token issued at login is accepted by either.
+"""
+
+import os
+from functools import wraps
+
+import jwt
+from flask import g, jsonify, request
+
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
+
+
+def create_token(user_id, email):
+    payload = {"user_id": user_id, "email": email}
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+
+def decode_token(token):
+    return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+
+
+def token_required(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer "):
+            return jsonify({"error": "Missing or invalid Authorization header"}), 401
+        token = auth_header.split(" ", 1)[1].strip()
+        try:
+            user = decode_token(token)
+            g.user = user
+        except jwt.InvalidTokenError:
+            return jsonify({"error": "Invalid token"}), 401
+        return f(*args, **kwargs)
+    return wrapper
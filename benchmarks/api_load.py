@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Load-test the Flask API against an in-memory Firestore (or the Firestore
+emulator) and a local SMTP sink, and report latency percentiles per route.
+
+The app is served in-process by a threaded werkzeug server. A realistic
+hackathon is seeded (teams, phases, submissions, announcements), then these
+scenarios run one after another with a pool of concurrent clients:
+
+    registration_burst  many new teams hitting POST /registerteam at once
+    grading_burst       judges scoring submissions through POST /grading
+    publish_results     POST /publishresults, including certificate emails
+    arena_polling       participants polling the arena page's endpoints
+
+Clients revalidate GETs with the last ETag they received, like a browser, so
+unchanged responses are counted as 304s rather than errors.
+
+Results are saved as JSON under benchmarks/results/ so runs can be compared
+across commits with --compare.
+
+Usage:
+    python benchmarks/api_load.py [--teams 200] [--phases 3] [--concurrency 16]
+    python benchmarks/api_load.py --firestore emulator   # needs FIRESTORE_EMULATOR_HOST
+    python benchmarks/api_load.py --compare benchmarks/results/<earlier>.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import announcements as announcement_store  # noqa: E402
+from fake_firestore import FakeFirestoreClient  # noqa: E402
+from memberships import membership_data, membership_ref  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+ADMIN_EMAIL = "admin@bench.local"
+
+
+def load_app(args, smtp_address):
+    """Import app.py wired to the chosen Firestore backend and the SMTP sink"""
+    workdir = tempfile.mkdtemp(prefix="hatch-bench-")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_LEVELS", "werkzeug=WARNING")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(workdir, "users.db")
+    os.environ["PLAGIARISM_JOBS_DB_PATH"] = os.path.join(workdir, "plagiarism_jobs.db")
+    os.environ["SMTP_HOST"], os.environ["SMTP_PORT"] = smtp_address[0], str(smtp_address[1])
+    os.environ["SMTP_USE_SSL"] = "false"
+
+    if args.firestore == "emulator":
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            sys.exit("--firestore emulator needs FIRESTORE_EMULATOR_HOST (e.g. localhost:8080)")
+    else:
+        import firebase_admin
+        from firebase_admin import credentials, firestore as admin_firestore
+
+        fake = FakeFirestoreClient(latency_ms=args.firestore_latency_ms)
+        credentials.Certificate = lambda path: None
+        firebase_admin.initialize_app = lambda *a, **kw: None
+        admin_firestore.client = lambda *a, **kw: fake
+
+    import app as api
+    return api
+
+
+def seed(api, args, rng):
+    """Create one populated hackathon plus an empty one for the registration burst"""
+    suffix = uuid.uuid4().hex[:6].upper()
+    hack_code, burst_code = f"HACK-BENCH{suffix}", f"HACK-BURST{suffix}"
+    now = datetime.now(timezone.utc)
+    phases = [{
+        "name": f"Phase {p + 1}",
+        "description": "Build and submit",
+        "startDate": (now + timedelta(days=p)).isoformat(),
+        "endDate": (now + timedelta(days=p + 1)).isoformat(),
+        "deliverables": ["github", "video"],
+    } for p in range(args.phases)]
+
+    teams = []
+    for t in range(args.teams):
+        members = [{"name": f"Member {t}-{m}", "email": f"t{t}m{m}-{suffix.lower()}@bench.local"}
+                   for m in range(args.team_size)]
+        teams.append({
+            "teamId": str(uuid.uuid4()),
+            "teamName": f"Team {t}",
+            "teamLeader": members[0],
+            "teamMembers": members[1:],
+            "paymentDetails": {},
+            "submissions": [{
+                "phaseId": p,
+                "submissions": {"github": f"https://github.com/bench/team-{t}", "video": "https://youtu.be/abc"},
+                "score": rng.randint(0, 100),
+            } for p in range(args.phases)],
+        })
+        for member in members:
+            api.users_collection.document(member["email"]).set({
+                "email": member["email"],
+                "hackathonsRegistered": [{"hackCode": hack_code, "teamId": teams[-1]["teamId"]}],
+                "hackathonsCreated": [],
+            })
+            membership_ref(api.get_db(), hack_code, member["email"]).set(
+                membership_data(hack_code, member["email"], teams[-1]["teamId"]))
+
+    announcements = [{
+        "id": str(uuid.uuid4()),
+        "title": f"Announcement {a}",
+        "content": "Remember to push your latest commit before the deadline. " * 4,
+        "createdBy": ADMIN_EMAIL,
+        "createdAt": now.isoformat().replace("+00:00", "Z"),
+        "expiryDate": (now + timedelta(days=1 if a % 2 else -1)).isoformat().replace("+00:00", "Z"),
+    } for a in range(args.announcements)]
+
+    base = {"eventName": "Benchmark Hackathon", "admins": [ADMIN_EMAIL], "phases": phases,
+            "organisers": [{"name": "Bench Org", "email": ADMIN_EMAIL}]}
+    api.hackathons_collection.document(hack_code).set(
+        dict(base, hackCode=hack_code, registrations=teams, announcements=announcements))
+    api.hackathons_collection.document(burst_code).set(
+        dict(base, hackCode=burst_code, registrations=[], announcements=[]))
+    announcement_store.migrate(api.get_db())
+    return hack_code, burst_code, teams
+
+
+class LoadRunner:
+    """Run request callables on a client pool and record latency per route"""
+
+    def __init__(self, base_url, concurrency):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _etags(self):
+        if not hasattr(self._local, "etags"):
+            self._local.etags = {}
+        return self._local.etags
+
+    def _send(self, route, method, path, token, **kwargs):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        # Revalidate GETs with the last ETag seen, as a polling browser does
+        etags = self._etags()
+        if method == "GET" and path in etags:
+            headers["If-None-Match"] = etags[path]
+        started = time.perf_counter()
+        try:
+            response = self._session().request(method, self.base_url + path, headers=headers,
+                                               timeout=120, **kwargs)
+            status = response.status_code
+            if method == "GET" and response.headers.get("ETag"):
+                etags[path] = response.headers["ETag"]
+        except requests.RequestException:
+            status = 0
+        return route, time.perf_counter() - started, status
+
+    def run(self, requests_to_send):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            samples = list(pool.map(lambda r: self._send(*r[:4], **r[4]), requests_to_send))
+        elapsed = time.perf_counter() - started
+        return summarize(samples, elapsed)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    by_route = {}
+    for route, seconds, status in samples:
+        by_route.setdefault(route, []).append((seconds, status))
+    routes = {}
+    for route, values in sorted(by_route.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in values)
+        routes[route] = {
+            "requests": len(values),
+            "errors": sum(1 for _, status in values if not (200 <= status < 300 or status == 304)),
+            "not_modified": sum(1 for _, status in values if status == 304),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        }
+    return {"elapsed_s": round(elapsed, 3), "routes": routes}
+
+
+def registration_burst(api, args, ctx):
+    leader_token = api.create_token(0, ADMIN_EMAIL)
+    batch = []
+    for t in range(args.registrations):
+        members = [{"name": f"Burst {t}-{m}", "email": f"burst{t}m{m}-{uuid.uuid4().hex[:6]}@bench.local"}
+                   for m in range(args.team_size)]
+        payload = {"hackCode": ctx["burst_code"], "teamName": f"Burst {t}",
+                   "teamLeader": members[0], "teamMembers": members[1:], "paymentDetails": {}}
+        batch.append(("POST /registerteam", "POST", "/registerteam", leader_token, {"json": payload}))
+    return batch
+
+
+def grading_burst(api, args, ctx):
+    batch = []
+    for judge in range(args.judges):
+        token = api.create_token(judge, f"judge{judge}@bench.local")
+        for _ in range(args.grades_per_judge):
+            team = ctx["rng"].choice(ctx["teams"])
+            payload = {"hackCode": ctx["hack_code"], "teamId": team["teamId"],
+                       "phaseId": ctx["rng"].randrange(args.phases), "score": ctx["rng"].randint(0, 100)}
+            batch.append(("POST /grading", "POST", "/grading", token, {"json": payload}))
+    ctx["rng"].shuffle(batch)
+    return batch
+
+
+def publish_results(api, args, ctx):
+    token = api.create_token(0, ADMIN_EMAIL)
+    leaderboard = [{"teamId": team["teamId"], "teamName": team["teamName"], "memberCount": args.team_size,
+                    "totalScore": 100 - rank, "rank": rank + 1}
+                   for rank, team in enumerate(ctx["teams"])]
+    payload = {"eventName": "Benchmark Hackathon", "hackCode": ctx["hack_code"], "leaderboard": leaderboard,
+               "totalTeams": len(leaderboard)}
+    return [("POST /publishresults", "POST", "/publishresults", token, {"json": payload})
+            for _ in range(args.publishes)]
+
+
+def arena_polling(api, args, ctx):
+    batch = []
+    hack_code = ctx["hack_code"]
+    for poller in range(args.pollers):
+        team = ctx["teams"][poller % len(ctx["teams"])]
+        email = team["teamLeader"]["email"]
+        token = api.create_token(poller, email)
+        for _ in range(args.polls):
+            batch.extend([
+                ("GET /fetchhack", "GET", f"/fetchhack?hackCode={hack_code}", None, {}),
+                ("POST /getTeamDetails", "POST", "/getTeamDetails", token,
+                 {"json": {"email": email, "hackCode": hack_code}}),
+                ("GET /fetchsubmissions", "GET", f"/fetchsubmissions?teamId={team['teamId']}&hackCode={hack_code}",
+                 token, {}),
+                ("GET /announcements", "GET", f"/announcements?hackCode={hack_code}", None, {}),
+            ])
+    return batch
+
+
+SCENARIOS = {
+    "registration_burst": registration_burst,
+    "grading_burst": grading_burst,
+    "publish_results": publish_results,
+    "arena_polling": arena_polling,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report, baseline=None):
+    for scenario, result in report["scenarios"].items():
+        print(f"\n{scenario}  ({result['elapsed_s']}s)")
+        print(f"  {'route':<24}{'reqs':>7}{'errors':>8}{'304s':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+        for route, stats in result["routes"].items():
+            line = (f"  {route:<24}{stats['requests']:>7}{stats['errors']:>8}{stats.get('not_modified', 0):>6}"
+                    f"{stats['p50_ms']:>10.1f}"
+                    f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['rps']:>9.1f}")
+            before = (baseline or {}).get("scenarios", {}).get(scenario, {}).get("routes", {}).get(route)
+            if before and before["p95_ms"]:
+                line += f"   p95 {100.0 * (stats['p95_ms'] - before['p95_ms']) / before['p95_ms']:+.0f}%"
+                line += f"  req/s {100.0 * (stats['rps'] - before['rps']) / max(before['rps'], 1e-9):+.0f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--firestore", choices=("memory", "emulator"), default="memory")
+    parser.add_argument("--firestore-latency-ms", type=float, default=5.0,
+                        help="simulated round trip per Firestore call (memory backend)")
+    parser.add_argument("--teams", type=int, default=200)
+    parser.add_argument("--team-size", type=int, default=3)
+    parser.add_argument("--phases", type=int, default=3)
+    parser.add_argument("--announcements", type=int, default=20)
+    parser.add_argument("--registrations", type=int, default=100)
+    parser.add_argument("--judges", type=int, default=20)
+    parser.add_argument("--grades-per-judge", type=int, default=10)
+    parser.add_argument("--publishes", type=int, default=2)
+    parser.add_argument("--pollers", type=int, default=50)
+    parser.add_argument("--polls", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    from werkzeug.serving import make_server
+
+    sink = SMTPSink().start()
+    api = load_app(args, sink.address)
+    server = make_server("127.0.0.1", 0, api.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    hack_code, burst_code, teams = seed(api, args, rng)
+    print(f"Seeded {len(teams)} teams x {args.phases} phases in {time.perf_counter() - seed_started:.2f}s "
+          f"({args.firestore} Firestore)")
+
+    ctx = {"hack_code": hack_code, "burst_code": burst_code, "teams": teams, "rng": rng}
+    runner = LoadRunner(base_url, args.concurrency)
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "scenarios": {},
+    }
+    for name in filter(None, args.scenarios.split(",")):
+        report["scenarios"][name] = runner.run(SCENARIOS[name](api, args, ctx))
+    report["emails_sent"] = sink.messages
+
+    server.shutdown()
+    sink.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\nEmails delivered to sink: {sink.messages}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"api_load_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{report['revision']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
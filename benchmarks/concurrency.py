@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Measure how many requests one gunicorn worker keeps in flight when every
+request waits on I/O, for each worker class.
+
+A single worker serves the app against the in-memory Firestore with a fixed
+per-call latency (standing in for the network round trip). Client pools of
+increasing size hit GET /fetchhack. Concurrency per worker is derived from
+Little's law as throughput x mean server-side request time (from the app's
+/metrics histogram, so time spent waiting in the listen backlog is excluded),
+i.e. the average number of requests the worker had in progress. A sync worker
+stays at 1. gthread is bounded by its thread count. gevent grows with the
+client pool until the worker's CPU saturates.
+
+Usage:
+    python benchmarks/concurrency.py [--workers sync,gthread,gevent] [--clients 1,16,64,256]
+                                     [--firestore-latency-ms 100] [--requests-per-client 10]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from api_load import git_revision, percentile  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+HACK_CODE = "HACK-CONCURRENCY"
+GTHREAD_THREADS = 32
+METRICS_TOKEN = "bench-metrics"  # /metrics is off without one
+REQUEST_SECONDS_RE = re.compile(
+    r'^http_request_duration_seconds_(sum|count)\{route="/fetchhack",method="GET",status="200"\} (\S+)$', re.M)
+
+
+def bench_app():
+    """WSGI app for gunicorn: app.py on the in-memory Firestore, seeded with one hackathon"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore as admin_firestore
+    from fake_firestore import FakeFirestoreClient
+
+    fake = FakeFirestoreClient(latency_ms=float(os.environ["BENCH_FIRESTORE_LATENCY_MS"]))
+    credentials.Certificate = lambda path: None
+    firebase_admin.initialize_app = lambda *a, **kw: None
+    admin_firestore.client = lambda *a, **kw: fake
+
+    import app as api
+    fake.collection("hackathons").document(HACK_CODE).set({
+        "hackCode": HACK_CODE, "eventName": "Concurrency Benchmark", "admins": [],
+        "phases": [], "registrations": [], "announcements": [],
+    })
+    return api.create_app()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(worker_class, port, args):
+    workdir = tempfile.mkdtemp(prefix="hatch-concurrency-")
+    env = dict(os.environ, LOG_LEVEL="WARNING", BENCH_FIRESTORE_LATENCY_MS=str(args.firestore_latency_ms),
+               METRICS_TOKEN=METRICS_TOKEN,
+               SQLITE_DB_PATH=os.path.join(workdir, "users.db"),
+               PLAGIARISM_JOBS_DB_PATH=os.path.join(workdir, "plagiarism_jobs.db"))
+    command = [sys.executable, "-m", "gunicorn"]
+    if worker_class == "gevent":
+        command += ["-c", os.path.join(ROOT, "gunicorn_gevent.conf.py")]
+    elif worker_class == "gthread":
+        command += ["--worker-class", "gthread", "--threads", str(GTHREAD_THREADS)]
+    else:
+        # More than one thread would silently turn a sync worker into gthread
+        command += ["--worker-class", worker_class, "--threads", "1"]
+    command += ["--chdir", BENCH_DIR, "--bind", f"127.0.0.1:{port}", "--workers", "1", "--log-level", "warning"]
+    command.append("concurrency:bench_app()")
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/fetchhack?hackCode={HACK_CODE}", timeout=5).ok:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not come up")
+
+
+def server_request_seconds(url):
+    """Total time and count of successful /fetchhack requests, as the worker measured them"""
+    values = dict(REQUEST_SECONDS_RE.findall(requests.get(f"{url}/metrics", headers={"Authorization": f"Bearer {METRICS_TOKEN}"}, timeout=30).text))
+    return float(values.get("sum", 0)), float(values.get("count", 0))
+
+
+def run_level(url, clients, requests_per_client):
+    def client(_):
+        session = requests.Session()
+        samples = []
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            ok = session.get(f"{url}/fetchhack?hackCode={HACK_CODE}", timeout=120).ok
+            samples.append((time.perf_counter() - started, ok))
+        return samples
+
+    server_seconds, server_count = server_request_seconds(url)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        samples = [s for batch in pool.map(client, range(clients)) for s in batch]
+    elapsed = time.perf_counter() - started
+    end_seconds, end_count = server_request_seconds(url)
+
+    latencies = sorted(seconds for seconds, _ in samples)
+    rps = len(samples) / elapsed
+    server_mean = (end_seconds - server_seconds) / max(1.0, end_count - server_count)
+    return {
+        "clients": clients,
+        "requests": len(samples),
+        "errors": sum(1 for _, ok in samples if not ok),
+        "rps": round(rps, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "server_mean_ms": round(server_mean * 1000, 1),
+        "in_flight": round(rps * server_mean, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="sync,gthread,gevent", help="gunicorn worker classes to compare")
+    parser.add_argument("--clients", default="1,16,64,256", help="concurrent client pool sizes")
+    parser.add_argument("--firestore-latency-ms", type=float, default=100.0)
+    parser.add_argument("--requests-per-client", type=int, default=10)
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = {}
+    for worker_class in args.workers.split(","):
+        if worker_class == "gevent":
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                print("skipping gevent: not installed (pip install gevent)")
+                continue
+        process, url = start_server(worker_class, free_port(), args)
+        try:
+            results[worker_class] = [run_level(url, int(c), args.requests_per_client)
+                                     for c in args.clients.split(",") if c]
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f"{'worker':<9}{'clients':>8}{'rps':>9}{'p50 ms':>9}{'p99 ms':>9}{'server ms':>11}{'in flight':>11}{'errors':>8}")
+    for worker_class, levels in results.items():
+        for level in levels:
+            print(f"{worker_class:<9}{level['clients']:>8}{level['rps']:>9}{level['p50_ms']:>9}"
+                  f"{level['p99_ms']:>9}{level['server_mean_ms']:>11}{level['in_flight']:>11}{level['errors']:>8}")
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"concurrency_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{report['revision']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+In-memory stand-in for the parts of the Firestore client API the app uses.
+
+Documents are deep-copied on every read and write, like a real round trip, and
+each call can be delayed by a fixed latency to model network time to Firestore.
+Field transforms (ArrayUnion, ArrayRemove, Increment, SERVER_TIMESTAMP,
+DELETE_FIELD) are applied the way the server applies them. get_all() and write
+batches each cost one round trip, and batch preconditions (create, and
+last_update_time write options) are checked before any write is applied.
+Subcollections and simple queries (where, order_by, start_after, limit) are
+supported; set(merge=True) merges maps recursively and set(merge=[fields])
+replaces just the listed top-level fields, like the server.
+"""
+
+import copy
+import time
+import operator
+import threading
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data, update_time=None):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data
+        for part in field.split("."):
+            value = value[part]
+        return copy.deepcopy(value)
+
+
+def _apply_transform(current, value):
+    if value is transforms.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current or [])
+        result.extend(v for v in value.values if v not in result)
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in (current or []) if v not in value.values]
+    if isinstance(value, transforms.Increment):
+        return (current or 0) + value.value
+    return copy.deepcopy(value)
+
+
+def _deep_merge(existing, data):
+    document = dict(existing or {})
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            document.pop(key, None)
+        elif isinstance(value, dict):
+            current = document.get(key)
+            document[key] = _deep_merge(current if isinstance(current, dict) else {}, value)
+        else:
+            document[key] = _apply_transform(document.get(key), value)
+    return document
+
+
+class FakeDocumentReference:
+    def __init__(self, client, collection_path, document_id):
+        self._client = client
+        self.collection_path = collection_path
+        self.id = document_id
+
+    @property
+    def path(self):
+        return f"{self.collection_path}/{self.id}"
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.collection_path)
+
+    def collection(self, collection_id):
+        return FakeCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, *args, **kwargs):
+        self._client._wait()
+        return self._client._snapshot(self)
+
+    def set(self, data, merge=False):
+        self._client._wait()
+        self._client._set(self.path, data, merge)
+
+    def update(self, fields, option=None):
+        self._client._wait()
+        with self._client._lock:
+            if option is not None and option.last_update_time is not None \
+                    and self._client._versions.get(self.path) != option.last_update_time:
+                raise FailedPrecondition(f"Document changed since it was read: {self.path}")
+            self._client._update(self.path, fields)
+
+    def delete(self):
+        self._client._wait()
+        with self._client._lock:
+            self._client._store.pop(self.path, None)
+            self._client._versions.pop(self.path, None)
+
+
+class FakeWriteOption:
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+
+class FakeWriteBatch:
+    """Writes applied all together on commit(), or not at all if a precondition fails"""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def create(self, ref, data):
+        self._writes.append(("create", ref.path, data, None))
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref.path, (data, merge), None))
+
+    def update(self, ref, fields, option=None):
+        self._writes.append(("update", ref.path, fields, option))
+
+    def delete(self, ref, option=None):
+        self._writes.append(("delete", ref.path, None, option))
+
+    def commit(self):
+        client = self._client
+        client._wait()
+        with client._lock:
+            for kind, path, _, option in self._writes:
+                if kind == "create" and path in client._store:
+                    raise AlreadyExists(f"Document already exists: {path}")
+                if kind == "update" and path not in client._store:
+                    raise NotFound(f"No document to update: {path}")
+                if option is not None and option.last_update_time is not None \
+                        and client._versions.get(path) != option.last_update_time:
+                    raise FailedPrecondition(f"Document changed since it was read: {path}")
+            saved = {path: (copy.deepcopy(client._store.get(path)), client._versions.get(path))
+                     for _, path, _, _ in self._writes}
+            try:
+                for kind, path, payload, _ in self._writes:
+                    if kind == "create":
+                        client._set(path, payload, merge=False)
+                    elif kind == "set":
+                        client._set(path, *payload)
+                    elif kind == "update":
+                        client._update(path, payload)
+                    else:
+                        client._store.pop(path, None)
+                        client._versions.pop(path, None)
+            except Exception:
+                for path, (data, version) in saved.items():
+                    if data is None:
+                        client._store.pop(path, None)
+                        client._versions.pop(path, None)
+                    else:
+                        client._store[path], client._versions[path] = data, version
+                raise
+        self._writes = []
+
+
+_COMPARISONS = {
+    "==": operator.eq, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+class FakeQuery:
+    """Comparison filters, one ordering (a field or the document id), a cursor and a limit"""
+
+    def __init__(self, collection, filters=(), order=None, cursor=None, limit=None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = order
+        self._cursor = cursor
+        self._limit = limit
+
+    def _copy(self, **changes):
+        fields = dict(filters=self._filters, order=self._order, cursor=self._cursor, limit=self._limit)
+        fields.update(changes)
+        return FakeQuery(self._collection, **fields)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _COMPARISONS:
+            raise NotImplementedError(f"FakeQuery does not support {op_string!r} filters")
+        return self._copy(filters=self._filters + [(field_path, _COMPARISONS[op_string], value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(order=(field_path, direction == "DESCENDING"))
+
+    def start_after(self, values):
+        return self._copy(cursor=values)
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def stream(self, *args, **kwargs):
+        # Like the server, a document missing a filtered field never matches
+        snapshots = [snapshot for snapshot in self._collection._scan()
+                     if all(field in snapshot._data and compare(snapshot._data[field], value)
+                            for field, compare, value in self._filters)]
+        if self._order:
+            field, descending = self._order
+
+            def key(snapshot):
+                return snapshot.id if field == "__name__" else (snapshot._data or {}).get(field)
+
+            snapshots.sort(key=key, reverse=descending)
+            if self._cursor is not None:
+                after = self._cursor.get(field)
+                after = getattr(after, "id", after)
+                snapshots = [s for s in snapshots if (key(s) < after if descending else key(s) > after)]
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        return iter(snapshots)
+
+
+class FakeCollectionReference:
+    def __init__(self, client, collection_path):
+        self._client = client
+        self._path = collection_path
+        self.id = collection_path.rsplit("/", 1)[-1]
+
+    def document(self, document_id):
+        return FakeDocumentReference(self._client, self._path, document_id)
+
+    def _scan(self):
+        self._client._wait()
+        prefix = f"{self._path}/"
+        with self._client._lock:
+            items = [(path, copy.deepcopy(data), self._client._versions.get(path))
+                     for path, data in self._client._store.items()
+                     if path.startswith(prefix) and "/" not in path[len(prefix):]]
+        return [FakeSnapshot(self.document(path[len(prefix):]), data, version) for path, data, version in items]
+
+    def stream(self, *args, **kwargs):
+        return iter(self._scan())
+
+    def where(self, *args, **kwargs):
+        return FakeQuery(self).where(*args, **kwargs)
+
+    def order_by(self, *args, **kwargs):
+        return FakeQuery(self).order_by(*args, **kwargs)
+
+    def limit(self, count):
+        return FakeQuery(self).limit(count)
+
+
+class FakeFirestoreClient:
+    """Thread-safe in-memory database with optional per-call latency"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self._store = {}
+        self._versions = {}
+        self._clock = 0
+        self._lock = threading.RLock()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _touch(self, path):
+        # Stands in for the document's update_time
+        self._clock += 1
+        self._versions[path] = self._clock
+
+    def _snapshot(self, ref):
+        with self._lock:
+            data = self._store.get(ref.path)
+            return FakeSnapshot(ref, copy.deepcopy(data), self._versions.get(ref.path))
+
+    def _set(self, path, data, merge):
+        with self._lock:
+            existing = self._store.get(path)
+            if isinstance(merge, (list, tuple)):
+                document = dict(existing or {})
+                for key in merge:
+                    document[key] = _apply_transform(document.get(key), data[key])
+            elif merge:
+                document = _deep_merge(existing, data)
+            else:
+                document = {key: _apply_transform(None, value) for key, value in data.items()}
+            self._store[path] = document
+            self._touch(path)
+
+    def _update(self, path, fields):
+        document = self._store.get(path)
+        if document is None:
+            raise NotFound(f"No document to update: {path}")
+        for field_path, value in fields.items():
+            parts = FieldPath.from_api_repr(field_path).parts
+            target = document
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            if value is transforms.DELETE_FIELD:
+                target.pop(parts[-1], None)
+            else:
+                target[parts[-1]] = _apply_transform(target.get(parts[-1]), value)
+        self._touch(path)
+
+    def collection(self, collection_id):
+        return FakeCollectionReference(self, collection_id)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self._wait()
+        for ref in references:
+            yield self._snapshot(ref)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    @staticmethod
+    def write_option(**kwargs):
+        return FakeWriteOption(**kwargs)
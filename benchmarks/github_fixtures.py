@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Local GitHub API stand-in that replays recorded (or synthetic) responses.
+
+Point the checker at it with GITHUB_API_URL=http://127.0.0.1:<port> (or
+GitHubService(token, base_url=...)). Every response carries X-RateLimit-*
+headers from a per-resource budget, and an exhausted budget answers 403 just
+like GitHub. A fixed latency can be added to every response.
+
+Record real responses by proxying a check through it:
+
+    python benchmarks/github_fixtures.py --record fixtures.json --port 8787
+    GITHUB_API_URL=http://127.0.0.1:8787 python plagiarism_checker.py ...
+
+Replay them:
+
+    python benchmarks/github_fixtures.py --replay fixtures.json --latency-ms 50
+
+Fixture files map "METHOD /path?sorted-query" keys to {status, headers, json
+or body_b64, links}. Link targets are stored relative to the API root and
+rewritten to the server's own address when served. Search requests that were
+not recorded fall back to the entry recorded for the bare path.
+"""
+
+import io
+import json
+import time
+import base64
+import random
+import tarfile
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+UPSTREAM = "https://api.github.com"
+RATE_LIMITS = {"core": 5000, "search": 30, "graphql": 5000}
+
+
+def request_key(method, path, query=None, body=None):
+    """Stable fixture key for a request"""
+    path = "/" + path.strip("/")
+    if method == "POST" and path == "/graphql":
+        variables = (body or {}).get("variables", {})
+        return f"POST /graphql {json.dumps(variables, sort_keys=True)}"
+    query = sorted((query or {}).items())
+    return f"{method} {path}?{urlencode(query)}" if query else f"{method} {path}"
+
+
+def _resource(path):
+    if path.startswith("/search/"):
+        return "search"
+    if path == "/graphql":
+        return "graphql"
+    return "core"
+
+
+class FixtureStore:
+    """Recorded responses keyed by request_key()"""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.entries, f)
+
+    def add(self, key, body, status=200, headers=None, links=None, binary=False):
+        entry = {"status": status, "headers": headers or {}, "links": links or {}}
+        if binary:
+            entry["body_b64"] = base64.b64encode(body).decode()
+        else:
+            entry["json"] = body
+        self.entries[key] = entry
+
+    def lookup(self, method, path, query, body):
+        entry = self.entries.get(request_key(method, path, query, body))
+        if entry is None and path.startswith("/search/"):
+            entry = self.entries.get(request_key(method, path))
+        return entry
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method):
+        server = self.server
+        parts = urlsplit(self.path)
+        path = parts.path
+        query = dict(parse_qsl(parts.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        body = json.loads(raw_body) if raw_body else None
+
+        resource = _resource(path)
+        remaining, reset = server.take_quota(resource)
+        rate_headers = {
+            "X-RateLimit-Limit": str(server.rate_limits[resource]),
+            "X-RateLimit-Remaining": str(max(remaining, 0)),
+            "X-RateLimit-Reset": str(reset),
+            "X-RateLimit-Resource": resource,
+        }
+        if server.latency:
+            time.sleep(server.latency)
+        server.count(path)
+        if remaining < 0:
+            payload = json.dumps({"message": "API rate limit exceeded"}).encode()
+            self._send(403, payload, dict(rate_headers, **{"Content-Type": "application/json"}))
+            return
+
+        if server.upstream:
+            entry = server.record(method, path, query, body, raw_body, self.headers.get("Authorization"))
+        else:
+            entry = server.store.lookup(method, path, query, body)
+        if entry is None:
+            payload = json.dumps({"message": "Not Found (no fixture)"}).encode()
+            self._send(404, payload, dict(rate_headers, **{"Content-Type": "application/json"}))
+            return
+
+        headers = dict(entry.get("headers", {}), **rate_headers)
+        if entry.get("links"):
+            headers["Link"] = ", ".join(f'<{server.url}/{target}>; rel="{rel}"'
+                                        for rel, target in entry["links"].items())
+        if "body_b64" in entry:
+            payload = base64.b64decode(entry["body_b64"])
+            headers.setdefault("Content-Type", "application/octet-stream")
+        else:
+            payload = json.dumps(entry["json"]).encode()
+            headers["Content-Type"] = "application/json"
+        self._send(entry["status"], payload, headers)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Threaded replay (or recording proxy) server on localhost"""
+
+    daemon_threads = True
+
+    def __init__(self, store, port=0, latency_ms=0.0, rate_limits=None, upstream=None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.store = store
+        self.latency = latency_ms / 1000.0
+        self.rate_limits = dict(RATE_LIMITS, **(rate_limits or {}))
+        self.upstream = upstream
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._used = Counter()
+        self._reset = int(time.time()) + 3600
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def take_quota(self, resource):
+        with self._lock:
+            if time.time() >= self._reset:
+                self._used.clear()
+                self._reset = int(time.time()) + 3600
+            self._used[resource] += 1
+            return self.rate_limits[resource] - self._used[resource], self._reset
+
+    def count(self, path):
+        kind = "graphql" if path == "/graphql" else "search" if path.startswith("/search/") else \
+            next((k for k in ("commits", "contents", "trees", "tarball") if f"/{k}" in path), "repository")
+        with self._lock:
+            self.calls[kind] += 1
+
+    def record(self, method, path, query, body, raw_body, authorization):
+        """Forward a request upstream and store the response"""
+        headers = {"Accept": "application/vnd.github.v3+json"}
+        if authorization:
+            headers["Authorization"] = authorization
+        response = requests.request(method, self.upstream + path, params=query, headers=headers,
+                                    data=raw_body or None, timeout=60)
+        links = {rel: link["url"].replace(self.upstream + "/", "", 1) for rel, link in response.links.items()}
+        content_type = response.headers.get("Content-Type", "")
+        binary = "json" not in content_type
+        with self._lock:
+            self.store.add(request_key(method, path, query, body),
+                           response.content if binary else response.json(),
+                           status=response.status_code, links=links, binary=binary)
+        return self.store.lookup(method, path, query, body)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="github-fixtures", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# --- Synthetic fixtures ---
+SOURCE_TEMPLATES = [
+    "def {name}(items, threshold):\n"
+    "    total = sum(value * {n} for value in items if value > threshold)\n"
+    "    results.append(total + {n})\n"
+    "    return sorted(results, key=lambda v: v % {n})\n",
+    "class {Name}Processor:\n"
+    "    def __init__(self, limit):\n"
+    "        self.limit = limit\n"
+    "        self.cache = {{}}\n\n"
+    "    def process(self, queue):\n"
+    "        while queue and len(self.cache) < self.limit:\n"
+    "            node = queue.pop()\n"
+    "            self.cache[node] = node * {n}\n"
+    "        return self.cache\n",
+    "def {name}_search(graph, start):\n"
+    "    visited, frontier = set(), [start]\n"
+    "    while frontier:\n"
+    "        node = frontier.pop(0)\n"
+    "        if node in visited:\n"
+    "            continue\n"
+    "        visited.add(node)\n"
+    "        frontier.extend(graph.get(node, [])[:{n}])\n"
+    "    return visited\n",
+]
+
+
+def synthetic_files(count, functions_per_file=12, seed=1):
+    rng = random.Random(seed)
+    files = {}
+    for i in range(count):
+        blocks = []
+        for _ in range(functions_per_file):
+            name = f"{rng.choice(['merge', 'score', 'rank', 'filter', 'build'])}_{rng.randint(0, 9999)}"
+            blocks.append(rng.choice(SOURCE_TEMPLATES).format(
+                name=name, Name=name.title().replace("_", ""), n=rng.randint(2, 500)))
+        files[f"src/pkg_{i // 50}/module_{i}.py"] = "\n\n".join(blocks)
+    return files
+
+
+def synthetic_store(owner, repo, files, commits=500, branch="main", seed=1):
+    """Build fixtures for one repository: info, tree, contents, commits, search and tarball"""
+    rng = random.Random(seed)
+    store = FixtureStore()
+    base = f"repos/{owner}/{repo}"
+    store.add(request_key("GET", base), {
+        "name": repo, "full_name": f"{owner}/{repo}", "default_branch": branch, "language": "Python",
+        "size": sum(len(c) for c in files.values()) // 1024, "created_at": "2024-01-01T00:00:00Z",
+        "stargazers_count": 3, "forks_count": 0,
+    })
+    tree = [{"path": path, "type": "blob", "sha": f"{i:040x}", "size": len(content), "url": ""}
+            for i, (path, content) in enumerate(files.items())]
+    store.add(request_key("GET", f"{base}/git/trees/{branch}", {"recursive": "1"}),
+              {"sha": "0" * 40, "tree": tree, "truncated": False})
+    for path, content in files.items():
+        store.add(request_key("GET", f"{base}/contents/{path}", {"ref": branch}),
+                  {"path": path, "encoding": "base64", "content": base64.b64encode(content.encode()).decode()})
+
+    history = []
+    for k in range(commits):
+        history.append({
+            "oid": f"{k:040x}",
+            "message": rng.choice(["update", "fix tests", f"Add module {k}", "Refactor scoring", "wip"]),
+            "additions": rng.randint(1, 400),
+            "deletions": rng.randint(0, 100),
+            "author": {"name": rng.choice(["alice", "bob", "carol"]),
+                       "date": f"2024-0{1 + k % 9}-{1 + k % 28:02d}T{k % 24:02d}:{k % 60:02d}:00Z"},
+        })
+    per_page = 100
+    pages = max(1, (commits + per_page - 1) // per_page)
+    for page in range(1, pages + 1):
+        chunk = history[(page - 1) * per_page:page * per_page]
+        links = {}
+        if page < pages:
+            links = {"next": f"{base}/commits?per_page={per_page}&page={page + 1}",
+                     "last": f"{base}/commits?per_page={per_page}&page={pages}"}
+        query = {"per_page": str(per_page)} if page == 1 else {"per_page": str(per_page), "page": str(page)}
+        store.add(request_key("GET", f"{base}/commits", query), [{
+            "sha": c["oid"], "commit": {"message": c["message"], "author": c["author"]}
+        } for c in chunk], links=links)
+        cursor = None if page == 1 else str((page - 1) * per_page)
+        store.add(request_key("POST", "graphql", body={"variables": {"owner": owner, "name": repo, "cursor": cursor}}),
+                  {"data": {"repository": {"defaultBranchRef": {"target": {"history": {
+                      "totalCount": commits,
+                      "pageInfo": {"hasNextPage": page < pages, "endCursor": str(page * per_page)},
+                      "nodes": chunk}}}}}})
+
+    store.add(request_key("GET", "search/code"), {"total_count": 2, "items": [
+        {"name": "solution.py", "path": "solution.py", "html_url": "https://github.com/someone/project/blob/main/solution.py",
+         "repository": {"name": "project", "full_name": "someone/project", "owner": {"login": "someone"}}},
+        {"name": "utils.py", "path": "src/utils.py", "html_url": "https://github.com/other/homework/blob/main/src/utils.py",
+         "repository": {"name": "homework", "full_name": "other/homework", "owner": {"login": "other"}}},
+    ]})
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for path, content in files.items():
+            data = content.encode()
+            info = tarfile.TarInfo(f"{owner}-{repo}-0000000/{path}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    store.add(request_key("GET", f"{base}/tarball/{branch}"), archive.getvalue(), binary=True,
+              headers={"Content-Type": "application/x-gzip"})
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--replay", help="fixture file to serve")
+    mode.add_argument("--record", help="proxy to GitHub and write responses to this file on exit")
+    mode.add_argument("--synthetic", type=int, metavar="FILES", help="serve a generated repo bench/repo-N")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.replay:
+        server = FixtureServer(FixtureStore.load(args.replay), args.port, args.latency_ms)
+    elif args.record:
+        server = FixtureServer(FixtureStore(), args.port, args.latency_ms, upstream=UPSTREAM)
+    else:
+        repo = f"repo-{args.synthetic}"
+        server = FixtureServer(synthetic_store("bench", repo, synthetic_files(args.synthetic)),
+                               args.port, args.latency_ms)
+        print(f"Serving https://github.com/bench/{repo}")
+    print(f"GitHub fixtures on {server.url} (set GITHUB_API_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.record:
+            server.store.save(args.record)
+            print(f"Saved {len(server.store.entries)} responses to {args.record}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark PlagiarismChecker end to end against the local GitHub fixture server.
+
+For each repository size it runs a full check_repository() and reports time per
+stage, GitHub API calls by kind, peak Python memory (tracemalloc, measured on a
+separate run so it does not skew the timings) and similarity-engine throughput.
+Client-side throttling is disabled; --latency-ms models GitHub's response time.
+
+Usage:
+    python benchmarks/plagiarism_bench.py [--sizes 10,100,1000] [--latency-ms 20] [--commits 500]
+    python benchmarks/plagiarism_bench.py --fixtures recorded.json --repo owner/name
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["GITHUB_RATE_LIMIT_DELAY"] = "0"
+
+import plagiarism_checker as pc  # noqa: E402
+from github_fixtures import FixtureServer, FixtureStore, synthetic_files, synthetic_store  # noqa: E402
+from api_load import git_revision  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SIMILARITY_SAMPLE_FILES = 30
+
+
+def run_check(server, repo_url):
+    """One cold check (empty response cache); returns the result and wall time"""
+    pc._cache.clear()
+    server.calls.clear()
+    checker = pc.PlagiarismChecker("bench-token", server.url)
+    started = time.perf_counter()
+    result = checker.check_repository(repo_url)
+    return result, time.perf_counter() - started
+
+
+def similarity_throughput(files):
+    """Normalization lines/s and pairwise similarity comparisons/s over a sample of files"""
+    service = pc.SimilarityService(pc.GitHubService(""))
+    contents = list(files.values())
+    lines = sum(c.count("\n") + 1 for c in contents)
+    started = time.perf_counter()
+    for content in contents:
+        service.normalizer.normalize_code(content)
+    normalize_seconds = time.perf_counter() - started
+
+    sample = contents[:SIMILARITY_SAMPLE_FILES]
+    pairs = 0
+    started = time.perf_counter()
+    for i in range(len(sample)):
+        for j in range(i + 1, len(sample)):
+            service._calculate_similarity(sample[i], sample[j])
+            pairs += 1
+    compare_seconds = time.perf_counter() - started
+    return {
+        "normalize_lines_per_s": round(lines / normalize_seconds) if normalize_seconds else None,
+        "similarity_pairs": pairs,
+        "similarity_pairs_per_s": round(pairs / compare_seconds, 1) if compare_seconds else None,
+    }
+
+
+def bench_repo(label, server, repo_url, files):
+    result, wall = run_check(server, repo_url)
+    calls = dict(server.calls)
+
+    tracemalloc.start()
+    run_check(server, repo_url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "label": label,
+        "files": len(files),
+        "wall_s": round(wall, 3),
+        "stage_timings": result.get("stage_timings", {}),
+        "complete": result.get("complete"),
+        "api_calls": calls,
+        "api_calls_total": sum(calls.values()),
+        "peak_memory_mb": round(peak / 2 ** 20, 1),
+        "similarity": similarity_throughput(files) if files else {},
+    }
+
+
+def print_report(runs):
+    stages = [s for s in pc.PlagiarismChecker.STAGES if any(s in r["stage_timings"] for r in runs)]
+    header = f"{'repo':<14}{'wall s':>8}" + "".join(f"{s[:12]:>14}" for s in stages)
+    header += f"{'API calls':>11}{'peak MB':>9}{'norm lines/s':>14}{'pairs/s':>10}"
+    print(header)
+    for r in runs:
+        line = f"{r['label']:<14}{r['wall_s']:>8.2f}"
+        line += "".join(f"{r['stage_timings'].get(s, 0):>14.3f}" for s in stages)
+        line += f"{r['api_calls_total']:>11}{r['peak_memory_mb']:>9.1f}"
+        line += f"{r['similarity'].get('normalize_lines_per_s') or 0:>14}"
+        line += f"{r['similarity'].get('similarity_pairs_per_s') or 0:>10}"
+        print(line)
+    for r in runs:
+        print(f"  {r['label']}: API calls by kind {r['api_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="synthetic repository sizes in files")
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--fixtures", help="benchmark a recorded fixture file instead of synthetic repos")
+    parser.add_argument("--repo", help="owner/name of the recorded repository (with --fixtures)")
+    parser.add_argument("--output", help="where to save the JSON results (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    runs = []
+    if args.fixtures:
+        if not args.repo:
+            sys.exit("--fixtures needs --repo owner/name")
+        server = FixtureServer(FixtureStore.load(args.fixtures), latency_ms=args.latency_ms).start()
+        runs.append(bench_repo(args.repo, server, f"https://github.com/{args.repo}", {}))
+        server.stop()
+    else:
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            files = synthetic_files(size)
+            repo = f"repo-{size}"
+            server = FixtureServer(synthetic_store("bench", repo, files, commits=args.commits),
+                                   latency_ms=args.latency_ms).start()
+            runs.append(bench_repo(f"{size} files", server, f"https://github.com/bench/{repo}", files))
+            server.stop()
+
+    print_report(runs)
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "runs": runs,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"plagiarism_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{report['revision']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Local SMTP server that accepts and discards every message, for benchmarks.
+
+Speaks just enough plain SMTP (no TLS, no AUTH) for smtplib.SMTP.sendmail and
+counts what it receives.
+"""
+
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self._reply("220 sink ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 sink")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.sink.record()
+                self._reply("250 OK queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # The default backlog of 5 drops connections during send bursts
+    request_queue_size = 128
+
+
+class SMTPSink:
+    """Threaded SMTP sink listening on localhost"""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self._lock = threading.Lock()
+        self.messages = 0
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def record(self):
+        with self._lock:
+            self.messages += 1
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
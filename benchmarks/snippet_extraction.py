@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Profile the snippet-extraction stage of the plagiarism checker on a large
+synthetic repository and report its per-line cost.
+
+Usage:
+    python benchmarks/snippet_extraction.py [--files 1000] [--lines 200] [--profile]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import cProfile
+import pstats
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plagiarism_checker import SimilarityService, GitHubService  # noqa: E402
+
+PY_TEMPLATES = [
+    "def {name}(items, limit):",
+    "    total = sum(x * {n} for x in items if x > limit)",
+    "    results.append(total + {n})",
+    "    if total >= {n} and limit != 0:",
+    "        return sorted(results, key=lambda v: v % {n})",
+    "    for index in range(len(items)):",
+    "        cache[index] = items[index] * {n} - offset",
+    "# compute the {name} helper",
+    "import os",
+    "from collections import defaultdict",
+    "class {Name}Handler:",
+    "    while queue and depth < {n}:",
+    "        node = queue.pop()",
+    "    return {name}_value / {n}",
+    "    print(total)",
+    "",
+]
+
+JS_TEMPLATES = [
+    "function {name}(items, limit) {{",
+    "  const total = items.filter(x => x > limit).map(x => x * {n});",
+    "  results.push(total.reduce((a, b) => a + b, {n}));",
+    "  if (total.length >= {n} && limit !== 0) {{",
+    "    return results.sort((a, b) => a - b);",
+    "  }}",
+    "  // {name} helper",
+    "  for (let i = 0; i < items.length; i++) {{",
+    "    cache[i] = items[i] * {n} - offset;",
+    "  }}",
+    "}}",
+    "{name}Handler = function (event) {{",
+    "  console.log(event);",
+    "",
+]
+
+
+def synthetic_repo(files, lines, seed=42):
+    """Build a deterministic mix of Python and JavaScript files"""
+    rng = random.Random(seed)
+    repo = {}
+    for i in range(files):
+        templates, ext = (PY_TEMPLATES, "py") if i % 3 else (JS_TEMPLATES, "js")
+        body = []
+        for _ in range(lines):
+            name = f"{rng.choice(['compute', 'merge', 'score', 'rank', 'filter'])}_{rng.randint(0, 999)}"
+            body.append(rng.choice(templates).format(name=name, Name=name.title().replace("_", ""),
+                                                     n=rng.randint(1, 500)))
+        repo[f"src/module_{i}.{ext}"] = "\n".join(body)
+    return repo
+
+
+def run(repo, service):
+    """Time normalization and snippet extraction over every file"""
+    normalize_seconds = 0.0
+    extract_seconds = 0.0
+    snippets = 0
+    for path, content in repo.items():
+        started = time.perf_counter()
+        service.normalizer.normalize_code(content)
+        normalize_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        snippets += len(service._extract_high_quality_snippets(content, path))
+        extract_seconds += time.perf_counter() - started
+    return normalize_seconds, extract_seconds, snippets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--profile", action="store_true", help="print the top functions from cProfile")
+    args = parser.parse_args()
+
+    repo = synthetic_repo(args.files, args.lines)
+    total_lines = sum(content.count("\n") + 1 for content in repo.values())
+    service = SimilarityService(GitHubService(""))
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    normalize_seconds, extract_seconds, snippets = run(repo, service)
+    if args.profile:
+        profiler.disable()
+
+    heuristics_seconds = max(0.0, extract_seconds - normalize_seconds)
+    print(f"Synthetic repo: {len(repo)} files, {total_lines} lines")
+    print(f"Snippets extracted: {snippets}")
+    print(f"Normalization:        {normalize_seconds:8.3f}s  {normalize_seconds / total_lines * 1e6:8.2f} us/line")
+    print(f"Line heuristics:      {heuristics_seconds:8.3f}s  {heuristics_seconds / total_lines * 1e6:8.2f} us/line")
+    print(f"Snippet extraction:   {extract_seconds:8.3f}s  {extract_seconds / total_lines * 1e6:8.2f} us/line")
+
+    if args.profile:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Measure cold-start cost of the API: time to import wsgi.py (which builds the
+app) and to answer the first GET / in a fresh interpreter, as a new gunicorn
+worker would.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--importtime]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import wsgi
+imported = time.perf_counter()
+wsgi.app.test_client().get("/")
+served = time.perf_counter()
+heavy = [m for m in ("numpy", "datasketch", "google.cloud.firestore", "firebase_admin") if m in sys.modules]
+print(json.dumps({"import_s": imported - started, "first_request_s": served - started, "loaded": heavy}))
+"""
+
+
+def probe(env, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="print the slowest imports (python -X importtime)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="hatch-startup-")
+    env = dict(os.environ, LOG_LEVEL="WARNING",
+               SQLITE_DB_PATH=os.path.join(workdir, "users.db"),
+               PLAGIARISM_JOBS_DB_PATH=os.path.join(workdir, "plagiarism_jobs.db"))
+
+    samples = [probe(env)[0] for _ in range(args.runs)]
+    for key in ("import_s", "first_request_s"):
+        values = [s[key] * 1000 for s in samples]
+        print(f"{key:<18} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms")
+    print(f"heavy modules loaded before first request: {', '.join(samples[-1]['loaded']) or 'none'}")
+
+    if args.importtime:
+        _, stderr = probe(env, importtime=True)
+        rows = []
+        for line in stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                _, cumulative, name = line[len("import time:"):].split("|")
+                if cumulative.strip().isdigit():
+                    rows.append((int(cumulative), name.rstrip()))
+        print("\nslowest imports (cumulative us):")
+        for cumulative, name in sorted(rows, reverse=True)[:15]:
+            print(f"  {cumulative:>9}  {name}")
+
+
+if __name__ == "__main__":
+    main()
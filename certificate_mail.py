@@ -0,0 +1,352 @@
+"""
+Certificate emails for every team member, sent as a mail merge.
+
+Publishing results expands the leaderboard into one recipient per team
+member (leader first, each email once) with their own certificate link, and
+hands them to a CertificateMailing running on a background thread. Bodies
+come from one template compiled once and filled per recipient.
+
+Messages go out over MAIL_MERGE_CONNECTIONS persistent SMTP sessions, each
+reopened after MAIL_MERGE_MESSAGES_PER_CONNECTION messages or when the
+server drops it, instead of one session per email. Sends to each recipient
+provider (the email domain) are spaced to MAIL_MERGE_RATE per second, or the
+rate given for that domain in MAIL_MERGE_PROVIDER_RATES
+("gmail.com=10,outlook.com=4"). Transient failures (connection loss, 4xx
+replies) are retried; refused recipients and 5xx replies are not.
+
+Delivery is reported per recipient in `certificateDeliveries/{hackCode}`,
+updated every MAIL_MERGE_REPORT_INTERVAL seconds while sending.
+"""
+
+import os
+import time
+import queue
+import smtplib
+import logging
+import threading
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import certificates
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DELIVERIES_COLLECTION = "certificateDeliveries"
+CONNECTIONS = int(os.getenv("MAIL_MERGE_CONNECTIONS", "3"))
+MESSAGES_PER_CONNECTION = int(os.getenv("MAIL_MERGE_MESSAGES_PER_CONNECTION", "100"))
+DEFAULT_RATE = float(os.getenv("MAIL_MERGE_RATE", "5"))
+PROVIDER_RATES = {
+    domain.strip().lower(): float(rate)
+    for domain, _, rate in (item.partition("=") for item in os.getenv("MAIL_MERGE_PROVIDER_RATES", "").split(","))
+    if domain.strip() and rate
+}
+REPORT_INTERVAL = float(os.getenv("MAIL_MERGE_REPORT_INTERVAL", "2"))
+SEND_ATTEMPTS = 3
+
+# rank key -> (achievement, subject prefix)
+RANK_STYLES = {
+    "1": ("🥇 First Place Winner", "🏆 WINNER!"),
+    "2": ("🥈 Second Place Winner", "🥈 RUNNER-UP!"),
+    "3": ("🥉 Third Place Winner", "🥉 THIRD PLACE!"),
+    "participant": ("Certificate of Participation", "🎉 PARTICIPANT!"),
+}
+
+EMAIL_TEMPLATE = """
+<html>
+<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; border-radius: 15px; text-align: center; margin-bottom: 30px;">
+        <h1 style="color: white; font-size: 2.5rem; margin: 0; text-shadow: 2px 2px 4px rgba(0,0,0,0.3);">
+            🎉 Congratulations!
+        </h1>
+        <p style="color: white; font-size: 1.2rem; margin: 10px 0 0 0; opacity: 0.9;">
+            {{ event_name }} Results
+        </p>
+    </div>
+
+    <div style="background: #f8f9fa; padding: 25px; border-radius: 10px; margin-bottom: 25px;">
+        <p style="font-size: 1.1rem; margin: 0 0 15px 0;">Dear <strong>{{ participant_name }}</strong>,</p>
+        <p style="font-size: 1rem; margin: 0 0 15px 0;">
+            The results for <strong>{{ event_name }}</strong> have been published, and we're excited to share the achievement of <strong>{{ team_name }}</strong>!
+        </p>
+        <div style="background: white; padding: 20px; border-radius: 8px; border-left: 5px solid #27ae60;">
+            <p style="margin: 0; font-size: 1.1rem; color: #27ae60; font-weight: bold;">
+                🏆 Your Achievement: {{ achievement }}
+            </p>
+        </div>
+    </div>
+
+    <div style="text-align: center; margin: 30px 0;">
+        <p style="font-size: 1rem; margin-bottom: 20px;">Your official certificate is ready for download:</p>
+        <a href="{{ certificate_url }}"
+           style="background: linear-gradient(45deg, #667eea, #764ba2);
+                  color: white;
+                  padding: 15px 30px;
+                  text-decoration: none;
+                  border-radius: 25px;
+                  font-weight: bold;
+                  display: inline-block;
+                  font-size: 1.1rem;
+                  box-shadow: 0 5px 15px rgba(102, 126, 234, 0.4);">
+            📜 View & Download Your Certificate
+        </a>
+    </div>
+
+    <div style="background: #e8f4fd; padding: 20px; border-radius: 8px; margin: 25px 0;">
+        <h3 style="color: #2980b9; margin: 0 0 10px 0;">📋 What you can do:</h3>
+        <ul style="margin: 0; padding-left: 20px; color: #2c3e50;">
+            <li>View your personalized certificate online</li>
+            <li>Download it as a high-quality PDF</li>
+            <li>Share it on social media and LinkedIn</li>
+            <li>Add it to your professional portfolio</li>
+        </ul>
+    </div>
+
+    <div style="margin: 30px 0; text-align: center;">
+        <p style="font-size: 1rem; margin-bottom: 10px;">
+            Thank you for your participation and congratulations once again! 🎊
+        </p>
+        <p style="font-size: 0.9rem; color: #7f8c8d; margin: 0;">
+            Best regards,<br>
+            <strong>{{ organizer_name }}</strong><br>
+            {{ event_name }} Organizing Team
+        </p>
+    </div>
+
+    <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
+    <div style="text-align: center;">
+        <p style="color: #7f8c8d; font-size: 0.8rem; margin: 0;">
+            This is an automated message sent upon publishing of hackathon results.<br>
+            If you have any questions, please contact the organizing team.
+        </p>
+    </div>
+</body>
+</html>
+"""
+
+
+@lru_cache(maxsize=1)
+def _template():
+    from jinja2 import Environment
+
+    return Environment(autoescape=True).from_string(EMAIL_TEMPLATE)
+
+
+def provider(email: str) -> str:
+    return email.rpartition("@")[2].lower()
+
+
+def recipients(hack_code: str, hackathon: Dict, leaderboard: List[Dict],
+               base_url: str) -> Tuple[List[Dict], List[Dict]]:
+    """One recipient per member of every ranked team, and the teams that could not be mailed"""
+    version = certificates.results_version(hackathon)
+    teams_by_id = {registration.get("teamId"): registration for registration in hackathon.get("registrations", [])}
+    found, skipped = [], []
+    for team_result in leaderboard:
+        team_id = team_result.get("teamId")
+        team_name = team_result.get("teamName", "Team")
+        rank = team_result.get("rank", 999)
+        team = teams_by_id.get(team_id)
+        if team is None:
+            skipped.append({"teamId": team_id, "teamName": team_name, "reason": "Team details not found"})
+            continue
+        people = certificates.people(team)
+        if not people:
+            skipped.append({"teamId": team_id, "teamName": team_name, "reason": "No email address found"})
+            continue
+        achievement, subject_prefix = RANK_STYLES[certificates.rank_key(rank)]
+        for person in people:
+            member = certificates.member_id(person["email"])
+            found.append({
+                "key": f"{team_id}_{member}",
+                "email": person["email"].strip(),
+                "name": person.get("name") or "Participant",
+                "teamId": team_id,
+                "teamName": team_name,
+                "rank": rank,
+                "achievement": achievement,
+                "subjectPrefix": subject_prefix,
+                "certificateUrl": (f"{base_url}certificate?hackCode={hack_code}&teamId={team_id}"
+                                   f"&rank={rank}&m={member}&v={version}"),
+            })
+    return found, skipped
+
+
+def render_message(sender: str, recipient: Dict, event_name: str, organizer_name: str) -> EmailMessage:
+    em = EmailMessage()
+    em["From"] = sender
+    em["To"] = recipient["email"]
+    em["Subject"] = f"{recipient['subjectPrefix']} Your Certificate from {event_name}"
+    em.set_content(_template().render(
+        participant_name=recipient["name"], team_name=recipient["teamName"], event_name=event_name,
+        achievement=recipient["achievement"], certificate_url=recipient["certificateUrl"],
+        organizer_name=organizer_name), subtype="html")
+    return em
+
+
+class ProviderRateLimiter:
+    """Spaces sends to each provider to its messages-per-second rate"""
+
+    def __init__(self, default_rate: float = DEFAULT_RATE, rates: Optional[Dict[str, float]] = None):
+        self.default_rate = default_rate
+        self.rates = PROVIDER_RATES if rates is None else rates
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, domain: str):
+        rate = self.rates.get(domain, self.default_rate)
+        if rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(domain, now))
+            self._next_slot[domain] = slot + 1.0 / rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CertificateMailing:
+    """Sends one hackathon's certificate emails and records each delivery"""
+
+    def __init__(self, db_factory, connect: Callable[[], smtplib.SMTP], sender: str,
+                 connections: int = CONNECTIONS, limiter: Optional[ProviderRateLimiter] = None):
+        self.db_factory = db_factory
+        self.connect = connect
+        self.sender = sender
+        self.connections = connections
+        self.limiter = limiter or ProviderRateLimiter()
+
+    def start(self, hack_code: str, hackathon: Dict, recipients: List[Dict]):
+        thread = threading.Thread(target=self.run, args=(hack_code, hackathon, recipients),
+                                  name=f"certificate-mail-{hack_code}", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, hack_code: str, hackathon: Dict, recipients: List[Dict]) -> Dict:
+        """Send every message and return the counts; blocks until done"""
+        event_name = hackathon.get("eventName", "Hackathon Event")
+        organizers = hackathon.get("organisers", [])
+        organizer_name = organizers[0].get("name", "Event Organizer") if organizers else "Event Organizer"
+        report = self._start_report(hack_code, hackathon, recipients)
+
+        jobs = queue.Queue()
+        results = queue.Queue()
+        for recipient in recipients:
+            jobs.put(recipient)
+        workers = [threading.Thread(target=self._send_all, args=(jobs, results, event_name, organizer_name),
+                                    name=f"certificate-smtp-{i}", daemon=True)
+                   for i in range(min(self.connections, len(recipients)))]
+        for worker in workers:
+            jobs.put(None)
+            worker.start()
+
+        counts = {"sent": 0, "failed": 0}
+        pending = {}
+        last_report = time.monotonic()
+        for _ in recipients:
+            key, outcome = results.get()
+            counts[outcome["status"]] += 1
+            pending[key] = outcome
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                self._update_report(report, pending, counts)
+                pending, last_report = {}, time.monotonic()
+        for worker in workers:
+            worker.join()
+        self._update_report(report, pending, dict(counts, status="completed", finishedAt=_now()))
+        logger.info("Certificate emails for %s: %d sent, %d failed", hack_code, counts["sent"], counts["failed"])
+        return counts
+
+    def _send_all(self, jobs: queue.Queue, results: queue.Queue, event_name: str, organizer_name: str):
+        smtp = None
+        sent_on_connection = 0
+        try:
+            while True:
+                recipient = jobs.get()
+                if recipient is None:
+                    break
+                # run() waits for one outcome per recipient, so every job reports one, whatever happens
+                outcome = {"status": "failed", "reason": "Not sent"}
+                try:
+                    message = render_message(self.sender, recipient, event_name, organizer_name)
+                    for attempt in range(1, SEND_ATTEMPTS + 1):
+                        try:
+                            if smtp is None or sent_on_connection >= MESSAGES_PER_CONNECTION:
+                                _close(smtp)
+                                smtp, sent_on_connection = self.connect(), 0
+                            self.limiter.acquire(provider(recipient["email"]))
+                            with metrics.SMTP_SEND_SECONDS.time(kind="certificate"):
+                                smtp.send_message(message)
+                            sent_on_connection += 1
+                            outcome = {"status": "sent", "sentAt": _now()}
+                            break
+                        except smtplib.SMTPRecipientsRefused as e:
+                            outcome = {"status": "failed", "reason": f"Recipient refused: {e.recipients}"}
+                            break
+                        except smtplib.SMTPResponseException as e:
+                            outcome = {"status": "failed", "reason": f"{e.smtp_code} {e.smtp_error!r}"}
+                            if e.smtp_code >= 500:
+                                break
+                        except (smtplib.SMTPException, OSError) as e:
+                            outcome = {"status": "failed", "reason": str(e)}
+                        except Exception as e:
+                            outcome = {"status": "failed", "reason": f"Exception: {str(e)}"}
+                            break
+                        # Transient: start over on a fresh connection
+                        _close(smtp)
+                        smtp = None
+                        if attempt < SEND_ATTEMPTS:
+                            time.sleep(2 ** attempt)
+                except Exception as e:
+                    # e.g. an address with a line break, which cannot become a header
+                    outcome = {"status": "failed", "reason": f"Invalid message: {str(e)}"}
+                finally:
+                    if outcome["status"] == "failed":
+                        metrics.SMTP_SEND_FAILURES.inc(kind="certificate")
+                        logger.warning("Certificate email to %r failed: %s", recipient.get("email"), outcome["reason"])
+                    results.put((recipient["key"], outcome))
+        finally:
+            _close(smtp)
+
+    def _start_report(self, hack_code: str, hackathon: Dict, recipients: List[Dict]):
+        ref = self.db_factory().collection(DELIVERIES_COLLECTION).document(hack_code)
+        ref.set({
+            "hackCode": hack_code,
+            "resultsVersion": certificates.results_version(hackathon),
+            "status": "sending",
+            "total": len(recipients),
+            "sent": 0,
+            "failed": 0,
+            "startedAt": _now(),
+            "recipients": {r["key"]: {"email": r["email"], "name": r["name"], "teamId": r["teamId"],
+                                      "rank": r["rank"], "status": "queued"} for r in recipients},
+        })
+        return ref
+
+    @staticmethod
+    def _update_report(ref, outcomes: Dict[str, Dict], extra: Optional[Dict] = None):
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        fields = dict(extra or {})
+        for key, outcome in outcomes.items():
+            for name, value in outcome.items():
+                fields[FieldPath("recipients", key, name).to_api_repr()] = value
+        if fields:
+            try:
+                ref.update(fields)
+            except Exception as e:
+                logger.error("Failed to update certificate delivery report: %s", str(e))
+
+
+def _close(smtp):
+    if smtp is None:
+        return
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
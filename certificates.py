@@ -0,0 +1,229 @@
+"""
+Pre-rendered certificate artifacts.
+
+Every certificate email links to GET /certificate, so publishing results used
+to be followed by a burst of identical renders, each re-reading the whole
+hackathon. Certificates are now rendered once per (hackCode, teamId, rank)
+and team member when results are published and stored as static files:
+
+    {CERTIFICATE_DIR}/{hackCode}/{version}/{teamId}_{rank}_{memberId}.html (and .pdf)
+
+`version` identifies the published results, so republishing renders a new
+set and links carrying `v={version}` can be cached by browsers for good.
+Ranks other than 1-3 share the participation certificate; memberId is a hash
+of the member's email (links without one get the team leader's). Rendering
+runs on a bounded thread pool (CERTIFICATE_RENDER_WORKERS); a certificate
+requested before its render finished waits for that render instead of
+starting another.
+
+The template is the app's templates/certificate.html if there is one, or the
+built-in one below, compiled once. PDFs are produced when WeasyPrint is
+installed (pip install weasyprint); otherwise only HTML is stored.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import weasyprint
+except ImportError:  # optional; only HTML certificates are rendered
+    weasyprint = None
+
+logger = logging.getLogger(__name__)
+
+CERTIFICATE_DIR = os.getenv("CERTIFICATE_DIR", "certificates")
+RENDER_WORKERS = int(os.getenv("CERTIFICATE_RENDER_WORKERS", "4"))
+RENDER_TIMEOUT = float(os.getenv("CERTIFICATE_RENDER_TIMEOUT", "30"))
+# Versioned links never change; unversioned ones are revalidated after this many seconds
+VERSIONED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+UNVERSIONED_CACHE_CONTROL = f"public, max-age={int(os.getenv('CERTIFICATE_MAX_AGE', '3600'))}"
+PREVIEW_VERSION = "preview"  # before results are published; rendered per request, never stored
+
+FORMATS = {"html": "text/html; charset=utf-8", "pdf": "application/pdf"}
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+DEFAULT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{{ achievement }} - {{ event_name }}</title>
+<style>
+  @page { size: A4 landscape; margin: 0; }
+  body { margin: 0; font-family: Georgia, "Times New Roman", serif; color: #2c3e50; background: #f4f1ea; }
+  .certificate { box-sizing: border-box; width: 297mm; height: 210mm; padding: 18mm;
+                 border: 6mm solid #764ba2; background: #fffdf8; text-align: center; }
+  h1 { font-size: 44px; letter-spacing: 4px; margin: 10mm 0 4mm; color: #764ba2; }
+  .achievement { font-size: 26px; margin: 0 0 10mm; color: #27ae60; }
+  .name { font-size: 38px; font-weight: bold; margin: 6mm 0; border-bottom: 1px solid #bbb; display: inline-block; padding: 0 12mm 2mm; }
+  .details { font-size: 18px; line-height: 1.6; }
+  .footer { margin-top: 18mm; display: flex; justify-content: space-between; font-size: 15px; }
+  .footer div { width: 45%; border-top: 1px solid #999; padding-top: 2mm; }
+  .code { margin-top: 8mm; font-size: 11px; color: #999; }
+</style>
+</head>
+<body>
+<div class="certificate">
+  <h1>CERTIFICATE</h1>
+  <p class="achievement">{{ achievement }}</p>
+  <p class="details">This certificate is presented to</p>
+  <p class="name">{{ participant_name }}</p>
+  <p class="details">of team <strong>{{ team_name }}</strong><br>for their participation in <strong>{{ event_name }}</strong></p>
+  <div class="footer">
+    <div>{{ organizer_name }}<br>Organizer</div>
+    <div>{{ certificate_date }}<br>Date</div>
+  </div>
+  <p class="code">{{ hack_code }}</p>
+</div>
+</body>
+</html>
+"""
+
+
+def rank_key(rank) -> str:
+    """"1", "2" or "3" for the podium, "participant" for everyone else"""
+    try:
+        rank_int = int(rank)
+    except (TypeError, ValueError):
+        return "participant"
+    return str(rank_int) if rank_int in (1, 2, 3) else "participant"
+
+
+def achievement(rank) -> str:
+    return {"1": "First Place Winner", "2": "Second Place Winner",
+            "3": "Third Place Winner"}.get(rank_key(rank), "Certificate of Participation")
+
+
+def results_version(hackathon: Dict) -> str:
+    """Identifies the published results; PREVIEW_VERSION before publishing"""
+    results = hackathon.get("results")
+    if not results:
+        return PREVIEW_VERSION
+    stamp = f"{results.get('publishedAt')}|{results.get('publishedBy')}"
+    return hashlib.sha1(stamp.encode()).hexdigest()[:12]
+
+
+def valid_id(value: Optional[str]) -> bool:
+    return bool(value) and _SAFE_ID.match(value) is not None
+
+
+def member_id(email: str) -> str:
+    return hashlib.sha1(email.lower().strip().encode()).hexdigest()[:12]
+
+
+def people(team: Dict) -> List[Dict]:
+    """Leader and members of a team with an email, leader first, each person once"""
+    found = {}
+    for person in [team.get("teamLeader") or {}] + list(team.get("teamMembers") or []):
+        if person.get("email"):
+            found.setdefault(member_id(person["email"]), person)
+    return list(found.values())
+
+
+def find_person(team: Dict, member: Optional[str]) -> Optional[Dict]:
+    """The team member with this member id, or the leader when member is None"""
+    if member is None:
+        return team.get("teamLeader") or {}
+    return next((p for p in people(team) if member_id(p["email"]) == member), None)
+
+
+def artifact_path(hack_code: str, version: str, team_id: str, rank, member: str, fmt: str = "html") -> str:
+    return os.path.join(CERTIFICATE_DIR, hack_code, version, f"{team_id}_{rank_key(rank)}_{member}.{fmt}")
+
+
+def template_data(hack_code: str, hackathon: Dict, team: Dict, rank, person: Dict) -> Dict:
+    organizers = hackathon.get("organisers", [])
+    published_at = (hackathon.get("results") or {}).get("publishedAt")
+    try:
+        issued = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        issued = datetime.now()
+    return {
+        "participant_name": person.get("name", "Participant"),
+        "team_name": team.get("teamName", "Team"),
+        "event_name": hackathon.get("eventName", "Hackathon Event"),
+        "achievement": achievement(rank),
+        "organizer_name": organizers[0].get("name", "Event Organizer") if organizers else "Event Organizer",
+        "certificate_date": issued.strftime("%B %d, %Y"),
+        "hack_code": hack_code,
+    }
+
+
+def load_template(jinja_env):
+    """templates/certificate.html of the app if present, else the built-in template"""
+    from jinja2 import TemplateNotFound
+
+    try:
+        return jinja_env.get_template("certificate.html")
+    except TemplateNotFound:
+        return jinja_env.from_string(DEFAULT_TEMPLATE)
+
+
+def _write(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+    os.replace(temp_path, path)  # readers see the whole file or none
+
+
+class CertificateRenderer:
+    """Bounded pool rendering certificates to disk, one render per artifact at a time"""
+
+    def __init__(self, template, workers: int = RENDER_WORKERS):
+        self.template = template
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="certificate-render")
+        self._in_flight = {}  # html path -> Future
+        self._lock = threading.Lock()
+
+    def render_html(self, data: Dict) -> bytes:
+        return self.template.render(**data).encode()
+
+    def submit(self, hack_code: str, hackathon: Dict, team: Dict, rank, person: Dict) -> Future:
+        """Render a certificate unless it is stored or being rendered; the future yields the HTML path"""
+        version = results_version(hackathon)
+        path = artifact_path(hack_code, version, team["teamId"], rank, member_id(person.get("email", "")))
+        with self._lock:
+            future = self._in_flight.get(path)
+            if future is not None:
+                return future
+            if os.path.exists(path):
+                future = Future()
+                future.set_result(path)
+                return future
+            future = self._executor.submit(self._render, path, template_data(hack_code, hackathon, team, rank, person))
+            self._in_flight[path] = future
+        future.add_done_callback(lambda _: self._forget(path))
+        return future
+
+    def _forget(self, path: str):
+        with self._lock:
+            self._in_flight.pop(path, None)
+
+    def _render(self, path: str, data: Dict) -> str:
+        html = self.render_html(data)
+        if weasyprint is not None:
+            # Written first, so an HTML artifact on disk implies its PDF is there too
+            _write(path[:-len(".html")] + ".pdf", weasyprint.HTML(string=html.decode()).write_pdf())
+        _write(path, html)
+        return path
+
+    def render_results(self, hack_code: str, hackathon: Dict, leaderboard: List[Dict]) -> int:
+        """Queue the certificate of every member of every ranked team; returns how many were queued"""
+        teams_by_id = {registration.get("teamId"): registration
+                       for registration in hackathon.get("registrations", [])}
+        queued = 0
+        for team_result in leaderboard:
+            team = teams_by_id.get(team_result.get("teamId"))
+            if team is None or not valid_id(team.get("teamId")):
+                continue
+            for person in people(team):
+                self.submit(hack_code, hackathon, team, team_result.get("rank"), person)
+                queued += 1
+        logger.info("Queued %d certificates for hackathon %s", queued, hack_code)
+        return queued
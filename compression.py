@@ -0,0 +1,139 @@
+"""
+Content-negotiated response compression.
+
+JSON and text responses of COMPRESSION_MIN_BYTES or more are compressed with
+brotli when the client accepts it and the brotli package is installed
+(pip install brotli), otherwise with gzip. COMPRESSION_GZIP_LEVEL and
+COMPRESSION_BROTLI_QUALITY trade CPU for bandwidth.
+
+Responses with a strong ETag (the versioned bodies from http_cache.py) are
+compressed once per version and encoding and then served from a per-process
+cache; their ETag gets a "-gzip"/"-br" suffix so each representation has its
+own tag. Streamed responses are compressed chunk by chunk as they are sent.
+"""
+
+import os
+import gzip
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used instead
+    brotli = None
+
+MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "256"))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by (ETag, encoding)"""
+
+    def __init__(self, max_entries: int = CACHE_SIZE):
+        self.max_entries = max_entries
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._bodies.get((etag, encoding))
+            if body is not None:
+                self._bodies.move_to_end((etag, encoding))
+            return body
+
+    def put(self, etag: str, encoding: str, body: bytes):
+        with self._lock:
+            self._bodies[(etag, encoding)] = body
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+
+compressed = CompressedCache()
+
+
+def negotiate() -> Optional[str]:
+    """Encoding to use for this request: "br", "gzip" or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"] > 0 and accepted["br"] >= accepted["gzip"]:
+        return "br"
+    if accepted["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compressor(encoding: str):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    return compressor.compress, compressor.flush
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    process, finish = _compressor(encoding)
+    for chunk in chunks:
+        output = process(chunk)
+        if output:
+            yield output
+    yield finish()
+
+
+def _compressible(response) -> bool:
+    return (200 <= response.status_code < 300 and response.status_code != 204
+            and "Content-Encoding" not in response.headers
+            and response.mimetype.startswith(COMPRESSIBLE_TYPES)
+            and "no-transform" not in response.headers.get("Cache-Control", ""))
+
+
+def init_app(app):
+    """Compress eligible responses after every request"""
+
+    @app.after_request
+    def _compress_response(response):
+        if response.status_code == 304:
+            # Revalidations of compressed versions must not be shared across encodings either
+            response.vary.add("Accept-Encoding")
+            return response
+        if not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate()
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+        else:
+            body = response.get_data()
+            if len(body) < MIN_BYTES:
+                return response
+            versioned = etag is not None and not weak
+            cached = compressed.get(etag, encoding) if versioned else None
+            if versioned:
+                metrics.CACHE_REQUESTS.inc(cache="compressed", result="hit" if cached is not None else "miss")
+            if cached is None:
+                cached = compress(body, encoding)
+                if versioned:
+                    compressed.put(etag, encoding, cached)
+            response.set_data(cached)
+        if etag:
+            # Each encoding is its own representation, streamed or not
+            response.set_etag(f"{etag}-{encoding}", weak)
+        response.headers["Content-Encoding"] = encoding
+        return response
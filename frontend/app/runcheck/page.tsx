@@ -101,6 +101,9 @@ const instrumentSans = Instrument_Sans({
   variable: '--font-instrument-sans',
 });
 
+// How long a plagiarism job may stay queued before the page checks synchronously
+const QUEUED_JOB_FALLBACK_MS = 30000;
+
 const getAuthToken = ()  => {
     return localStorage.getItem('auth_token');
 };
@@ -173,28 +176,103 @@ function RunCheckPage() {
           throw new Error('Authentication token not found. Please login first.');
         }
 
-        const response = await fetch(
-          'https://thecodeworks.in/hatch/check-plagiarism',
-          {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-              'auth_token': authToken,
-            },
-            body: JSON.stringify({
-              repository_url: repositoryUrl,
-            }),
+        // Synchronous check, used when no job worker picks the job up
+        const runSynchronousCheck = async (): Promise<ApiResponse> => {
+          const response = await fetch(
+            'https://thecodeworks.in/hatch/check-plagiarism',
+            {
+              method: 'POST',
+              headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${authToken}`,
+              },
+              body: JSON.stringify({
+                repository_url: repositoryUrl,
+              }),
+            }
+          );
+
+          if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+          }
+
+          const checked: ApiResponse = await response.json();
+          if (!checked.success) {
+            throw new Error('Plagiarism check failed');
+          }
+          return checked;
+        };
+
+        // Reuse a job started before a refresh, otherwise queue a new one
+        const jobKey = `plagiarism_job:${repositoryUrl}`;
+        let jobId = sessionStorage.getItem(jobKey);
+
+        if (!jobId) {
+          const response = await fetch(
+            'https://thecodeworks.in/hatch/plagiarism-jobs',
+            {
+              method: 'POST',
+              headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${authToken}`,
+              },
+              body: JSON.stringify({
+                repository_url: repositoryUrl,
+              }),
+            }
+          );
+
+          if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
           }
-        );
 
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
+          const created = await response.json();
+          jobId = created.jobId as string;
+          sessionStorage.setItem(jobKey, jobId);
         }
 
-        const result: ApiResponse = await response.json();
-        
-        if (!result.success) {
-          throw new Error('Plagiarism check failed');
+        let result: ApiResponse | null = null;
+        const pollingSince = Date.now();
+        while (!result) {
+          const response = await fetch(
+            `https://thecodeworks.in/hatch/plagiarism-jobs/${jobId}`,
+            { headers: { 'Authorization': `Bearer ${authToken}` } }
+          );
+
+          if (response.status === 404) {
+            sessionStorage.removeItem(jobKey);
+            throw new Error('Plagiarism check not found. Please try again.');
+          }
+          if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+          }
+
+          const job = await response.json();
+          if (job.status === 'completed') {
+            sessionStorage.removeItem(jobKey);
+            result = { success: true, data: job.result };
+          } else if (job.status === 'failed') {
+            sessionStorage.removeItem(jobKey);
+            throw new Error(job.error || 'Plagiarism check failed');
+          } else if (job.status === 'cancelled') {
+            sessionStorage.removeItem(jobKey);
+            throw new Error('Plagiarism check was cancelled. Please try again.');
+          } else if (job.status === 'queued' && Date.now() - pollingSince > QUEUED_JOB_FALLBACK_MS) {
+            // No job worker is running (or all are busy): withdraw the job so it never runs
+            // as well, then check synchronously instead
+            const cancelled = await fetch(
+              `https://thecodeworks.in/hatch/plagiarism-jobs/${jobId}`,
+              { method: 'DELETE', headers: { 'Authorization': `Bearer ${authToken}` } }
+            );
+            if (cancelled.status === 409) {
+              // A worker claimed it meanwhile: keep polling the job
+              continue;
+            }
+            sessionStorage.removeItem(jobKey);
+            result = await runSynchronousCheck();
+          } else {
+            await new Promise((resolve) => setTimeout(resolve, 3000));
+          }
         }
 
         setData(result.data);
@@ -0,0 +1,47 @@
+"""
+Gunicorn settings for serving the API on gevent workers:
+
+    pip install gevent
+    gunicorn -c gunicorn_gevent.conf.py wsgi:app
+
+Each worker runs one greenlet per request, so a request waiting on Firestore,
+SMTP or GitHub no longer holds the whole worker. The gevent worker patches the
+standard library before the app is imported. The app's sockets (requests,
+smtplib) and threads (logging, metrics, tracing, plagiarism stages) then yield
+to other greenlets, and Firestore's gRPC channel is switched to gevent below.
+
+CPU-bound work still blocks a worker's other greenlets. Run plagiarism checks
+in their own service (PLAGIARISM_SERVICE_URL, see plagiarism_service.py).
+Password hashing also blocks, but it only happens on signup and login.
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "gevent"
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Importing the app before the worker's monkey-patching would leave blocking
+# sockets and locks behind
+preload_app = False
+
+
+def post_worker_init(worker):
+    # Firestore talks gRPC; without this its calls block the event loop
+    try:
+        from grpc.experimental import gevent as grpc_gevent
+    except ImportError:
+        return
+    grpc_gevent.init_gevent()
+
+
+def on_starting(server):
+    # Counters of a previous run must not be added to this one's
+    import metrics_multiproc
+    metrics_multiproc.clear()
+
+
+def child_exit(server, worker):
+    import metrics_multiproc
+    metrics_multiproc.mark_process_dead(worker.pid)
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for the standalone plagiarism service:
+
+    gunicorn -c gunicorn_plagiarism.conf.py 'plagiarism_service:create_app()'
+
+Checks are long and mostly wait on GitHub, so a few processes with a handful
+of threads each fit better than the API's many short-lived sync workers.
+"""
+
+import os
+
+bind = os.getenv("PLAGIARISM_SERVICE_BIND", "127.0.0.1:5001")
+workers = int(os.getenv("PLAGIARISM_SERVICE_WORKERS", "2"))
+worker_class = os.getenv("PLAGIARISM_SERVICE_WORKER_CLASS", "gthread")
+threads = int(os.getenv("PLAGIARISM_SERVICE_THREADS", "4"))
+# Must outlive PLAGIARISM_CHECK_TIMEOUT so the check, not gunicorn, ends slow requests
+timeout = int(os.getenv("PLAGIARISM_CHECK_TIMEOUT", "180")) + 30
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # Counters of a previous run must not be added to this one's
+    import metrics_multiproc
+    metrics_multiproc.clear()
+
+
+def child_exit(server, worker):
+    import metrics_multiproc
+    metrics_multiproc.mark_process_dead(worker.pid)
@@ -0,0 +1,129 @@
+"""
+Conditional responses and memoized JSON bodies for public GET endpoints.
+
+A route names the response (`key`, including any query parameters that
+change it) and the version of the data behind it, usually the Firestore
+update_time of the documents it reads. The strong ETag is a hash of both, so
+a client or CDN revalidating with If-None-Match gets a 304 without the body
+being built or serialized. Serialized bodies are kept per (key, version) in a
+per-process LRU, so a changed ETag is serialized once and then reused by
+every poller. Large bodies are streamed in chunks the first time (see
+json_provider.py) and kept once fully sent.
+
+Compressed representations carry the ETag with an encoding suffix
+(compression.py); any of them revalidates the version.
+
+Cache-Control lets shared caches serve a response for HTTP_CACHE_MAX_AGE
+seconds and keep serving it while revalidating for HTTP_CACHE_STALE_SECONDS.
+A body built from partial data (build() raises Degraded) is served once with
+no ETag and not kept, so the next request builds it again.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterator
+
+from flask import Response, current_app, request, stream_with_context
+
+import json_provider
+import metrics
+
+MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "5"))
+STALE_SECONDS = int(os.getenv("HTTP_CACHE_STALE_SECONDS", "30"))
+BODY_CACHE_SIZE = int(os.getenv("HTTP_BODY_CACHE_SIZE", "256"))
+CACHE_CONTROL = f"public, max-age={MAX_AGE}, stale-while-revalidate={STALE_SECONDS}"
+
+
+class BodyCache:
+    """LRU of serialized response bodies, one entry per key holding its latest version"""
+
+    def __init__(self, max_entries: int = BODY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, etag: str):
+        with self._lock:
+            entry = self._bodies.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._bodies.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, etag: str, body: bytes):
+        with self._lock:
+            self._bodies[key] = (etag, body)
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+
+bodies = BodyCache()
+
+
+class Degraded(Exception):
+    """Raised by a build function whose body is incomplete and must not be cached"""
+
+    def __init__(self, obj: Any):
+        super().__init__("response built from partial data")
+        self.obj = obj
+
+
+def etag_for(key: str, version: Any) -> str:
+    return hashlib.sha1(f"{key}|{version!r}".encode()).hexdigest()[:24]
+
+
+def client_tag(etag: str):
+    """The tag the client sent for this version, in any content encoding, or None"""
+    for tag in request.if_none_match.as_set():
+        if tag == etag or tag.startswith(f"{etag}-"):
+            return tag
+    return None
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def _stream_and_keep(key: str, etag: str, obj: Any) -> Iterator[bytes]:
+    """Send a large body in chunks, keeping it only once it was sent in full"""
+    chunks = []
+    for chunk in current_app.json.iter_chunks(obj):
+        chunks.append(chunk)
+        yield chunk
+    yield b"\n"
+    bodies.put(key, etag, b"".join(chunks) + b"\n")
+
+
+def cached_json(key: str, version: Any, build: Callable[[], Any]) -> Response:
+    """200 with the (memoized) JSON body of build(), or 304 if the client already has this version"""
+    etag = etag_for(key, version)
+    tag = client_tag(etag)
+    if tag is not None:
+        metrics.CACHE_REQUESTS.inc(cache="http_etag", result="hit")
+        return not_modified(tag)
+
+    body = bodies.get(key, etag)
+    metrics.CACHE_REQUESTS.inc(cache="http_body", result="hit" if body is not None else "miss")
+    if body is None:
+        try:
+            obj = build()
+        except Degraded as degraded:
+            response = Response(current_app.json.dumps_bytes(degraded.obj) + b"\n", mimetype="application/json")
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        if json_provider.is_large(obj):
+            response = Response(stream_with_context(_stream_and_keep(key, etag, obj)), mimetype="application/json")
+        else:
+            body = current_app.json.dumps_bytes(obj) + b"\n"
+            bodies.put(key, etag, body)
+    if body is not None:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
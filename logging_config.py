@@ -0,0 +1,108 @@
+"""
+Logging setup shared by the web app, the plagiarism checker and the job workers.
+
+Records are handed to a queue on the calling thread and formatted/written by a
+single background listener, so request threads never block on stderr. Levels
+are configurable per module and chatty debug output can be sampled:
+
+    LOG_LEVEL=INFO
+    LOG_LEVELS=plagiarism_checker=DEBUG,urllib3=WARNING
+    LOG_SAMPLE_RATES=plagiarism_checker=0.01
+    LOG_FORMAT=json
+"""
+
+import os
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+
+DEFAULT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+_configure_lock = threading.Lock()
+_listener = None
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """Parse "name=value,name=value" settings into a dict"""
+    pairs = {}
+    for item in (value or "").split(","):
+        name, sep, setting = item.partition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records below INFO from the configured loggers"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate_for(self, name: str):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.INFO:
+            return True
+        rate = self._rate_for(record.name)
+        return rate is None or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging():
+    """Install the queue-based root handler; safe to call more than once"""
+    global _listener
+
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        root = logging.getLogger()
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        for name, level in _parse_pairs(os.getenv("LOG_LEVELS", "")).items():
+            logging.getLogger(name).setLevel(level.upper())
+
+        stream_handler = logging.StreamHandler()
+        if os.getenv("LOG_FORMAT", "text").lower() == "json":
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter(DEFAULT_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        rates = {name: float(rate) for name, rate in _parse_pairs(os.getenv("LOG_SAMPLE_RATES", "")).items()}
+        if rates:
+            queue_handler.addFilter(SamplingFilter(rates))
+
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -0,0 +1,107 @@
+"""
+Index of hackathon memberships and of teams within a hackathon.
+
+Every registered participant has a `memberships/{hackCode}_{email}` document
+holding their teamId. It is written and deleted in the same batch as the
+registration itself, so a membership check is one point read instead of a
+scan of the user's hackathonsRegistered list. Creating it also makes a second
+registration of the same person fail atomically.
+
+Teams are stored inside the hackathon document, so the team itself comes
+from the hackathon read. TeamIndex maps teamId to its position in
+`registrations` once per document version instead of scanning the array on
+every request.
+
+Memberships for registrations made before the index existed are created with:
+
+    python memberships.py
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIPS_COLLECTION = "memberships"
+# Until the backfill has run, a missing membership is double-checked against the user document
+MEMBERSHIP_INDEX_FALLBACK = os.getenv("MEMBERSHIP_INDEX_FALLBACK", "true").lower() == "true"
+BACKFILL_BATCH_SIZE = 400  # Firestore allows 500 writes per batch
+
+
+def membership_id(hack_code: str, email: str) -> str:
+    return f"{hack_code}_{email}"
+
+
+def membership_ref(db, hack_code: str, email: str):
+    return db.collection(MEMBERSHIPS_COLLECTION).document(membership_id(hack_code, email))
+
+
+def membership_data(hack_code: str, email: str, team_id: str) -> Dict:
+    return {"hackCode": hack_code, "email": email, "teamId": team_id}
+
+
+def team_emails(team: Dict) -> List[str]:
+    """Normalized emails of a team's leader and members"""
+    people = [team.get("teamLeader") or {}] + list(team.get("teamMembers") or [])
+    return [(p.get("email") or "").lower().strip() for p in people if p.get("email")]
+
+
+class TeamIndex:
+    """teamId -> position in a hackathon's registrations, cached per document version"""
+
+    def __init__(self, max_hackathons: int = 256):
+        self.max_hackathons = max_hackathons
+        self._positions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def find(self, hack_code: str, snapshot, registrations: List[Dict], team_id: str) -> Optional[Dict]:
+        """Return the team dict inside `registrations` (so edits to it are saved with the list)"""
+        key = (hack_code, getattr(snapshot, "update_time", None))
+        with self._lock:
+            positions = self._positions.get(key)
+            if positions is not None:
+                self._positions.move_to_end(key)
+        if positions is None:
+            positions = {team.get("teamId"): i for i, team in enumerate(registrations)}
+            if key[1] is not None:
+                with self._lock:
+                    self._positions[key] = positions
+                    while len(self._positions) > self.max_hackathons:
+                        self._positions.popitem(last=False)
+        i = positions.get(team_id)
+        if i is None or i >= len(registrations) or registrations[i].get("teamId") != team_id:
+            return None
+        return registrations[i]
+
+
+def backfill(db) -> int:
+    """Create membership documents for every existing registration; safe to re-run"""
+    written = 0
+    batch = db.batch()
+    pending = 0
+    for hack_doc in db.collection("hackathons").stream():
+        hack = hack_doc.to_dict() or {}
+        for team in hack.get("registrations", []):
+            for email in team_emails(team):
+                batch.set(membership_ref(db, hack_doc.id, email),
+                          membership_data(hack_doc.id, email, team["teamId"]))
+                pending += 1
+                if pending == BACKFILL_BATCH_SIZE:
+                    batch.commit()
+                    written += pending
+                    batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+        written += pending
+    return written
+
+
+if __name__ == "__main__":
+    from logging_config import configure_logging
+    from app import get_db
+
+    configure_logging()
+    logger.info("Indexed %d hackathon memberships", backfill(get_db()))
@@ -0,0 +1,390 @@
+"""
+Minimal Prometheus-style metrics for the API and the plagiarism checker.
+
+Counters, gauges and histograms live in process memory. When
+METRICS_MULTIPROC_DIR is set (one directory shared by all gunicorn workers),
+each process also writes its samples to its own snapshot file every few
+seconds and at exit; GET /metrics merges every snapshot in that directory, so
+whichever worker answers the scrape reports totals for the whole server. The
+gunicorn configs clear the directory when the master starts and fold exited
+workers into one file (metrics_multiproc.py).
+
+GET /metrics is served on the public app, so it is off unless METRICS_TOKEN
+is set, and then requires `Authorization: Bearer $METRICS_TOKEN` (Prometheus:
+`authorization: {credentials: ...}` in the scrape config).
+"""
+
+import os
+import hmac
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+from flask import Response, g, has_request_context, request
+
+import tracing
+import metrics_multiproc
+from metrics_multiproc import MULTIPROC_DIR
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry[name] = self
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """Monotonic counter, summed across processes"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Last observed value; across processes the most recent write wins"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = (value, time.time())
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed durations in seconds"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+# --- Metric definitions ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Flask request latency by route", ("route", "method", "status"))
+FIRESTORE_OPERATIONS = Counter(
+    "firestore_operations_total", "Firestore calls by route, collection and operation",
+    ("route", "collection", "operation"))
+FIRESTORE_DOCUMENTS_READ = Counter(
+    "firestore_documents_read_total", "Firestore documents read by route and collection", ("route", "collection"))
+FIRESTORE_OPERATION_SECONDS = Histogram(
+    "firestore_operation_duration_seconds", "Firestore call latency by route, collection and operation",
+    ("route", "collection", "operation"))
+SMTP_SEND_SECONDS = Histogram("smtp_send_duration_seconds", "SMTP send latency", ("kind",))
+SMTP_SEND_FAILURES = Counter("smtp_send_failures_total", "Failed SMTP sends", ("kind",))
+GITHUB_REQUESTS = Counter("github_api_requests_total", "GitHub API calls by endpoint kind and status",
+                          ("endpoint", "status"))
+GITHUB_REQUEST_SECONDS = Histogram("github_api_request_duration_seconds", "GitHub API call latency", ("endpoint",))
+GITHUB_RATE_LIMIT_REMAINING = Gauge("github_rate_limit_remaining",
+                                    "X-RateLimit-Remaining from the latest GitHub response", ("resource",))
+APP_STARTUP_SECONDS = Gauge("app_startup_seconds", "Time spent importing and building the app", ("phase",))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+SUBMISSION_SAVES = Counter("submission_saves_total",
+                           "Submission saves by result (written, coalesced into a newer save, failed)", ("result",))
+
+
+def current_route() -> str:
+    """Route template of the active request, or "background" outside one"""
+    if not has_request_context():
+        return "background"
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+# --- Multi-process snapshots ---
+def _snapshot() -> Dict:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    snapshot = {}
+    for metric in metrics:
+        with metric._lock:
+            samples = [[list(key), json.loads(json.dumps(value))] for key, value in metric._values.items()]
+        snapshot[metric.name] = samples
+    return snapshot
+
+
+def flush():
+    """Write this process's samples to its snapshot file"""
+    if not MULTIPROC_DIR:
+        return
+    path = metrics_multiproc.snapshot_path(os.getpid())
+    try:
+        metrics_multiproc.write(path, _snapshot())
+    except OSError as e:
+        logger.warning("Could not write metrics snapshot %s: %s", path, e)
+
+
+def _load_snapshots() -> Iterable[Dict]:
+    if not MULTIPROC_DIR:
+        yield _snapshot()
+        return
+    flush()
+    for filename in os.listdir(MULTIPROC_DIR):
+        if not (filename.startswith(metrics_multiproc.SNAPSHOT_PREFIX) and filename.endswith(".json")):
+            continue
+        try:
+            yield metrics_multiproc.read(os.path.join(MULTIPROC_DIR, filename))
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping unreadable metrics snapshot %s: %s", filename, e)
+
+
+def _merge(metric: _Metric, merged: Dict, key: Tuple, value):
+    if metric.kind == "counter":
+        merged[key] = merged.get(key, 0) + value
+    elif metric.kind == "gauge":
+        if key not in merged or value[1] >= merged[key][1]:
+            merged[key] = value
+    else:
+        if key not in merged:
+            merged[key] = [[0] * (len(metric.buckets) + 1), 0.0]
+        merged[key][0] = [a + b for a, b in zip(merged[key][0], value[0])]
+        merged[key][1] += value[1]
+
+
+def _format_labels(labelnames: Tuple[str, ...], key: Tuple, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = dict(_registry)
+    merged = {name: {} for name in metrics}
+    for snapshot in _load_snapshots():
+        for name, samples in snapshot.items():
+            metric = metrics.get(name)
+            if metric is None:
+                continue
+            for key, value in samples:
+                _merge(metric, merged[name], tuple(key), value)
+
+    lines = []
+    for name, metric in metrics.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, value in sorted(merged[name].items()):
+            if metric.kind == "counter":
+                lines.append(f"{name}{_format_labels(metric.labelnames, key)} {value}")
+            elif metric.kind == "gauge":
+                lines.append(f"{name}{_format_labels(metric.labelnames, key)} {value[0]}")
+            else:
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(metric.labelnames, key, (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(metric.labelnames, key)} {total}")
+                lines.append(f"{name}_count{_format_labels(metric.labelnames, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+_flusher_lock = threading.Lock()
+_flusher_pid = None
+
+
+def _start_flusher():
+    """Start the periodic snapshot writer once per process (gunicorn forks after import)"""
+    global _flusher_pid
+    if not MULTIPROC_DIR:
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+        def run():
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                flush()
+
+        threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+        atexit.register(flush)
+
+
+def _reset_after_fork():
+    """A forked worker must not re-report samples it inherited from its parent"""
+    global _flusher_pid
+    _flusher_pid = None
+    for metric in _registry.values():
+        metric._values = {}
+    if MULTIPROC_DIR:
+        _start_flusher()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# --- Instrumented Firestore wrappers ---
+@contextmanager
+def firestore_operation(operation: str, collection: str, documents_read: int = 0, **attributes):
+    """Count, time and trace one Firestore round trip"""
+    route = current_route()
+    FIRESTORE_OPERATIONS.inc(route=route, collection=collection, operation=operation)
+    with tracing.span(f"firestore.{operation}", collection=collection, **attributes), \
+            FIRESTORE_OPERATION_SECONDS.time(route=route, collection=collection, operation=operation):
+        yield
+    if documents_read:
+        FIRESTORE_DOCUMENTS_READ.inc(documents_read, route=route, collection=collection)
+
+
+def get_all(client, references):
+    """Read several documents in a single round trip, returned in the order asked for
+    (missing ones come back with exists=False)"""
+    collection = ",".join(sorted({ref.parent.id for ref in references}))
+    with firestore_operation("get_all", collection, documents_read=len(references), documents=len(references)):
+        by_path = {snapshot.reference.path: snapshot for snapshot in client.get_all(references)}
+    return [by_path[ref.path] for ref in references]
+
+
+def stream(query, collection: str, *args, **kwargs):
+    """Stream a collection or query, counting the documents read"""
+    route = current_route()
+    FIRESTORE_OPERATIONS.inc(route=route, collection=collection, operation="stream")
+    started = time.perf_counter()
+    count = 0
+    try:
+        with tracing.span("firestore.stream", collection=collection) as attributes:
+            for snapshot in query.stream(*args, **kwargs):
+                count += 1
+                yield snapshot
+            attributes["documents"] = count
+    finally:
+        FIRESTORE_DOCUMENTS_READ.inc(count, route=route, collection=collection)
+        FIRESTORE_OPERATION_SECONDS.observe(time.perf_counter() - started,
+                                            route=route, collection=collection, operation="stream")
+
+
+def commit(batch, collection: str):
+    """Commit a WriteBatch; all of its writes apply or none do"""
+    with firestore_operation("commit", collection):
+        return batch.commit()
+
+
+class InstrumentedDocument:
+    """DocumentReference proxy that counts and times reads and writes"""
+
+    def __init__(self, ref, collection_name: str):
+        self._ref = ref
+        self._collection_name = collection_name
+
+    def _call(self, operation: str, method, *args, **kwargs):
+        with firestore_operation(operation, self._collection_name, documents_read=int(operation == "get"),
+                                 document=self._ref.id):
+            return method(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._call("get", self._ref.get, *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._call("set", self._ref.set, *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._call("update", self._ref.update, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call("delete", self._ref.delete, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+
+class InstrumentedCollection:
+    """CollectionReference proxy whose documents and streams are instrumented"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._name = collection.id
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._collection.document(*args, **kwargs), self._name)
+
+    def stream(self, *args, **kwargs):
+        return stream(self._collection, self._name, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+# --- Flask integration ---
+def init_app(app):
+    """Time every request and expose GET /metrics to holders of METRICS_TOKEN"""
+    _start_flusher()
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=current_route(),
+                                         method=request.method, status=response.status_code)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        if not METRICS_TOKEN:
+            return Response("Not found\n", status=404, mimetype="text/plain")
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain",
+                            headers={"WWW-Authenticate": "Bearer"})
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,97 @@
+"""
+Snapshot files of multi-process metrics (METRICS_MULTIPROC_DIR).
+
+Each worker process writes `metrics_{pid}.json`; GET /metrics sums every
+`metrics_*.json` in the directory (see metrics.py). The gunicorn master keeps
+the directory to the live workers:
+
+- clear() on startup drops the files of an earlier run;
+- mark_process_dead(pid) on worker exit folds the worker's counters and
+  histograms into `metrics_dead.json` and deletes its file, so totals stay
+  monotonic while recycled workers leave nothing behind. Gauges of a dead
+  worker no longer describe anything and are dropped.
+
+Only the standard library is imported here, so the gunicorn config can call
+it in the master without importing Flask or creating locks before gevent
+patches the workers.
+"""
+
+import os
+import json
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+SNAPSHOT_PREFIX = "metrics_"
+DEAD_SNAPSHOT = "metrics_dead.json"
+
+
+def snapshot_path(pid) -> str:
+    return os.path.join(MULTIPROC_DIR, f"{SNAPSHOT_PREFIX}{pid}.json")
+
+
+def write(path: str, snapshot: Dict):
+    """Replace a snapshot file atomically"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def read(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def clear():
+    """Delete every snapshot in the directory, including the dead workers' totals"""
+    if not MULTIPROC_DIR or not os.path.isdir(MULTIPROC_DIR):
+        return
+    for filename in os.listdir(MULTIPROC_DIR):
+        if filename.startswith(SNAPSHOT_PREFIX):
+            try:
+                os.remove(os.path.join(MULTIPROC_DIR, filename))
+            except OSError as e:
+                logger.warning("Could not remove metrics snapshot %s: %s", filename, e)
+
+
+def _add(totals: Dict, samples):
+    for key, value in samples:
+        key = tuple(key)
+        if isinstance(value, (int, float)):  # counter
+            totals[key] = totals.get(key, 0) + value
+        elif isinstance(value[0], list):  # histogram: [bucket counts, sum]
+            counts, total = totals.get(key, [[0] * len(value[0]), 0.0])
+            totals[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+        # gauges ([value, set at]) of a dead process are dropped
+
+
+def mark_process_dead(pid):
+    """Fold an exited worker's snapshot into the dead workers' totals and delete it"""
+    if not MULTIPROC_DIR:
+        return
+    path = snapshot_path(pid)
+    try:
+        samples = read(path)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        logger.warning("Dropping unreadable metrics snapshot of worker %s: %s", pid, e)
+        os.remove(path)
+        return
+    dead_path = os.path.join(MULTIPROC_DIR, DEAD_SNAPSHOT)
+    try:
+        dead = read(dead_path)
+    except (OSError, ValueError):
+        dead = {}
+    merged = {}
+    for name in set(dead) | set(samples):
+        totals = {}
+        _add(totals, dead.get(name, []))
+        _add(totals, samples.get(name, []))
+        if totals:
+            merged[name] = [[list(key), value] for key, value in totals.items()]
+    write(dead_path, merged)
+    os.remove(path)
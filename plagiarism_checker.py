@@ -4,17 +4,20 @@ import ast
 import hashlib
 import requests
 import time
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Callable, Iterator
 from collections import defaultdict, Counter
 from functools import lru_cache
 import json
 import base64
+import logging
 
-from flask import Flask, request, jsonify
-from werkzeug.exceptions import BadRequest
-import numpy as np
-from datasketch import MinHashLSH, MinHash
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 class Config:
@@ -22,14 +25,18 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
     CACHE_TTL = 7200  # 2 hours (increased for Azure)
     MAX_FILES_TO_ANALYZE = 30  # Reduced for better token management
-    MAX_COMMITS_TO_ANALYZE = 50  # Reduced for better token management
-    RATE_LIMIT_DELAY = 2.0  # Increased delay for better token conservation
+    MAX_COMMITS_TO_ANALYZE = 1000  # Streamed 100 per page; memory use does not grow with this
+    MAX_CONTENT_FILES = 10  # Files whose contents are downloaded once per check
+    RATE_LIMIT_DELAY = float(os.getenv('GITHUB_RATE_LIMIT_DELAY', '2.0'))  # 0 disables client-side throttling
+    GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')  # e.g. a local fixture server
     
     # Inter-repo search limits for token conservation
     MAX_SEARCH_QUERIES = 8  # Maximum search queries per analysis
     MAX_RESULTS_PER_QUERY = 5  # Maximum results to process per query
     SNIPPET_MIN_LENGTH = 30  # Minimum snippet length for search
     SNIPPET_MAX_LENGTH = 150  # Maximum snippet length for search
+    SEARCH_CONCURRENCY = int(os.getenv('GITHUB_SEARCH_CONCURRENCY', '3'))  # Searches in flight, still paced by rate_limit()
+    SNIPPET_DUPLICATE_OVERLAP = 0.8  # Token overlap above which two snippets count as the same search
     
     # Scoring weights
     COMMIT_WEIGHT = 0.3
@@ -39,34 +46,49 @@ class Config:
     # Azure deployment settings
     AZURE_FRIENDLY = True
     TIMEOUT_SECONDS = 120  # 2 minutes timeout for Azure
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
+    ANALYSIS_DEADLINE_SECONDS = 150  # Global deadline shared by all analysis stages
 
 # Global cache and rate limiter
 _cache = {}
-_last_api_call = 0
+_next_api_slot = 0.0  # time.monotonic() at which the next API call may start
+_rate_limit_lock = threading.Lock()
 
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
 
-def rate_limit():
-    """Enhanced rate limiter with exponential backoff for API calls"""
-    global _last_api_call
-    now = time.time()
+def rate_limit(cancellation: Optional['CancellationToken'] = None):
+    """Enhanced rate limiter with exponential backoff for API calls
+    
+    Each caller reserves the next free slot under the lock and waits for it
+    after releasing the lock, so concurrent stages and checks share one API
+    budget without queueing behind each other's sleeps.
+    """
+    global _next_api_slot
     delay = Config.RATE_LIMIT_DELAY
     
+    if delay <= 0:
+        return
+    
     # Add jitter to avoid thundering herd
     import random
     jitter = random.uniform(0.1, 0.5)
     delay += jitter
     
-    if now - _last_api_call < delay:
-        sleep_time = delay - (now - _last_api_call)
-        time.sleep(sleep_time)
-    _last_api_call = time.time()
+    with _rate_limit_lock:
+        now = time.monotonic()
+        slot = max(now, _next_api_slot)
+        wait = slot - now
+        if cancellation is not None:
+            remaining = cancellation.time_remaining()
+            if remaining is not None and remaining < wait:
+                raise CheckCancelled("Deadline would pass while waiting for the rate limiter")
+        _next_api_slot = slot + delay
+    if wait > 0:
+        if cancellation is not None:
+            cancellation.sleep(wait)
+        else:
+            time.sleep(wait)
 
 def cache_get(key: str) -> Optional[Any]:
     """Get item from cache if not expired"""
@@ -95,6 +117,50 @@ def parse_github_url(url: str) -> Tuple[str, str]:
     
     raise ValueError("Invalid GitHub URL format")
 
+class CheckCancelled(Exception):
+    """Raised when a plagiarism check is cancelled or runs past its deadline"""
+    pass
+
+class CancellationToken:
+    """Deadline plus explicit cancel flag shared by every part of one plagiarism check"""
+    
+    def __init__(self, timeout_seconds: Optional[float] = None):
+        self.deadline = time.time() + timeout_seconds if timeout_seconds is not None else None
+        self._event = threading.Event()
+    
+    def cancel(self):
+        """Ask all work attached to this token to stop"""
+        self._event.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.time() >= self.deadline:
+            self._event.set()
+            return True
+        return False
+    
+    def time_remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if there is no deadline"""
+        if self._event.is_set():
+            return 0.0
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+    
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise CheckCancelled("Plagiarism check cancelled or deadline exceeded")
+    
+    def sleep(self, seconds: float):
+        """Wait `seconds`, or raise CheckCancelled if cancelled meanwhile or the deadline comes first"""
+        remaining = self.time_remaining()
+        if remaining is not None and remaining < seconds:
+            raise CheckCancelled("Deadline would pass while backing off")
+        if self._event.wait(seconds):
+            raise CheckCancelled("Plagiarism check cancelled while backing off")
+
 # ============================================================================
 # CODE NORMALIZATION
 # ============================================================================
@@ -102,20 +168,22 @@ def parse_github_url(url: str) -> Tuple[str, str]:
 class CodeNormalizer:
     """Normalizes code for similarity comparison"""
     
+    # Precompiled once; these run over every file we analyze
+    PYTHON_COMMENT_RE = re.compile(r'#[^\n]*|""".*?"""|' r"'''.*?'''", re.DOTALL)
+    C_STYLE_COMMENT_RE = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+    IDENTIFIER_RE = re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b')
+    RESERVED_WORDS = frozenset(['def', 'class', 'if', 'else', 'for', 'while', 'try', 'except',
+                                'import', 'from', 'return', 'print', 'len', 'range', 'str', 'int'])
+    
     @staticmethod
     def remove_comments(code: str, language: str = 'python') -> str:
         """Remove comments based on language"""
         if language in ['python', 'py']:
-            # Remove # comments
-            code = re.sub(r'#.*$', '', code, flags=re.MULTILINE)
-            # Remove """ and ''' strings (docstrings)
-            code = re.sub(r'""".*?"""', '', code, flags=re.DOTALL)
-            code = re.sub(r"'''.*?'''", '', code, flags=re.DOTALL)
+            # Remove # comments and """ / ''' strings (docstrings) in one scan
+            code = CodeNormalizer.PYTHON_COMMENT_RE.sub('', code)
         elif language in ['javascript', 'js', 'java', 'cpp', 'c']:
-            # Remove // comments
-            code = re.sub(r'//.*$', '', code, flags=re.MULTILINE)
-            # Remove /* */ comments
-            code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)
+            # Remove // and /* */ comments in one scan
+            code = CodeNormalizer.C_STYLE_COMMENT_RE.sub('', code)
         
         return code
     
@@ -130,20 +198,19 @@ class CodeNormalizer:
         """Replace variable names with generic placeholders"""
         # Simple variable normalization - replace identifiers
         # This is a basic implementation; AST-based would be better
-        words = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', code)
+        # Single pass: placeholders are numbered in order of first appearance
         var_map = {}
-        var_counter = 0
+        reserved = CodeNormalizer.RESERVED_WORDS
         
-        normalized = code
-        for word in set(words):
-            if word not in ['def', 'class', 'if', 'else', 'for', 'while', 'try', 'except',
-                           'import', 'from', 'return', 'print', 'len', 'range', 'str', 'int']:
-                if word not in var_map:
-                    var_map[word] = f'var{var_counter}'
-                    var_counter += 1
-                normalized = re.sub(r'\b' + re.escape(word) + r'\b', var_map[word], normalized)
+        def placeholder(match):
+            word = match.group(0)
+            if word in reserved:
+                return word
+            if word not in var_map:
+                var_map[word] = f'var{len(var_map)}'
+            return var_map[word]
         
-        return normalized
+        return CodeNormalizer.IDENTIFIER_RE.sub(placeholder, code)
     
     @classmethod
     def normalize_code(cls, code: str, language: str = 'python') -> str:
@@ -160,146 +227,313 @@ class CodeNormalizer:
 class GitHubService:
     """GitHub API interaction service"""
     
-    def __init__(self, token: str):
+    def __init__(self, token: str, base_url: Optional[str] = None):
         self.token = token
-        self.base_url = "https://api.github.com"
+        self.base_url = (base_url or Config.GITHUB_API_URL).rstrip("/")
         self.headers = {
             "Authorization": f"token {token}" if token else "",
             "Accept": "application/vnd.github.v3+json",
             "User-Agent": "PlagiarismChecker/1.0"
         }
     
-    def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Dict:
+    def _make_request(self, endpoint: str, params: Optional[Dict] = None,
+                      cancellation: Optional[CancellationToken] = None) -> Dict:
         """Make rate-limited API request with enhanced error handling"""
-        rate_limit()
+        data, _ = self._make_request_with_links(endpoint, params, cancellation)
+        return data
+    
+    def _make_request_with_links(self, endpoint: str, params: Optional[Dict] = None,
+                                 cancellation: Optional[CancellationToken] = None,
+                                 json_body: Optional[Dict] = None) -> Tuple[Any, Dict]:
+        """Make a rate-limited API request and also return its parsed Link header
+        
+        ``endpoint`` may be a path relative to base_url or an absolute URL taken
+        from a previous response's Link header. Requests with a ``json_body`` are
+        sent as POST and never cached.
+        """
+        if cancellation is not None:
+            cancellation.raise_if_cancelled()
         cache_key = f"github_{endpoint}_{hash(str(params))}"
         
-        # Check cache first
-        cached = cache_get(cache_key)
-        if cached:
-            return cached
-        
-        url = f"{self.base_url}/{endpoint}"
+        # Check cache first (cached responses do not consume the rate limit)
+        endpoint_kind = self._endpoint_kind(endpoint, json_body)
+        if json_body is None:
+            cached = cache_get(cache_key)
+            metrics.CACHE_REQUESTS.inc(cache="github", result="hit" if cached else "miss")
+            if cached:
+                return cached
+        
+        rate_limit(cancellation)
+        url = endpoint if endpoint.startswith(("http://", "https://")) else f"{self.base_url}/{endpoint}"
+        timeout = Config.TIMEOUT_SECONDS if hasattr(Config, 'TIMEOUT_SECONDS') else 30
+        if cancellation is not None:
+            cancellation.raise_if_cancelled()
+            remaining = cancellation.time_remaining()
+            if remaining is not None:
+                timeout = max(1.0, min(timeout, remaining))
         try:
-            response = requests.get(
-                url, 
-                headers=self.headers, 
-                params=params or {}, 
-                timeout=Config.TIMEOUT_SECONDS if hasattr(Config, 'TIMEOUT_SECONDS') else 30
-            )
+            with tracing.span("github.request", endpoint=endpoint_kind) as span_attributes, \
+                    metrics.GITHUB_REQUEST_SECONDS.time(endpoint=endpoint_kind):
+                if json_body is not None:
+                    response = requests.post(url, headers=self.headers, json=json_body, timeout=timeout)
+                else:
+                    response = requests.get(
+                        url, 
+                        headers=self.headers, 
+                        params=params or {}, 
+                        timeout=timeout
+                    )
+                span_attributes["status"] = response.status_code
+            metrics.GITHUB_REQUESTS.inc(endpoint=endpoint_kind, status=response.status_code)
+            quota = response.headers.get('X-RateLimit-Remaining')
+            if quota is not None and quota.isdigit():
+                metrics.GITHUB_RATE_LIMIT_REMAINING.set(
+                    int(quota), resource=response.headers.get('X-RateLimit-Resource', 'core'))
             
             # Enhanced rate limit handling
             if response.status_code == 403:
                 remaining = response.headers.get('X-RateLimit-Remaining', '0')
                 reset_time = response.headers.get('X-RateLimit-Reset', '0')
-                print(f"Rate limit hit. Remaining: {remaining}, Reset: {reset_time}")
+                logger.warning('Rate limit hit. Remaining: %s, Reset: %s', remaining, reset_time)
                 
                 # If we're close to rate limit, add exponential backoff
                 if int(remaining) < 10:
                     backoff_time = min(60, 2 ** (10 - int(remaining)))  # Max 60 seconds
-                    print(f"Low rate limit remaining, backing off for {backoff_time} seconds")
-                    time.sleep(backoff_time)
+                    logger.warning('Low rate limit remaining, backing off for %s seconds', backoff_time)
+                    if cancellation is not None:
+                        cancellation.sleep(backoff_time)
+                    else:
+                        time.sleep(backoff_time)
                 
                 raise Exception(f"GitHub API rate limit exceeded. Remaining: {remaining}")
             elif response.status_code == 422:
-                print(f"Search query validation failed: {response.text}")
-                return {"items": []} if "search" in endpoint else {}
+                logger.warning('Search query validation failed: %s', response.text)
+                return ({"items": []} if "search" in endpoint else {}), {}
             elif response.status_code != 200:
-                print(f"GitHub API error {response.status_code}: {response.text}")
+                logger.warning('GitHub API error %s: %s', response.status_code, response.text)
                 raise Exception(f"GitHub API error: {response.status_code}")
             
             data = response.json()
-            cache_set(cache_key, data)
-            return data
+            links = {rel: link.get("url") for rel, link in response.links.items()}
+            if json_body is None:
+                cache_set(cache_key, (data, links))
+            return data, links
         except requests.exceptions.RequestException as e:
-            print(f"Request failed: {e}")
-            return {"items": []} if "search" in endpoint else {}
+            metrics.GITHUB_REQUESTS.inc(endpoint=endpoint_kind, status="error")
+            logger.warning('Request failed: %s', e)
+            return ({"items": []} if "search" in endpoint else {}), {}
     
-    def get_repository_info(self, owner: str, repo: str) -> Dict:
+    @staticmethod
+    def _endpoint_kind(endpoint: str, json_body: Optional[Dict] = None) -> str:
+        """Coarse endpoint label for metrics (keeps repository names out of label values)"""
+        if json_body is not None:
+            return "graphql"
+        path = endpoint.split("?", 1)[0]
+        for marker, kind in (("search/", "search"), ("/commits", "commits"), ("/contents/", "contents"),
+                             ("/git/trees", "trees")):
+            if marker in path:
+                return kind
+        return "repository"
+    
+    def get_repository_info(self, owner: str, repo: str,
+                            cancellation: Optional[CancellationToken] = None) -> Dict:
         """Get basic repository information"""
-        return self._make_request(f"repos/{owner}/{repo}")
+        return self._make_request(f"repos/{owner}/{repo}", cancellation=cancellation)
     
-    def get_commits(self, owner: str, repo: str, limit: int = 100) -> List[Dict]:
+    def get_commits(self, owner: str, repo: str, limit: int = 100,
+                    cancellation: Optional[CancellationToken] = None) -> List[Dict]:
         """Get repository commits"""
         params = {"per_page": min(limit, 100)}
-        commits = self._make_request(f"repos/{owner}/{repo}/commits", params)
+        commits = self._make_request(f"repos/{owner}/{repo}/commits", params, cancellation)
         return commits[:limit] if isinstance(commits, list) else []
     
-    def get_file_content(self, owner: str, repo: str, path: str, ref: str = "main") -> Optional[str]:
+    def iter_commits(self, owner: str, repo: str, max_commits: Optional[int] = None,
+                     cancellation: Optional[CancellationToken] = None,
+                     totals: Optional[Dict] = None) -> Iterator[Dict]:
+        """Stream the default branch history newest-first, one page at a time
+        
+        Yields normalized commits ``{sha, message, author, date, additions, deletions}``.
+        With a token the GraphQL API is used so additions/deletions come back in bulk
+        (100 commits per call); otherwise REST pages are followed through the Link
+        header and the size fields are None. If ``totals`` is given, its
+        ``total_count`` key is set to the size of the full history when known.
+        """
+        if self.token:
+            try:
+                yield from self._iter_commits_graphql(owner, repo, max_commits, cancellation, totals)
+                return
+            except CheckCancelled:
+                raise
+            except Exception as e:
+                logger.warning('GraphQL commit history failed, falling back to REST: %s', e)
+        yield from self._iter_commits_rest(owner, repo, max_commits, cancellation, totals)
+    
+    COMMIT_HISTORY_QUERY = """
+    query($owner: String!, $name: String!, $cursor: String) {
+      repository(owner: $owner, name: $name) {
+        defaultBranchRef {
+          target {
+            ... on Commit {
+              history(first: 100, after: $cursor) {
+                totalCount
+                pageInfo { hasNextPage endCursor }
+                nodes { oid message additions deletions author { name date } }
+              }
+            }
+          }
+        }
+      }
+    }
+    """
+    
+    def _iter_commits_graphql(self, owner, repo, max_commits, cancellation, totals) -> Iterator[Dict]:
+        cursor = None
+        yielded = 0
+        while True:
+            body = {"query": self.COMMIT_HISTORY_QUERY,
+                    "variables": {"owner": owner, "name": repo, "cursor": cursor}}
+            data, _ = self._make_request_with_links("graphql", cancellation=cancellation, json_body=body)
+            if data.get("errors"):
+                raise Exception(f"GraphQL error: {data['errors'][0].get('message')}")
+            branch = ((data.get("data") or {}).get("repository") or {}).get("defaultBranchRef")
+            if not branch:
+                return
+            history = branch["target"]["history"]
+            if totals is not None:
+                totals["total_count"] = history.get("totalCount")
+            for node in history.get("nodes", []):
+                author = node.get("author") or {}
+                yield {
+                    "sha": node.get("oid"),
+                    "message": node.get("message") or "",
+                    "author": author.get("name"),
+                    "date": author.get("date"),
+                    "additions": node.get("additions"),
+                    "deletions": node.get("deletions"),
+                }
+                yielded += 1
+                if max_commits is not None and yielded >= max_commits:
+                    return
+            if not history["pageInfo"]["hasNextPage"]:
+                return
+            cursor = history["pageInfo"]["endCursor"]
+    
+    def _iter_commits_rest(self, owner, repo, max_commits, cancellation, totals) -> Iterator[Dict]:
+        endpoint = f"repos/{owner}/{repo}/commits"
+        params = {"per_page": 100}
+        yielded = 0
+        while endpoint:
+            page, links = self._make_request_with_links(endpoint, params, cancellation)
+            if not isinstance(page, list):
+                return
+            if totals is not None and "total_count" not in totals:
+                last_url = links.get("last")
+                match = re.search(r'[?&]page=(\d+)', last_url or "")
+                # Only an upper bound until the last page is reached
+                totals["total_count"] = int(match.group(1)) * 100 if match else len(page)
+            for item in page:
+                commit = item.get("commit", {})
+                author = commit.get("author") or {}
+                yield {
+                    "sha": item.get("sha"),
+                    "message": commit.get("message") or "",
+                    "author": author.get("name"),
+                    "date": author.get("date"),
+                    "additions": None,
+                    "deletions": None,
+                }
+                yielded += 1
+                if max_commits is not None and yielded >= max_commits:
+                    return
+            if not links.get("next") and totals is not None:
+                totals["total_count"] = yielded
+            # The next link already carries the query string
+            endpoint, params = links.get("next"), None
+    
+    def get_file_content(self, owner: str, repo: str, path: str, ref: str = "main",
+                         cancellation: Optional[CancellationToken] = None) -> Optional[str]:
         """Get file content from repository with enhanced error handling"""
-        print(f"Attempting to get content for file: {path}")
+        logger.debug('Attempting to get content for file: %s', path)
         
         # Try different branch names
-        branches_to_try = [ref, "main", "master"]
-        if ref not in branches_to_try:
-            branches_to_try.insert(0, ref)
+        branches_to_try = [ref] + [b for b in ("main", "master") if b != ref]
         
         for branch in branches_to_try:
             try:
-                print(f"Trying to get {path} from branch: {branch}")
-                data = self._make_request(f"repos/{owner}/{repo}/contents/{path}", {"ref": branch})
+                logger.debug('Trying to get %s from branch: %s', path, branch)
+                data = self._make_request(f"repos/{owner}/{repo}/contents/{path}", {"ref": branch}, cancellation)
                 
                 if data and data.get("encoding") == "base64":
                     try:
                         content = base64.b64decode(data["content"]).decode('utf-8', errors='ignore')
-                        print(f"Successfully retrieved content for {path} from {branch} ({len(content)} chars)")
+                        logger.debug('Successfully retrieved content for %s from %s (%s chars)', path, branch, len(content))
                         return content
                     except Exception as decode_error:
-                        print(f"Failed to decode content for {path}: {decode_error}")
+                        logger.warning('Failed to decode content for %s: %s', path, decode_error)
                         continue
                 else:
-                    print(f"No valid content data for {path} from {branch}")
+                    logger.debug('No valid content data for %s from %s', path, branch)
                     
+            except CheckCancelled:
+                raise
             except Exception as e:
-                print(f"Failed to get file content for {path} from {branch}: {e}")
+                logger.warning('Failed to get file content for %s from %s: %s', path, branch, e)
                 continue
         
-        print(f"Failed to get content for {path} from any branch")
+        logger.warning('Failed to get content for %s from any branch', path)
         return None
     
-    def get_repository_files(self, owner: str, repo: str, limit: int = 50) -> List[Dict]:
+    def get_repository_files(self, owner: str, repo: str, limit: int = 50,
+                             default_branch: Optional[str] = None,
+                             cancellation: Optional[CancellationToken] = None) -> List[Dict]:
         """Get repository file tree with enhanced error handling and debugging"""
         try:
-            print(f"Attempting to get repository files for {owner}/{repo}")
+            logger.debug('Attempting to get repository files for %s/%s', owner, repo)
             
             # Try main branch first, then master, then default branch
             branches_to_try = ["main", "master"]
             tree_data = None
             
-            # First, get repository info to find default branch
-            try:
-                repo_info = self._make_request(f"repos/{owner}/{repo}")
-                default_branch = repo_info.get("default_branch", "main")
-                if default_branch not in branches_to_try:
-                    branches_to_try.insert(0, default_branch)
-                print(f"Repository default branch: {default_branch}")
-            except Exception as e:
-                print(f"Could not get repo info: {e}")
+            # First, get repository info to find default branch (unless the caller already knows it)
+            if default_branch is None:
+                try:
+                    repo_info = self._make_request(f"repos/{owner}/{repo}", cancellation=cancellation)
+                    default_branch = repo_info.get("default_branch", "main")
+                except CheckCancelled:
+                    raise
+                except Exception as e:
+                    logger.warning('Could not get repo info: %s', e)
+            if default_branch:
+                if default_branch in branches_to_try:
+                    branches_to_try.remove(default_branch)
+                branches_to_try.insert(0, default_branch)
+                logger.debug('Repository default branch: %s', default_branch)
             
             # Try each branch
             for branch in branches_to_try:
                 try:
-                    print(f"Trying branch: {branch}")
-                    tree_data = self._make_request(f"repos/{owner}/{repo}/git/trees/{branch}", {"recursive": "1"})
+                    logger.debug('Trying branch: %s', branch)
+                    tree_data = self._make_request(f"repos/{owner}/{repo}/git/trees/{branch}", {"recursive": "1"}, cancellation)
                     if tree_data and "tree" in tree_data:
-                        print(f"Successfully retrieved tree from branch: {branch}")
+                        logger.debug('Successfully retrieved tree from branch: %s', branch)
                         break
                     else:
-                        print(f"No tree data from branch: {branch}")
+                        logger.debug('No tree data from branch: %s', branch)
+                except CheckCancelled:
+                    raise
                 except Exception as e:
-                    print(f"Failed to get tree from branch {branch}: {e}")
+                    logger.warning('Failed to get tree from branch %s: %s', branch, e)
                     continue
             
             if not tree_data or "tree" not in tree_data:
-                print("Failed to retrieve repository tree from any branch")
+                logger.warning('Failed to retrieve repository tree from any branch')
                 return []
             
-            print(f"Total items in repository tree: {len(tree_data.get('tree', []))}")
+            logger.debug('Total items in repository tree: %s', len(tree_data.get('tree', [])))
             
             files = []
             for item in tree_data.get("tree", []):
                 if item["type"] == "blob":
-                    print(f"Found blob: {item['path']} (size: {item.get('size', 'unknown')})")
                     
                     if self._is_code_file(item["path"]):
                         # Add size information if available
@@ -310,42 +544,45 @@ class GitHubService:
                             "url": item.get("url", "")
                         }
                         files.append(file_info)
-                        print(f"Added code file: {item['path']} (size: {item.get('size', 'unknown')})")
-                    else:
-                        print(f"Skipped non-code file: {item['path']}")
                     
                     if len(files) >= limit:
                         break
             
-            print(f"Found {len(files)} code files (limit: {limit})")
+            logger.debug('Found %s code files (limit: %s)', len(files), limit)
             return files
             
+        except CheckCancelled:
+            raise
         except Exception as e:
-            print(f"Failed to get repository files: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Failed to get repository files: %s', e)
             return []
     
-    def search_code(self, query: str, language: str = None, max_results: int = None) -> List[Dict]:
-        """Search for code across GitHub with enhanced filtering"""
-        # Clean and validate query
+    @staticmethod
+    def clean_search_query(query: str) -> str:
+        """The text search_code() actually searches for, or "" if it is too short to be useful"""
         query = query.strip()
         min_length = getattr(Config, 'SNIPPET_MIN_LENGTH', 30)
         max_length = getattr(Config, 'SNIPPET_MAX_LENGTH', 150)
         
         if len(query) < min_length:
-            print(f"Query too short ({len(query)} < {min_length}): {query[:50]}...")
-            return []
-        
-        # Truncate if too long
-        if len(query) > max_length:
-            query = query[:max_length]
+            logger.debug('Query too short (%s < %s): %s...', len(query), min_length, query[:50])
+            return ""
         
         # Enhanced query cleaning for better results
         query = re.sub(r'[^\w\s\(\)\{\}\[\]\.,;:]', ' ', query)
         query = re.sub(r'\s+', ' ', query).strip()
         
-        if len(query) < min_length:
+        # Truncate if too long, at a word boundary: a cut-off identifier matches nothing
+        if len(query) > max_length:
+            query = query[:max_length + 1].rsplit(' ', 1)[0]
+        
+        return query if len(query) >= min_length else ""
+    
+    def search_code(self, query: str, language: str = None, max_results: int = None,
+                    cancellation: Optional[CancellationToken] = None) -> List[Dict]:
+        """Search for code across GitHub with enhanced filtering"""
+        query = self.clean_search_query(query)
+        if not query:
             return []
         
         # Build search query with better escaping
@@ -361,13 +598,15 @@ class GitHubService:
         params = {"q": search_query, "per_page": max_results}
         
         try:
-            print(f"Searching GitHub for: {search_query[:100]}...")
-            result = self._make_request("search/code", params)
+            logger.debug('Searching GitHub for: %s...', search_query[:100])
+            result = self._make_request("search/code", params, cancellation)
             items = result.get("items", [])
-            print(f"Found {len(items)} results for query")
+            logger.debug('Found %s results for query', len(items))
             return items[:max_results]  # Ensure we don't exceed our limit
+        except CheckCancelled:
+            raise
         except Exception as e:
-            print(f"Search failed for query '{query[:50]}...': {e}")
+            logger.warning("Search failed for query '%s...': %s", query[:50], e)
             return []
     
     @staticmethod
@@ -415,54 +654,232 @@ class GitHubService:
         result = has_code_ext and not is_excluded
         
         if result:
-            print(f"✅ Accepted code file: {path}")
+            logger.debug('Accepted code file: %s', path)
         elif has_code_ext and is_excluded:
-            print(f"❌ Excluded code file: {path} (matches exclusion pattern)")
+            logger.debug('Excluded code file: %s (matches exclusion pattern)', path)
         else:
-            print(f"⏭️  Skipped file: {path} (not recognized as code)")
+            logger.debug('Skipped file: %s (not recognized as code)', path)
         
         return result
 
+# ============================================================================
+# ANALYSIS CONTEXT
+# ============================================================================
+
+class AnalysisContext:
+    """Shared inputs for a single repository check, fetched once and read by every stage"""
+
+    def __init__(self, owner: str, repo: str, repo_info: Dict, files: List[Dict],
+                 file_contents: Dict[str, str], cancellation: CancellationToken):
+        self.owner = owner
+        self.repo = repo
+        self.repo_info = repo_info
+        self.files = files
+        self.file_contents = file_contents
+        self.cancellation = cancellation
+
+    @property
+    def default_branch(self) -> str:
+        return self.repo_info.get("default_branch", "main")
+
+    def time_remaining(self) -> Optional[float]:
+        """Seconds left before the global analysis deadline"""
+        return self.cancellation.time_remaining()
+
+    def expired(self) -> bool:
+        """Check whether the check was cancelled or the global deadline has passed"""
+        return self.cancellation.cancelled
+
+    @classmethod
+    def build(cls, github_service: 'GitHubService', owner: str, repo: str,
+              cancellation: CancellationToken) -> 'AnalysisContext':
+        """Fetch repository info, tree and file contents once for all analysis stages"""
+        repo_info = github_service.get_repository_info(owner, repo, cancellation)
+        if not repo_info:
+            raise Exception("Repository not found or inaccessible")
+
+        default_branch = repo_info.get("default_branch", "main")
+        max_files = min(Config.MAX_FILES_TO_ANALYZE, 20)
+        files = []
+        file_contents = {}
+        try:
+            files = github_service.get_repository_files(owner, repo, max_files, default_branch, cancellation)
+            for file_info in files[:Config.MAX_CONTENT_FILES]:
+                content = github_service.get_file_content(owner, repo, file_info["path"], default_branch, cancellation)
+                if content:
+                    file_contents[file_info["path"]] = content
+        except CheckCancelled:
+            # Keep whatever was fetched so the stages can still report partial results
+            logger.warning('Analysis cancelled while fetching repository contents')
+
+        logger.info('Analysis context ready: %s files, %s with content', len(files), len(file_contents))
+        return cls(owner, repo, repo_info, files, file_contents, cancellation)
+
 # ============================================================================
 # COMMIT ANALYSIS
 # ============================================================================
 
+class CommitStats:
+    """Streaming accumulator for commit history features
+    
+    Commits are fed newest-first one at a time; memory stays bounded no matter
+    how long the history is (message hashes and author names are capped).
+    """
+    
+    MAX_TRACKED_MESSAGES = 20000
+    MAX_TRACKED_AUTHORS = 1000
+    BULK_COMMIT_LINES = 1000  # Commits adding more lines than this look like code dumps
+    
+    def __init__(self, repo_created_at: Optional[datetime] = None):
+        self.repo_created_at = repo_created_at
+        self.count = 0
+        # Timing
+        self.dated = 0
+        self.rapid = 0
+        self.pre_creation = 0
+        self.earliest = None
+        self.latest = None
+        self._previous_timestamp = None
+        # Messages
+        self.generic_messages = 0
+        self.duplicate_messages = 0
+        self._message_hashes = set()
+        # Authors
+        self.author_counts = Counter()
+        self.authored = 0
+        # Sizes
+        self.sized = 0
+        self.additions = 0
+        self.deletions = 0
+        self.max_additions = 0
+        self.bulk_commits = 0
+    
+    def add(self, commit: Dict, generic_message: bool):
+        self.count += 1
+        
+        try:
+            timestamp = datetime.fromisoformat(commit["date"].replace('Z', '+00:00'))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            timestamp = None
+        if timestamp is not None:
+            self.dated += 1
+            if self._previous_timestamp is not None:
+                diff = (self._previous_timestamp - timestamp).total_seconds() / 60  # minutes
+                if diff < 5:  # < 5 minutes apart
+                    self.rapid += 1
+            self._previous_timestamp = timestamp
+            self.earliest = timestamp if self.earliest is None else min(self.earliest, timestamp)
+            self.latest = timestamp if self.latest is None else max(self.latest, timestamp)
+            if self.repo_created_at is not None and timestamp < self.repo_created_at:
+                self.pre_creation += 1
+        
+        if generic_message:
+            self.generic_messages += 1
+        message_hash = hash(commit.get("message", "").lower().strip())
+        if message_hash in self._message_hashes:
+            self.duplicate_messages += 1
+        elif len(self._message_hashes) < self.MAX_TRACKED_MESSAGES:
+            self._message_hashes.add(message_hash)
+        
+        author = commit.get("author")
+        if author:
+            self.authored += 1
+            if author in self.author_counts or len(self.author_counts) < self.MAX_TRACKED_AUTHORS:
+                self.author_counts[author] += 1
+        
+        if commit.get("additions") is not None:
+            additions = commit["additions"]
+            self.sized += 1
+            self.additions += additions
+            self.deletions += commit.get("deletions") or 0
+            self.max_additions = max(self.max_additions, additions)
+            if additions > self.BULK_COMMIT_LINES:
+                self.bulk_commits += 1
+    
+    def size_summary(self) -> Dict:
+        return {
+            "commits_with_stats": self.sized,
+            "total_additions": self.additions,
+            "total_deletions": self.deletions,
+            "mean_additions": round(self.additions / self.sized, 1) if self.sized else 0,
+            "max_additions": self.max_additions,
+            "bulk_commits": self.bulk_commits
+        }
+
 class CommitAnalyzer:
     """Analyzes commit patterns for suspicious behavior"""
     
+    # Generic message patterns, combined into one alternation
+    GENERIC_MESSAGE_RE = re.compile(
+        r'^(?:initial commit|first commit'
+        r'|update|updated'
+        r'|fix|fixed'
+        r'|commit|new'
+        r'|[a-zA-Z]'       # Single character
+        r'|\d+)$'          # Just numbers
+    )
+    # Suspicious author names
+    SUSPICIOUS_AUTHOR_RE = re.compile(
+        r'^(?:user\d*|admin\d*|test\d*'
+        r'|[a-zA-Z]{1,3}\d+)$',  # Very short names with numbers
+        re.IGNORECASE
+    )
+    
     def __init__(self, github_service: GitHubService):
         self.github = github_service
     
-    def analyze_commits(self, owner: str, repo: str) -> Dict:
-        """Analyze commit patterns for plagiarism indicators"""
-        commits = self.github.get_commits(owner, repo, Config.MAX_COMMITS_TO_ANALYZE)
+    def analyze_commits(self, owner: str, repo: str,
+                        cancellation: Optional[CancellationToken] = None,
+                        repo_info: Optional[Dict] = None) -> Dict:
+        """Analyze commit patterns for plagiarism indicators over the streamed history"""
+        repo_created_at = None
+        if repo_info and repo_info.get("created_at"):
+            try:
+                repo_created_at = datetime.fromisoformat(repo_info["created_at"].replace('Z', '+00:00'))
+            except ValueError:
+                pass
         
-        if not commits:
+        stats = CommitStats(repo_created_at)
+        totals = {}
+        incomplete = False
+        try:
+            for commit in self.github.iter_commits(owner, repo, Config.MAX_COMMITS_TO_ANALYZE,
+                                                   cancellation, totals):
+                stats.add(commit, self._is_generic_message(commit["message"]))
+        except CheckCancelled:
+            # Score whatever history was streamed before the deadline
+            if not stats.count:
+                raise
+            incomplete = True
+        
+        if not stats.count:
             return {"score": 0, "indicators": [], "commit_count": 0}
         
         indicators = []
         score = 0
         
         # Analyze commit timing
-        timing_score = self._analyze_commit_timing(commits)
+        timing_score = self._analyze_commit_timing(stats)
         score += timing_score
         if timing_score > 50:
             indicators.append("Suspicious commit timing patterns")
+        if stats.pre_creation and stats.pre_creation >= stats.dated * 0.5:
+            indicators.append("Commit history predates repository creation (imported history)")
         
         # Analyze commit messages
-        message_score = self._analyze_commit_messages(commits)
+        message_score = self._analyze_commit_messages(stats)
         score += message_score
         if message_score > 50:
             indicators.append("Generic or suspicious commit messages")
         
-        # Analyze commit sizes - simplified
-        size_score = self._analyze_commit_sizes(commits)
+        # Analyze commit sizes
+        size_score = self._analyze_commit_sizes(stats)
         score += size_score
         if size_score > 50:
             indicators.append("Unusual commit size patterns")
         
         # Analyze author patterns
-        author_score = self._analyze_authors(commits)
+        author_score = self._analyze_authors(stats)
         score += author_score
         if author_score > 50:
             indicators.append("Suspicious author patterns")
@@ -470,115 +887,77 @@ class CommitAnalyzer:
         return {
             "score": min(score / 4, 100),  # Average of all scores
             "indicators": indicators,
-            "commit_count": len(commits),
+            "commit_count": stats.count,
+            "total_commits": totals.get("total_count", stats.count),
+            "incomplete": incomplete,
             "details": {
                 "timing_score": timing_score,
                 "message_score": message_score,
                 "size_score": size_score,
-                "author_score": author_score
+                "author_score": author_score,
+                "pre_creation_commits": stats.pre_creation,
+                "first_commit_at": stats.earliest.isoformat() if stats.earliest else None,
+                "last_commit_at": stats.latest.isoformat() if stats.latest else None,
+                "size_stats": stats.size_summary()
             }
         }
     
-    def _analyze_commit_timing(self, commits: List[Dict]) -> float:
+    def _analyze_commit_timing(self, stats: CommitStats) -> float:
         """Analyze commit timing patterns"""
-        if len(commits) < 2:
+        if stats.dated < 2:
             return 0
         
-        timestamps = []
-        for commit in commits:
-            try:
-                timestamp = datetime.fromisoformat(commit["commit"]["author"]["date"].replace('Z', '+00:00'))
-                timestamps.append(timestamp)
-            except:
-                continue
-        
-        if len(timestamps) < 2:
-            return 0
+        # Score based on how many commits were made in rapid succession, or
+        # were authored before the repository existed (bulk-imported history)
+        bulk_ratio = stats.rapid / (stats.dated - 1)
+        pre_creation_ratio = stats.pre_creation / stats.dated
         
-        # Check for bulk commits (many commits in short time)
-        time_diffs = []
-        for i in range(1, len(timestamps)):
-            diff = (timestamps[i-1] - timestamps[i]).total_seconds() / 60  # minutes
-            time_diffs.append(diff)
-        
-        # Score based on how many commits were made in rapid succession
-        rapid_commits = sum(1 for diff in time_diffs if diff < 5)  # < 5 minutes apart
-        bulk_ratio = rapid_commits / len(time_diffs) if time_diffs else 0
-        
-        return min(bulk_ratio * 100, 100)
+        return min(max(bulk_ratio, pre_creation_ratio) * 100, 100)
+    
+    def _is_generic_message(self, message: str) -> bool:
+        """Check whether a commit message is generic"""
+        return self.GENERIC_MESSAGE_RE.match(message.lower().strip()) is not None
     
-    def _analyze_commit_messages(self, commits: List[Dict]) -> float:
+    def _analyze_commit_messages(self, stats: CommitStats) -> float:
         """Analyze commit message quality"""
-        messages = [commit["commit"]["message"].lower().strip() for commit in commits]
-        
-        # Generic message patterns
-        generic_patterns = [
-            r'^(initial commit|first commit)$',
-            r'^(update|updated)$',
-            r'^(fix|fixed)$',
-            r'^(commit|new)$',
-            r'^[a-zA-Z]$',  # Single character
-            r'^\d+$',       # Just numbers
-        ]
-        
-        generic_count = 0
-        for message in messages:
-            for pattern in generic_patterns:
-                if re.match(pattern, message):
-                    generic_count += 1
-                    break
-        
-        # Check for duplicate messages
-        message_counts = Counter(messages)
-        duplicate_ratio = sum(count - 1 for count in message_counts.values()) / len(messages)
-        
-        generic_ratio = generic_count / len(messages) if messages else 0
+        duplicate_ratio = stats.duplicate_messages / stats.count
+        generic_ratio = stats.generic_messages / stats.count if stats.count else 0
         
         return min((generic_ratio + duplicate_ratio) * 100, 100)
     
-    def _analyze_commit_sizes(self, commits: List[Dict]) -> float:
-        """Analyze commit size patterns (simplified version)"""
-        # Simple heuristic: if there are very few commits for a large codebase, it's suspicious
-        if len(commits) < 5:
-            return 70  # Suspicious: very few commits
-        elif len(commits) < 10:
-            return 30  # Somewhat suspicious
-        else:
-            return 0   # Normal
+    def _analyze_commit_sizes(self, stats: CommitStats) -> float:
+        """Analyze commit size patterns"""
+        if not stats.sized:
+            # No per-commit stats (unauthenticated REST): very few commits for a codebase is suspicious
+            if stats.count < 5:
+                return 70  # Suspicious: very few commits
+            elif stats.count < 10:
+                return 30  # Somewhat suspicious
+            else:
+                return 0   # Normal
+        
+        score = 0
+        # One commit carrying most of the code looks like a dump of finished work
+        if stats.additions >= 500:
+            score += (stats.max_additions / stats.additions) * 70
+        score += (stats.bulk_commits / stats.sized) * 30
+        if stats.count < 5:
+            score += 30
+        return min(score, 100)
     
-    def _analyze_authors(self, commits: List[Dict]) -> float:
+    def _analyze_authors(self, stats: CommitStats) -> float:
         """Analyze author patterns"""
-        authors = []
-        for commit in commits:
-            try:
-                author = commit["commit"]["author"]["name"]
-                authors.append(author)
-            except:
-                continue
-        
-        if not authors:
+        if not stats.authored:
             return 0
         
         # Check for single author doing everything (suspicious for group projects)
-        author_counts = Counter(authors)
-        dominant_author_ratio = max(author_counts.values()) / len(authors)
+        author_counts = stats.author_counts
+        dominant_author_ratio = max(author_counts.values()) / stats.authored
         
         # Check for suspicious author names
-        suspicious_patterns = [
-            r'^user\d*$',
-            r'^admin\d*$',
-            r'^test\d*$',
-            r'^[a-zA-Z]{1,3}\d+$',  # Very short names with numbers
-        ]
-        
-        suspicious_authors = 0
-        for author in set(authors):
-            for pattern in suspicious_patterns:
-                if re.match(pattern, author.lower()):
-                    suspicious_authors += 1
-                    break
+        suspicious_authors = sum(1 for author in author_counts if self.SUSPICIOUS_AUTHOR_RE.match(author))
         
-        suspicious_ratio = suspicious_authors / len(set(authors)) if authors else 0
+        suspicious_ratio = suspicious_authors / len(author_counts) if author_counts else 0
         
         # Score based on dominance and suspicious names
         score = (dominant_author_ratio * 50) + (suspicious_ratio * 50)
@@ -591,47 +970,99 @@ class CommitAnalyzer:
 class SimilarityService:
     """Code similarity detection using multiple methods"""
     
+    # Heuristic pattern tables. Each is one precompiled alternation so a line is
+    # scanned once instead of once per pattern.
+    DEFINITION_RE = re.compile(
+        r'^\s*(?:(?:def|class|function|public\s+class|private\s+class)\s+\w+'
+        r'|(?:public|private|protected)\s+\w+\s+\w+\s*\('
+        r'|\w+\s*=\s*function\s*\()'
+    )
+    CONTROL_FLOW_RE = re.compile(r'^\s*(?:for|while|if)\s+')
+    MEANINGFUL_LOGIC_RE = re.compile(
+        r'[+\-*/=<>!&|]'  # Operators
+        r'|\w+\s*[(\[]'  # Function calls / array access
+        r'|\.\w+'         # Method calls
+    )
+    ALGORITHMIC_RE = re.compile(
+        r'\w+\s*=\s*\w+.*[+\-*/]'           # Calculations
+        r'|(?:sort|filter|map|reduce)\s*\('  # Data processing
+        r'|(?:if|while|for)\s+.*[<>=!]'       # Control flow with conditions
+        r'|\w+\.(?:append|push|pop|insert)'  # Data structure operations
+    )
+    COMMON_LINE_RE = re.compile(
+        r'^(?:(?:import|from)\s+'
+        r'|(?:def|class)\s+\w+'
+        r'|(?:if|for|while|try)'
+        r'|(?:return|print|pass)$'
+        r'|\s*[{}()\[\]]+\s*$'
+        r'|\s*(?:#|//|\*))',  # Comments
+        re.IGNORECASE
+    )
+    COMMON_BLOCK_LINE_RE = re.compile(
+        r'^\s*(?:(?:import|from)\s+'
+        r'|(?:def|class)\s+\w+'
+        r'|(?:if|for|while)'
+        r'|(?:return|print)'
+        r'|[{}()\[\]]+\s*$)',
+        re.IGNORECASE
+    )
+    # Lines that carry no searchable content: only brackets, imports or comments
+    TRIVIAL_LINE_RE = re.compile(r'^(?:[{}()\[\]\s]*$|import|from|#|//)')
+    LONG_IDENTIFIER_RE = re.compile(r'\w{6,}')
+    OPERATOR_RE = re.compile(r'[+\-*/=<>!&|]')
+    GENERIC_SNIPPET_RE = re.compile(r'^\s*(?:print|console\.log|return|if\s+True)')
+    WHITESPACE_RE = re.compile(r'\s+')
+    SEARCH_TOKEN_RE = re.compile(r'\w+')
+    
     def __init__(self, github_service: GitHubService):
         self.github = github_service
         self.normalizer = CodeNormalizer()
     
-    def analyze_intra_repo_similarity(self, owner: str, repo: str) -> Dict:
+    def analyze_intra_repo_similarity(self, owner: str, repo: str,
+                                      context: Optional[AnalysisContext] = None) -> Dict:
         """Analyze similarity within the repository with enhanced debugging"""
-        print(f"Starting intra-repository analysis for {owner}/{repo}")
-        
-        max_files = min(Config.MAX_FILES_TO_ANALYZE, 20)  # Reasonable limit
-        files = self.github.get_repository_files(owner, repo, max_files)
-        
-        print(f"Retrieved {len(files)} files for intra-repo analysis")
-        
+        logger.debug('Starting intra-repository analysis for %s/%s', owner, repo)
+
+        if context is None:
+            context = AnalysisContext.build(self.github, owner, repo,
+                                            CancellationToken(Config.ANALYSIS_DEADLINE_SECONDS))
+        files = context.files
+
+        logger.debug('Retrieved %s files for intra-repo analysis', len(files))
+
         if len(files) < 2:
-            print(f"Not enough files for comparison: {len(files)}")
+            logger.debug('Not enough files for comparison: %s', len(files))
             return {"score": 0, "similar_files": [], "file_count": len(files)}
-        
+
         # Get file contents
         file_contents = {}
-        for file_info in files[:10]:  # Limit to avoid too many API calls
-            content = self.github.get_file_content(owner, repo, file_info["path"])
+        for file_info in files[:Config.MAX_CONTENT_FILES]:  # Limit to avoid too many API calls
+            content = context.file_contents.get(file_info["path"])
             if content and len(content.strip()) > 50:  # Only include substantial files
                 file_contents[file_info["path"]] = content
-                print(f"Loaded content for {file_info['path']} ({len(content)} chars)")
+                logger.debug('Loaded content for %s (%s chars)', file_info['path'], len(content))
             else:
-                print(f"Skipped {file_info['path']} - content too small or unavailable")
+                logger.debug('Skipped %s - content too small or unavailable', file_info['path'])
         
-        print(f"Loaded content for {len(file_contents)} files")
+        logger.debug('Loaded content for %s files', len(file_contents))
         
         if len(file_contents) < 2:
-            print("Not enough files with content for comparison")
+            logger.debug('Not enough files with content for comparison')
             return {"score": 0, "similar_files": [], "file_count": len(file_contents)}
         
         # Compare files for similarity
         similar_pairs = []
         file_paths = list(file_contents.keys())
         
-        print(f"Comparing {len(file_paths)} files for similarity...")
+        logger.debug('Comparing %s files for similarity...', len(file_paths))
         
         comparisons_made = 0
+        incomplete = False
         for i in range(len(file_paths)):
+            if context.expired():
+                logger.warning('Analysis deadline reached during intra-repo comparisons')
+                incomplete = True
+                break
             for j in range(i + 1, len(file_paths)):
                 path1, path2 = file_paths[i], file_paths[j]
                 
@@ -642,7 +1073,7 @@ class SimilarityService:
                     )
                     
                     comparisons_made += 1
-                    print(f"Similarity between {path1} and {path2}: {similarity:.3f}")
+                    logger.debug('Similarity between %s and %s: %.3f', path1, path2, similarity)
                     
                     if similarity > 0.6:  # 60% similarity threshold
                         similar_pairs.append({
@@ -650,161 +1081,217 @@ class SimilarityService:
                             "file2": path2,
                             "similarity": round(similarity, 3)
                         })
-                        print(f"Added similar pair: {path1} <-> {path2} ({similarity:.3f})")
+                        logger.debug('Added similar pair: %s <-> %s (%.3f)', path1, path2, similarity)
                         
                 except Exception as e:
-                    print(f"Error comparing {path1} and {path2}: {e}")
+                    logger.warning('Error comparing %s and %s: %s', path1, path2, e)
                     continue
         
-        print(f"Made {comparisons_made} comparisons, found {len(similar_pairs)} similar pairs")
+        logger.debug('Made %s comparisons, found %s similar pairs', comparisons_made, len(similar_pairs))
         
         # Calculate score based on similar pairs
         max_possible_pairs = len(file_paths) * (len(file_paths) - 1) // 2
         similarity_ratio = len(similar_pairs) / max_possible_pairs if max_possible_pairs > 0 else 0
         
         score = min(similarity_ratio * 200, 100)  # Amplify the score
-        print(f"Intra-repo similarity score: {score:.2f}%")
+        logger.debug('Intra-repo similarity score: %.2f%%', score)
         
         return {
             "score": score,
             "similar_files": similar_pairs,
             "file_count": len(file_contents),
-            "comparisons_made": comparisons_made
+            "comparisons_made": comparisons_made,
+            "incomplete": incomplete
         }
     
-    def analyze_inter_repo_similarity(self, owner: str, repo: str) -> Dict:
-        """Analyze similarity with other repositories - ENHANCED VERSION"""
-        # Inter-repo analysis with enhanced debugging
+    def analyze_inter_repo_similarity(self, owner: str, repo: str,
+                                      context: Optional[AnalysisContext] = None) -> Dict:
+        """Analyze similarity with other repositories
+        
+        Candidate snippets from all analyzed files are scored together, near-duplicates
+        are dropped, and the search budget (MAX_SEARCH_QUERIES) is spent on the best ones
+        overall, up to SEARCH_CONCURRENCY searches at a time through the shared rate limiter.
+        """
+        if context is None:
+            context = AnalysisContext.build(self.github, owner, repo,
+                                            CancellationToken(Config.ANALYSIS_DEADLINE_SECONDS))
         max_files = min(10, getattr(Config, 'MAX_FILES_TO_ANALYZE', 30) // 3)
-        files = self.github.get_repository_files(owner, repo, max_files)
+        files = context.files[:max_files]
         
-        print(f"Retrieved {len(files)} files for inter-repo analysis")
+        logger.debug('Retrieved %s files for inter-repo analysis', len(files))
         
         if not files:
-            print("No files found for inter-repository analysis")
+            logger.debug('No files found for inter-repository analysis')
             return {"score": 0, "matches": [], "files_checked": 0, "search_attempts": 0}
         
-        matches = []
-        files_checked = 0
-        total_search_attempts = 0
         max_search_queries = getattr(Config, 'MAX_SEARCH_QUERIES', 8)
+        candidates, files_checked, incomplete = self._collect_search_candidates(context, files)
+        queries = self._select_search_queries(candidates, max_search_queries)
+        logger.debug('Searching %s of %s candidate snippets from %s files', len(queries), len(candidates), files_checked)
         
-        print(f"Analyzing {len(files)} files for inter-repo similarity (max {max_search_queries} searches)...")
+        matches, search_attempts, cancelled = self._run_searches(queries, owner, repo, files_checked, context)
+        incomplete = incomplete or cancelled
+        matches.sort(key=lambda m: m["confidence"], reverse=True)
         
-        # Prioritize larger, more significant files
-        prioritized_files = self._prioritize_files_for_analysis(files, owner, repo)
+        # Enhanced scoring based on match quality
+        score = self._calculate_inter_repo_score(matches, files_checked, search_attempts)
         
-        for file_info in prioritized_files[:max_files]:  # Respect file limit
-            if total_search_attempts >= max_search_queries:
-                print(f"Reached maximum search queries limit ({max_search_queries})")
-                break
-                
-            content = self.github.get_file_content(owner, repo, file_info["path"])
+        logger.info('Inter-repo analysis complete: %s matches found from %s files, %s searches', len(matches), files_checked, search_attempts)
+        
+        return {
+            "score": score,
+            "matches": matches[:10],  # Limit returned matches
+            "files_checked": files_checked,
+            "search_attempts": search_attempts,
+            "high_confidence_matches": len([m for m in matches if m.get('confidence', 0) > 0.7]),
+            "incomplete": incomplete
+        }
+    
+    def _collect_search_candidates(self, context: AnalysisContext, files: List[Dict]) -> Tuple[List[Dict], int, bool]:
+        """Searchable snippets of every file with their quality; also files checked and whether time ran out"""
+        candidates = []
+        files_checked = 0
+        prioritized_files = self._prioritize_files_for_analysis(files, context.owner, context.repo)
+        for file_rank, file_info in enumerate(prioritized_files):
+            if context.expired():
+                logger.warning('Analysis deadline reached while collecting snippets for inter-repo search')
+                return candidates, files_checked, True
+            
+            content = context.file_contents.get(file_info["path"])
+            if content is None:
+                try:
+                    content = self.github.get_file_content(context.owner, context.repo, file_info["path"],
+                                                           context.default_branch, context.cancellation)
+                except CheckCancelled:
+                    return candidates, files_checked, True
             if not content or len(content.strip()) < 100:  # Skip small files
                 continue
             
             files_checked += 1
-            print(f"Checking file: {file_info['path']} ({len(content)} chars)")
-            
-            # Extract high-quality snippets for searching
-            snippets = self._extract_high_quality_snippets(content, file_info["path"])
-            
-            # Limit snippets per file to conserve API calls
-            max_snippets_per_file = max(1, max_search_queries // max_files)
-            
-            for snippet in snippets[:max_snippets_per_file]:
-                if total_search_attempts >= max_search_queries:
-                    break
-                    
-                if not self._is_snippet_worth_searching(snippet):
+            language = self._get_language_from_path(file_info["path"])
+            for snippet in self._extract_snippet_candidates(content, file_info["path"]):
+                query = GitHubService.clean_search_query(snippet)
+                if not query or not self._is_snippet_worth_searching(snippet):
                     continue
-                
-                total_search_attempts += 1
-                
-                # Determine language from file extension
-                language = self._get_language_from_path(file_info["path"])
-                
-                # Search for similar code with conservative limits
-                search_results = self.github.search_code(
-                    snippet, 
-                    language, 
-                    max_results=getattr(Config, 'MAX_RESULTS_PER_QUERY', 5)
-                )
+                candidates.append({
+                    "file": file_info["path"],
+                    "snippet": snippet,
+                    "query": query,
+                    "language": language,
+                    "quality": self._snippet_quality(snippet),
+                    "file_rank": file_rank,
+                })
+        return candidates, files_checked, False
+    
+    def _select_search_queries(self, candidates: List[Dict], budget: int) -> List[Dict]:
+        """The best candidates overall, skipping any that would search for nearly the same text"""
+        selected = []
+        selected_tokens = []
+        for candidate in sorted(candidates, key=lambda c: (-c["quality"], c["file_rank"])):
+            if len(selected) >= budget:
+                break
+            tokens = set(self.SEARCH_TOKEN_RE.findall(candidate["query"].lower()))
+            if any(self._near_duplicate(tokens, other) for other in selected_tokens):
+                continue
+            selected.append(candidate)
+            selected_tokens.append(tokens)
+        return selected
+    
+    @staticmethod
+    def _near_duplicate(tokens: set, other: set) -> bool:
+        """Whether most tokens of the smaller set also appear in the other (a snippet inside a larger one counts)"""
+        smaller = min(len(tokens), len(other))
+        if smaller == 0:
+            return tokens == other
+        return len(tokens & other) / smaller >= Config.SNIPPET_DUPLICATE_OVERLAP
+    
+    def _run_searches(self, queries: List[Dict], owner: str, repo: str, files_checked: int,
+                      context: AnalysisContext) -> Tuple[List[Dict], int, bool]:
+        """Run the selected searches concurrently; returns matches, searches made and whether it was cut short"""
+        matches = []
+        if not queries:
+            return matches, 0, False
+        
+        max_results = getattr(Config, 'MAX_RESULTS_PER_QUERY', 5)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(Config.SEARCH_CONCURRENCY, len(queries))),
+                                      thread_name_prefix="plagiarism-search")
+        futures = {executor.submit(tracing.propagating(self.github.search_code), query["snippet"], query["language"],
+                                   max_results=max_results, cancellation=context.cancellation): query
+                   for query in queries}
+        search_attempts = 0
+        cancelled = False
+        try:
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    search_results = future.result()
+                except CancelledError:
+                    continue
+                except CheckCancelled:
+                    # Report the matches found so far instead of discarding them
+                    cancelled = True
+                    continue
+                search_attempts += 1
                 
                 # Process results with quality filtering
                 for result in search_results:
                     result_repo = f"{result['repository']['owner']['login']}/{result['repository']['name']}"
                     if result_repo != f"{owner}/{repo}":
                         # Calculate similarity confidence
-                        confidence = self._calculate_match_confidence(snippet, result)
+                        confidence = self._calculate_match_confidence(query["snippet"], result)
                         
                         match_data = {
-                            "file": file_info["path"],
+                            "file": query["file"],
                             "match_repo": result_repo,
                             "match_file": result["path"],
-                            "snippet": snippet[:100] + "..." if len(snippet) > 100 else snippet,
+                            "snippet": query["snippet"][:100] + "..." if len(query["snippet"]) > 100 else query["snippet"],
                             "match_url": result.get("html_url", ""),
                             "confidence": confidence,
-                            "language": language or "unknown"
+                            "language": query["language"] or "unknown"
                         }
                         matches.append(match_data)
-                        print(f"Found match in {result_repo} (confidence: {confidence:.2f})")
+                        logger.debug('Found match in %s (confidence: %.2f)', result_repo, confidence)
                 
-                # Stop if we have sufficient high-quality matches
-                high_conf_matches = [m for m in matches if m.get('confidence', 0) > 0.7]
-                if len(high_conf_matches) >= 3:
-                    print("Found sufficient high-confidence matches, stopping search")
+                # Searches not started yet are not needed once the score is at its maximum
+                if self._calculate_inter_repo_score(matches, files_checked, search_attempts) >= 100:
+                    logger.debug('Inter-repo score saturated after %s searches, skipping the rest', search_attempts)
                     break
-            
-            # Stop file processing if we have enough evidence
-            if len(matches) >= 5:
-                break
-        
-        # Enhanced scoring based on match quality
-        score = self._calculate_inter_repo_score(matches, files_checked, total_search_attempts)
-        
-        print(f"Inter-repo analysis complete: {len(matches)} matches found from {files_checked} files, {total_search_attempts} searches")
-        
-        return {
-            "score": score,
-            "matches": matches[:10],  # Limit returned matches
-            "files_checked": files_checked,
-            "search_attempts": total_search_attempts,
-            "high_confidence_matches": len([m for m in matches if m.get('confidence', 0) > 0.7])
-        }
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return matches, search_attempts, cancelled
     
     def _extract_high_quality_snippets(self, content: str, file_path: str) -> List[str]:
         """Extract high-quality code snippets optimized for searching"""
+        prioritized = self._prioritize_snippets_by_quality(self._extract_snippet_candidates(content, file_path), file_path)
+        return prioritized[:3]  # Return top 3 quality snippets
+    
+    def _extract_snippet_candidates(self, content: str, file_path: str) -> List[str]:
+        """Every distinct snippet of a file that could be searched for, in no particular order"""
         snippets = []
         
-        # Normalize and clean content
-        normalized = self.normalizer.normalize_code(content)
-        lines = [line.strip() for line in normalized.split('\n') if line.strip()]
+        # Strip comments and blank lines but keep identifiers: a search for placeholder
+        # names (var0, var1) cannot match anyone's real code
+        cleaned = self.normalizer.remove_comments(content, self._get_language_from_path(file_path) or 'python')
+        lines = [line.strip() for line in cleaned.split('\n') if line.strip()]
         
         if len(lines) < 3:
             return []
         
         # Extract function/class definitions with context
-        function_patterns = [
-            r'^\s*(def|class|function|public\s+class|private\s+class)\s+\w+',
-            r'^\s*(public|private|protected)\s+\w+\s+\w+\s*\(',
-            r'^\s*\w+\s*=\s*function\s*\(',
-        ]
-        
+        definition_re = self.DEFINITION_RE
         for i, line in enumerate(lines):
-            for pattern in function_patterns:
-                if re.match(pattern, line) and len(line) > 20:
-                    # Include some context (2-3 lines)
-                    context_start = max(0, i)
-                    context_end = min(len(lines), i + 3)
-                    context_block = '\n'.join(lines[context_start:context_end])
-                    if len(context_block) >= 40:
-                        snippets.append(context_block)
-                    break
+            if len(line) > 20 and definition_re.match(line):
+                # Include some context (2-3 lines)
+                context_start = max(0, i)
+                context_end = min(len(lines), i + 3)
+                context_block = '\n'.join(lines[context_start:context_end])
+                if len(context_block) >= 40:
+                    snippets.append(context_block)
         
         # Extract algorithm-like blocks (loops, conditionals with logic)
+        control_flow_re = self.CONTROL_FLOW_RE
         for i in range(len(lines) - 2):
-            if re.match(r'^\s*(for|while|if)\s+', lines[i]):
+            if control_flow_re.match(lines[i]):
                 block = '\n'.join(lines[i:i+3])
                 if len(block) > 50 and self._contains_meaningful_logic(block):
                     snippets.append(block)
@@ -816,11 +1303,8 @@ class SimilarityService:
                 not self._is_common_line(line)):
                 snippets.append(line)
         
-        # Remove duplicates and prioritize by quality
-        unique_snippets = list(set(snippets))
-        prioritized = self._prioritize_snippets_by_quality(unique_snippets, file_path)
-        
-        return prioritized[:3]  # Return top 3 quality snippets
+        # Remove duplicates, keeping the order found
+        return list(dict.fromkeys(snippets))
     
     def _prioritize_files_for_analysis(self, files: List[Dict], owner: str, repo: str) -> List[Dict]:
         """Prioritize files based on their likelihood to contain unique code"""
@@ -858,9 +1342,7 @@ class SimilarityService:
         
         for line in lines:
             line = line.strip()
-            if (len(line) > 10 and 
-                not re.match(r'^[{}()\[\]\s]*$', line) and  # Not just brackets
-                not re.match(r'^(import|from|#|//)', line)):   # Not imports or comments
+            if len(line) > 10 and not self.TRIVIAL_LINE_RE.match(line):  # Not brackets, imports or comments
                 meaningful_lines += 1
         
         return meaningful_lines >= 2
@@ -868,49 +1350,36 @@ class SimilarityService:
     def _contains_meaningful_logic(self, block: str) -> bool:
         """Check if code block contains meaningful algorithmic logic"""
         # Look for operators, function calls, assignments
-        logic_patterns = [
-            r'[+\-*/=<>!&|]',  # Operators
-            r'\w+\s*\(',       # Function calls
-            r'\w+\s*\[',       # Array access
-            r'\.(\w+)',       # Method calls
-        ]
-        
-        return any(re.search(pattern, block) for pattern in logic_patterns)
+        return self.MEANINGFUL_LOGIC_RE.search(block) is not None
     
     def _is_algorithmic_line(self, line: str) -> bool:
         """Check if line contains algorithmic content"""
-        algorithmic_patterns = [
-            r'\w+\s*=\s*\w+.*[+\-*/]',  # Calculations
-            r'(sort|filter|map|reduce)\s*\(',  # Data processing
-            r'(if|while|for)\s+.*[<>=!]',  # Control flow with conditions
-            r'\w+\.(append|push|pop|insert)',  # Data structure operations
-        ]
-        
-        return any(re.search(pattern, line) for pattern in algorithmic_patterns)
+        return self.ALGORITHMIC_RE.search(line) is not None
     
     def _prioritize_snippets_by_quality(self, snippets: List[str], file_path: str) -> List[str]:
         """Prioritize snippets by their uniqueness and search potential"""
-        def snippet_quality(snippet):
-            score = 0
-            
-            # Longer snippets are generally more unique
-            score += min(len(snippet) / 20, 5)
-            
-            # Prefer snippets with specific identifiers
-            if re.search(r'\w{6,}', snippet):  # Long identifiers
-                score += 3
-            
-            # Prefer snippets with multiple operators or function calls
-            operators = len(re.findall(r'[+\-*/=<>!&|]', snippet))
-            score += min(operators, 3)
-            
-            # Avoid overly generic snippets
-            if re.search(r'^\s*(print|console\.log|return|if\s+True)', snippet):
-                score -= 2
-            
-            return score
+        return sorted(snippets, key=self._snippet_quality, reverse=True)
+    
+    def _snippet_quality(self, snippet: str) -> float:
+        """Search potential of a snippet; comparable across files"""
+        score = 0
+        
+        # Longer snippets are generally more unique
+        score += min(len(snippet) / 20, 5)
+        
+        # Prefer snippets with specific identifiers
+        if self.LONG_IDENTIFIER_RE.search(snippet):  # Long identifiers
+            score += 3
         
-        return sorted(snippets, key=snippet_quality, reverse=True)
+        # Prefer snippets with multiple operators or function calls
+        operators = len(self.OPERATOR_RE.findall(snippet))
+        score += min(operators, 3)
+        
+        # Avoid overly generic snippets
+        if self.GENERIC_SNIPPET_RE.match(snippet):
+            score -= 2
+        
+        return score
     
     def _calculate_match_confidence(self, snippet: str, result: Dict) -> float:
         """Calculate confidence score for a search result match"""
@@ -986,7 +1455,8 @@ class SimilarityService:
         if not norm1 or not norm2:
             return 0.0
         
-        # Use MinHash for similarity
+        # Use MinHash for similarity (datasketch is imported on first use; it is slow to load)
+        from datasketch import MinHash
         mh1 = MinHash(num_perm=128)
         mh2 = MinHash(num_perm=128)
         
@@ -1007,41 +1477,20 @@ class SimilarityService:
     
     def _create_shingles(self, text: str, k: int) -> List[str]:
         """Create k-shingles from text"""
-        text = re.sub(r'\s+', ' ', text.strip())
+        text = self.WHITESPACE_RE.sub(' ', text.strip())
         return [text[i:i+k] for i in range(len(text) - k + 1)]
     
     def _is_common_block(self, block: str) -> bool:
         """Check if a code block is too common to be useful"""
-        common_patterns = [
-            r'^\s*(import|from)\s+',
-            r'^\s*(def|class)\s+\w+',
-            r'^\s*(if|for|while)\s*',
-            r'^\s*(return|print)\s*',
-            r'^\s*[{}()\[\]]+\s*$',
-        ]
-        
         lines = block.split('\n')
-        common_count = 0
-        for line in lines:
-            for pattern in common_patterns:
-                if re.match(pattern, line.lower()):
-                    common_count += 1
-                    break
+        common_line_re = self.COMMON_BLOCK_LINE_RE
+        common_count = sum(1 for line in lines if common_line_re.match(line))
         
         return common_count >= len(lines) * 0.8  # 80% of lines are common
     
     def _is_common_line(self, line: str) -> bool:
         """Check if a line is too common to be useful for search"""
-        common_patterns = [
-            r'^(import|from)\s+',
-            r'^(def|class)\s+\w+',
-            r'^(if|for|while|try)\s*',
-            r'^(return|print|pass)$',
-            r'^\s*[{}()\[\]]+\s*$',
-            r'^\s*(#|//|\*)',  # Comments
-        ]
-        
-        return any(re.match(pattern, line.lower()) for pattern in common_patterns)
+        return self.COMMON_LINE_RE.match(line) is not None
 
 # ============================================================================
 # SCORING SERVICE
@@ -1060,7 +1509,7 @@ class ScoringService:
         intra_score = intra_repo_analysis.get("score", 0)
         inter_score = inter_repo_analysis.get("score", 0)
         
-        print(f"Component scores - Commit: {commit_score}, Intra: {intra_score}, Inter: {inter_score}")
+        logger.debug('Component scores - Commit: %s, Intra: %s, Inter: %s', commit_score, intra_score, inter_score)
         
         # Calculate weighted final score
         final_score = (
@@ -1201,64 +1650,145 @@ class ScoringService:
 class PlagiarismChecker:
     """Main plagiarism checker orchestrating all services"""
     
-    def __init__(self, github_token: str):
-        self.github_service = GitHubService(github_token)
+    # Results reported for a stage that failed or missed the deadline
+    STAGE_FALLBACKS = {
+        "commit_patterns": {"score": 0, "indicators": ["Commit analysis failed"], "commit_count": 0},
+        "intra_repository_similarity": {"score": 0, "similar_files": [], "file_count": 0},
+        "inter_repository_similarity": {"score": 0, "matches": [], "files_checked": 0, "search_attempts": 0},
+    }
+    
+    def __init__(self, github_token: str, github_api_url: Optional[str] = None):
+        self.github_service = GitHubService(github_token, github_api_url)
         self.commit_analyzer = CommitAnalyzer(self.github_service)
         self.similarity_service = SimilarityService(self.github_service)
         self.scoring_service = ScoringService()
     
-    def check_repository(self, repo_url: str) -> Dict:
-        """Main method to check a repository for plagiarism with enhanced debugging"""
+    STAGES = ("context", "commit_patterns", "intra_repository_similarity",
+              "inter_repository_similarity", "final_assessment")
+    
+    def _run_stages(self, context: AnalysisContext,
+                    progress: Optional[Callable[[str, str], None]] = None) -> Tuple[Dict[str, Dict], Dict[str, float]]:
+        """Run all analysis stages concurrently on the shared context, bounded by its deadline"""
+        owner, repo = context.owner, context.repo
+        stages = {
+            "commit_patterns": lambda: self.commit_analyzer.analyze_commits(owner, repo, context.cancellation,
+                                                                            context.repo_info),
+            "intra_repository_similarity": lambda: self.similarity_service.analyze_intra_repo_similarity(owner, repo, context),
+            "inter_repository_similarity": lambda: self.similarity_service.analyze_inter_repo_similarity(owner, repo, context),
+        }
+        timings = {}
+        timings_lock = threading.Lock()
+        
+        def timed(name, fn):
+            started = time.time()
+            self._report_progress(progress, name, "running")
+            try:
+                with tracing.span(f"plagiarism.{name}"):
+                    return fn()
+            finally:
+                with timings_lock:
+                    timings[name] = round(time.time() - started, 3)
+        
+        stages_started = time.time()
+        executor = ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="plagiarism-stage")
+        futures = {executor.submit(tracing.propagating(timed), name, fn): name for name, fn in stages.items()}
+        done, not_done = wait(futures, timeout=context.time_remaining())
+        if not_done:
+            # Tell stragglers to stop; they observe the token and exit on their own
+            context.cancellation.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Stragglers still write to `timings` when they finish; the report gets a copy in which
+        # stages cut off by the deadline count the time until it
+        with timings_lock:
+            stage_timings = dict(timings)
+        deadline_elapsed = round(time.time() - stages_started, 3)
+        for name in (futures[future] for future in not_done):
+            stage_timings[name] = deadline_elapsed
+        
+        results = {}
+        for future, name in futures.items():
+            if future in not_done:
+                logger.warning('Stage %s did not finish before the analysis deadline', name)
+                results[name] = dict(self.STAGE_FALLBACKS[name], incomplete=True)
+                self._report_progress(progress, name, "incomplete")
+                continue
+            try:
+                results[name] = future.result()
+                status = "incomplete" if results[name].get("incomplete") else "completed"
+            except CheckCancelled:
+                logger.info('Stage %s was cancelled', name)
+                results[name] = dict(self.STAGE_FALLBACKS[name], incomplete=True)
+                status = "incomplete"
+            except Exception as e:
+                logger.exception('Stage %s failed: %s', name, e)
+                results[name] = dict(self.STAGE_FALLBACKS[name])
+                status = "failed"
+            self._report_progress(progress, name, status)
+        return results, stage_timings
+    
+    @staticmethod
+    def _report_progress(progress: Optional[Callable[[str, str], None]], stage: str, status: str):
+        """Forward a stage status change to the caller's progress callback, if any"""
+        if progress is None:
+            return
+        try:
+            progress(stage, status)
+        except Exception as e:
+            logger.warning('Progress callback failed for stage %s: %s', stage, e)
+    
+    def check_repository(self, repo_url: str, cancellation: Optional[CancellationToken] = None,
+                         progress: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Main method to check a repository for plagiarism with enhanced debugging
+        
+        Work stops promptly once ``cancellation`` is cancelled or its deadline passes;
+        the report is then built from whatever finished and marked incomplete.
+        ``progress(stage, status)`` is called as each stage in STAGES starts and ends.
+        """
         try:
             # Parse repository URL
             owner, repo = parse_github_url(repo_url)
-            print(f"Analyzing repository: {owner}/{repo}")
-            
-            # Get basic repository info
-            print("Getting repository information...")
-            repo_info = self.github_service.get_repository_info(owner, repo)
+            logger.info('Analyzing repository: %s/%s', owner, repo)
+            started = time.time()
+            if cancellation is None:
+                cancellation = CancellationToken(Config.ANALYSIS_DEADLINE_SECONDS)
             
-            if not repo_info:
-                raise Exception("Repository not found or inaccessible")
+            # Fetch repository info, tree and file contents once for every stage
+            logger.debug('Getting repository information and contents...')
+            self._report_progress(progress, "context", "running")
+            with tracing.span("plagiarism.context"):
+                context = AnalysisContext.build(self.github_service, owner, repo, cancellation)
+            repo_info = context.repo_info
+            context_seconds = round(time.time() - started, 3)
+            self._report_progress(progress, "context", "incomplete" if context.expired() else "completed")
             
-            print(f"Repository info: {repo_info.get('name', 'N/A')}, Language: {repo_info.get('language', 'N/A')}, Size: {repo_info.get('size', 0)} KB")
+            logger.info('Repository info: %s, Language: %s, Size: %s KB', repo_info.get('name', 'N/A'), repo_info.get('language', 'N/A'), repo_info.get('size', 0))
             
-            # Run all analyses with error handling
-            print("\n=== Running commit analysis ===")
-            try:
-                commit_analysis = self.commit_analyzer.analyze_commits(owner, repo)
-                print(f"Commit analysis completed: {commit_analysis.get('commit_count', 0)} commits, score: {commit_analysis.get('score', 0):.2f}%")
-            except Exception as e:
-                print(f"Commit analysis failed: {e}")
-                commit_analysis = {"score": 0, "indicators": ["Commit analysis failed"], "commit_count": 0}
+            # Run all analyses concurrently with error handling
+            logger.debug('=== Running commit, intra-repo and inter-repo analyses ===')
+            stage_results, stage_timings = self._run_stages(context, progress)
+            stage_timings["context"] = context_seconds
             
-            print("\n=== Running intra-repository similarity analysis ===")
-            try:
-                intra_repo_analysis = self.similarity_service.analyze_intra_repo_similarity(owner, repo)
-                print(f"Intra-repo analysis completed: {intra_repo_analysis.get('file_count', 0)} files, score: {intra_repo_analysis.get('score', 0):.2f}%")
-            except Exception as e:
-                print(f"Intra-repo analysis failed: {e}")
-                import traceback
-                traceback.print_exc()
-                intra_repo_analysis = {"score": 0, "similar_files": [], "file_count": 0}
+            commit_analysis = stage_results["commit_patterns"]
+            intra_repo_analysis = stage_results["intra_repository_similarity"]
+            inter_repo_analysis = stage_results["inter_repository_similarity"]
             
-            print("\n=== Running inter-repository similarity analysis ===")
-            try:
-                inter_repo_analysis = self.similarity_service.analyze_inter_repo_similarity(owner, repo)
-                print(f"Inter-repo analysis completed: {inter_repo_analysis.get('files_checked', 0)} files checked, score: {inter_repo_analysis.get('score', 0):.2f}%")
-            except Exception as e:
-                print(f"Inter-repo analysis failed: {e}")
-                import traceback
-                traceback.print_exc()
-                inter_repo_analysis = {"score": 0, "matches": [], "files_checked": 0, "search_attempts": 0}
+            logger.info('Commit analysis completed: %s commits, score: %.2f%%', commit_analysis.get('commit_count', 0), commit_analysis.get('score', 0))
+            logger.info('Intra-repo analysis completed: %s files, score: %.2f%%', intra_repo_analysis.get('file_count', 0), intra_repo_analysis.get('score', 0))
+            logger.info('Inter-repo analysis completed: %s files checked, score: %.2f%%', inter_repo_analysis.get('files_checked', 0), inter_repo_analysis.get('score', 0))
             
             # Calculate final score
-            print("\n=== Calculating final plagiarism score ===")
+            logger.debug('=== Calculating final plagiarism score ===')
+            self._report_progress(progress, "final_assessment", "running")
             final_analysis = self.scoring_service.calculate_plagiarism_score(
                 commit_analysis, intra_repo_analysis, inter_repo_analysis
             )
+            self._report_progress(progress, "final_assessment", "completed")
             
-            print(f"Final analysis completed: Risk Level: {final_analysis.get('risk_level', 'UNKNOWN')}, Score: {final_analysis.get('final_score', 0):.2f}%")
+            logger.info('Final analysis completed: Risk Level: %s, Score: %.2f%%', final_analysis.get('risk_level', 'UNKNOWN'), final_analysis.get('final_score', 0))
+            
+            incomplete_stages = [name for name, result in stage_results.items() if result.get("incomplete")]
+            if incomplete_stages:
+                logger.warning('Report is incomplete; unfinished stages: %s', ', '.join(incomplete_stages))
             
             return {
                 "repository": {
@@ -1276,86 +1806,21 @@ class PlagiarismChecker:
                     "inter_repository_similarity": inter_repo_analysis,
                     "final_assessment": final_analysis
                 },
+                "stage_timings": stage_timings,
+                "complete": not incomplete_stages,
+                "incomplete_stages": incomplete_stages,
                 "timestamp": datetime.utcnow().isoformat(),
-                "version": "1.1"  # Updated version
+                "version": "1.2"  # Shared context + concurrent stages
             }
             
+        except CheckCancelled:
+            raise
         except Exception as e:
-            print(f"Analysis failed: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Analysis failed: %s', e)
             raise Exception(f"Analysis failed: {str(e)}")
 
-# ============================================================================
-# FLASK ROUTES
-# ============================================================================
-
-# Initialize plagiarism checker
-checker = PlagiarismChecker(Config.GITHUB_TOKEN)
-
-@app.route('/githubrepocheck', methods=['POST'])
-def githubrepocheck():
-    """Main plagiarism check endpoint"""
-    try:
-        # Validate request
-        if not request.is_json:
-            raise BadRequest("Content-Type must be application/json")
-        
-        data = request.get_json()
-        repo_url = data.get('repository_url')
-        
-        if not repo_url:
-            raise BadRequest("repository_url is required")
-        
-        # Validate GitHub URL
-        if 'github.com' not in repo_url:
-            raise BadRequest("Only GitHub repositories are supported")
-        
-        # Run plagiarism check
-        result = checker.check_repository(repo_url)
-        
-        return jsonify({
-            "success": True,
-            "data": result
-        })
-        
-    except ValueError as e:
-        return jsonify({
-            "success": False,
-            "error": "Invalid repository URL",
-            "message": str(e)
-        }), 400
-        
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": "Analysis failed",
-            "message": str(e)
-        }), 500
-
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({
-        "success": False,
-        "error": "Endpoint not found",
-        "message": "Only endpoint is POST /githubrepocheck"
-    }), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({
-        "success": False,
-        "error": "Internal server error",
-        "message": "An unexpected error occurred"
-    }), 500
-
 if __name__ == '__main__':
-    # Check for required environment variables
-    if not Config.GITHUB_TOKEN:
-        print("Warning: GITHUB_TOKEN not set. API rate limits will be severely restricted.")
-        print("Set GITHUB_TOKEN environment variable for better performance.")
-    
-    print("Starting Repository Plagiarism Checker...")
-    print("API endpoint: POST https://thecodeworks.in/hatch/githubrepocheck")
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # The HTTP endpoints live in plagiarism_service.py
+    from plagiarism_service import create_app
+
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
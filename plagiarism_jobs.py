@@ -0,0 +1,383 @@
+"""
+Persistent job queue and worker pool for asynchronous plagiarism checks.
+
+Jobs are stored in a local SQLite database so queued and interrupted work
+survives restarts. The web app only enqueues and reads jobs; the checks run
+on a dedicated worker pool, either in its own process:
+
+    python plagiarism_jobs.py
+
+or, for single-process deployments, on background threads started by the
+app when PLAGIARISM_JOB_WORKERS_INPROCESS=true.
+
+Several pools may share the queue. A claimed job records the claiming pool
+(worker_id) and the pool refreshes updated_at of its running jobs every
+JOB_HEARTBEAT_INTERVAL seconds; only a running job whose heartbeat is older
+than JOB_LEASE_SECONDS is taken back, so a job is never run twice while its
+worker is alive. A job whose worker died JOB_MAX_ATTEMPTS times is failed.
+
+Callback URLs must resolve to public addresses (or to a host listed in
+PLAGIARISM_CALLBACK_HOSTS), checked when the job is queued and again before
+the callback is sent.
+"""
+
+import os
+import json
+import uuid
+import time
+import socket
+import sqlite3
+import logging
+import ipaddress
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("PLAGIARISM_JOBS_DB_PATH", "plagiarism_jobs.db")
+JOB_WORKERS = int(os.getenv("PLAGIARISM_JOB_WORKERS", "2"))
+JOB_TIMEOUT = int(os.getenv("PLAGIARISM_JOB_TIMEOUT", "300"))
+JOB_POLL_INTERVAL = float(os.getenv("PLAGIARISM_JOB_POLL_INTERVAL", "1.0"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("PLAGIARISM_JOB_HEARTBEAT_INTERVAL", "10"))
+JOB_LEASE_SECONDS = float(os.getenv("PLAGIARISM_JOB_LEASE_SECONDS", "60"))  # well above the heartbeat interval
+JOB_MAX_ATTEMPTS = int(os.getenv("PLAGIARISM_JOB_MAX_ATTEMPTS", "3"))
+# Callback hosts allowed even if private; empty: any host resolving to public addresses only
+CALLBACK_HOSTS = {h.strip().lower() for h in os.getenv("PLAGIARISM_CALLBACK_HOSTS", "").split(",") if h.strip()}
+CALLBACK_TIMEOUT = 10
+CALLBACK_ATTEMPTS = 3
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+
+def _now(offset_seconds: float = 0):
+    # Fixed-width timestamps, so stored values compare correctly as strings
+    moment = datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)
+    return moment.isoformat(timespec="microseconds").replace("+00:00", "Z")
+
+
+def callback_url_error(url: str) -> Optional[str]:
+    """Why a callback URL may not be called from inside the network, or None if it may"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return "callback_url must be an http(s) URL"
+    host = parsed.hostname.lower()
+    if host in CALLBACK_HOSTS:
+        return None
+    if CALLBACK_HOSTS:
+        return "callback_url host is not allowed"
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or 443, type=socket.SOCK_STREAM)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        return "callback_url host does not resolve"
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            return "callback_url must resolve to a public address"
+    return None
+
+
+class PlagiarismJobStore:
+    """SQLite-backed queue of plagiarism check jobs, safe to share between processes"""
+
+    def __init__(self, db_path: str = JOBS_DB_PATH):
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plagiarism_jobs (
+                    id TEXT PRIMARY KEY,
+                    repository_url TEXT NOT NULL,
+                    callback_url TEXT,
+                    requested_by TEXT,
+                    status TEXT NOT NULL,
+                    progress TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(plagiarism_jobs)")}
+            if "worker_id" not in columns:  # queue created before leases
+                conn.execute("ALTER TABLE plagiarism_jobs ADD COLUMN worker_id TEXT")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_plagiarism_jobs_status ON plagiarism_jobs (status, created_at)"
+            )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row) -> Dict:
+        return {
+            "jobId": row["id"],
+            "repositoryUrl": row["repository_url"],
+            "callbackUrl": row["callback_url"],
+            "requestedBy": row["requested_by"],
+            "status": row["status"],
+            "progress": json.loads(row["progress"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"],
+        }
+
+    def enqueue(self, repository_url: str, callback_url: Optional[str] = None,
+                requested_by: Optional[str] = None) -> Dict:
+        """Add a new job to the queue and return it"""
+        from plagiarism_checker import PlagiarismChecker
+
+        job_id = str(uuid.uuid4())
+        progress = {stage: "pending" for stage in PlagiarismChecker.STAGES}
+        now = _now()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO plagiarism_jobs (id, repository_url, callback_url, requested_by, status, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, repository_url, callback_url, requested_by, STATUS_QUEUED, json.dumps(progress), now, now)
+            )
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM plagiarism_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_job(row) if row else None
+
+    def claim_next(self, worker_id: str) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running, owned by worker_id, and return it"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._recover_expired(conn)
+            row = conn.execute(
+                "SELECT id FROM plagiarism_jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (STATUS_QUEUED,)
+            ).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE plagiarism_jobs SET status = ?, attempts = attempts + 1, worker_id = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, worker_id, _now(), row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(row["id"])
+
+    def update_progress(self, job_id: str, worker_id: str, stage: str, status: str):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT progress FROM plagiarism_jobs WHERE id = ? AND worker_id = ? AND status = ?",
+                               (job_id, worker_id, STATUS_RUNNING)).fetchone()
+            if row:
+                progress = json.loads(row["progress"])
+                progress[stage] = status
+                conn.execute(
+                    "UPDATE plagiarism_jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(progress), _now(), job_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def finish(self, job_id: str, worker_id: str, status: str, result: Optional[Dict] = None,
+               error: Optional[str] = None) -> bool:
+        """Record the outcome of a running job; False if worker_id no longer owns it"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE plagiarism_jobs SET status = ?, result = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (status, json.dumps(result) if result is not None else None, error, _now(),
+                 job_id, worker_id, STATUS_RUNNING)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def cancel(self, job_id: str) -> bool:
+        """Withdraw a job no worker has claimed yet; False if it is already running or finished"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE plagiarism_jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (STATUS_CANCELLED, _now(), job_id, STATUS_QUEUED)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def heartbeat(self, worker_id: str) -> int:
+        """Extend the lease of every job worker_id is running"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE plagiarism_jobs SET updated_at = ? WHERE status = ? AND worker_id = ?",
+                (_now(), STATUS_RUNNING, worker_id)
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _recover_expired(conn):
+        """Requeue running jobs whose worker stopped heartbeating; fail those out of attempts"""
+        expired_before = _now(-JOB_LEASE_SECONDS)
+        failed = conn.execute(
+            "UPDATE plagiarism_jobs SET status = ?, error = ?, worker_id = NULL, updated_at = ? "
+            "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+            (STATUS_FAILED, "Worker stopped while running this check", _now(),
+             STATUS_RUNNING, expired_before, JOB_MAX_ATTEMPTS)
+        ).rowcount
+        requeued = conn.execute(
+            "UPDATE plagiarism_jobs SET status = ?, worker_id = NULL, updated_at = ? "
+            "WHERE status = ? AND updated_at < ?",
+            (STATUS_QUEUED, _now(), STATUS_RUNNING, expired_before)
+        ).rowcount
+        if failed or requeued:
+            logger.warning("Recovered plagiarism jobs with expired leases: %d requeued, %d failed", requeued, failed)
+
+
+class PlagiarismJobWorkerPool:
+    """Fixed pool of threads that drain the job queue and run plagiarism checks"""
+
+    def __init__(self, store: PlagiarismJobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        # Jobs left running by a crashed worker are requeued by claim_next once their lease expires
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"plagiarism-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="plagiarism-job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logger.info("Started %d plagiarism job workers as %s", self.workers, self.worker_id)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _heartbeat(self):
+        while not self._stop.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                self.store.heartbeat(self.worker_id)
+            except Exception as e:
+                logger.error("Failed to renew plagiarism job leases: %s", str(e))
+
+    def _run(self):
+        from plagiarism_checker import PlagiarismChecker
+
+        checker = PlagiarismChecker(os.getenv("GITHUB_TOKEN", ""))
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim_next(self.worker_id)
+            except Exception as e:
+                logger.error("Failed to claim plagiarism job: %s", str(e))
+                job = None
+            if not job:
+                self._stop.wait(JOB_POLL_INTERVAL)
+                continue
+            self._process(checker, job)
+
+    def _process(self, checker, job: Dict):
+        from plagiarism_checker import CancellationToken, CheckCancelled
+
+        job_id = job["jobId"]
+        logger.info("Running plagiarism job %s for %s", job_id, job["repositoryUrl"])
+
+        def on_progress(stage, status):
+            self.store.update_progress(job_id, self.worker_id, stage, status)
+
+        try:
+            with tracing.start_trace("plagiarism_job"):
+                result = checker.check_repository(job["repositoryUrl"], CancellationToken(JOB_TIMEOUT), on_progress)
+            owned = self.store.finish(job_id, self.worker_id, STATUS_COMPLETED, result=result)
+        except CheckCancelled:
+            owned = self.store.finish(job_id, self.worker_id, STATUS_FAILED, error="Analysis timed out")
+        except Exception as e:
+            logger.error("Plagiarism job %s failed: %s", job_id, str(e))
+            owned = self.store.finish(job_id, self.worker_id, STATUS_FAILED, error=str(e))
+
+        if not owned:
+            # Our lease expired and the job was requeued; its new run reports the outcome
+            logger.warning("Plagiarism job %s was taken over by another worker; result discarded", job_id)
+        elif job.get("callbackUrl"):
+            self._send_callback(self.store.get(job_id))
+
+    @staticmethod
+    def _send_callback(job: Dict):
+        """POST the finished job to its callback URL, retrying transient failures"""
+        payload = {k: job[k] for k in ("jobId", "repositoryUrl", "status", "progress", "result", "error")}
+        for attempt in range(1, CALLBACK_ATTEMPTS + 1):
+            # Checked again at send time: the host may resolve differently than when the job was queued
+            error = callback_url_error(job["callbackUrl"])
+            if error:
+                logger.error("Not sending callback for job %s: %s", job["jobId"], error)
+                return
+            try:
+                response = requests.post(job["callbackUrl"], json=payload, timeout=CALLBACK_TIMEOUT,
+                                         allow_redirects=False)
+                if response.status_code < 500:
+                    return
+                logger.warning("Callback for job %s returned %s", job["jobId"], response.status_code)
+            except requests.exceptions.RequestException as e:
+                logger.warning("Callback for job %s failed (attempt %d): %s", job["jobId"], attempt, str(e))
+            time.sleep(2 ** attempt)
+        logger.error("Giving up on callback for job %s", job["jobId"])
+
+
+if __name__ == "__main__":
+    from logging_config import configure_logging
+
+    configure_logging()
+    pool = PlagiarismJobWorkerPool(PlagiarismJobStore())
+    pool.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop()
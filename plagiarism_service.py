@@ -0,0 +1,283 @@
+"""
+Plagiarism checking as a blueprint and a standalone service.
+
+The main API registers `plagiarism_api` in-process by default. Because the
+checks are CPU-heavy and long-running, the blueprint can also run as its own
+service with its own worker class and count:
+
+    gunicorn -c gunicorn_plagiarism.conf.py 'plagiarism_service:create_app()'
+
+and the API then forwards plagiarism requests to it over local HTTP when
+PLAGIARISM_SERVICE_URL is set (e.g. http://127.0.0.1:5001), so the two can be
+scaled independently. Asynchronous jobs go through the SQLite job queue in
+plagiarism_jobs.py.
+"""
+
+import os
+import time
+import logging
+import threading
+
+from flask import Blueprint, Flask, g, request, jsonify
+
+from auth import token_required
+from json_provider import FastJSONProvider
+from logging_config import configure_logging
+from plagiarism_jobs import PlagiarismJobStore, PlagiarismJobWorkerPool, callback_url_error
+from services import get_service
+import compression
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+plagiarism_api = Blueprint("plagiarism", __name__)
+
+# Plagiarism checks: bounded number in flight, the rest wait in a short queue
+PLAGIARISM_CHECK_TIMEOUT = int(os.getenv("PLAGIARISM_CHECK_TIMEOUT", "180"))
+MAX_CONCURRENT_PLAGIARISM_CHECKS = int(os.getenv("MAX_CONCURRENT_PLAGIARISM_CHECKS", "2"))
+MAX_QUEUED_PLAGIARISM_CHECKS = int(os.getenv("MAX_QUEUED_PLAGIARISM_CHECKS", "8"))
+plagiarism_check_slots = threading.BoundedSemaphore(MAX_CONCURRENT_PLAGIARISM_CHECKS)
+plagiarism_queue_lock = threading.Lock()
+plagiarism_queued = 0
+
+# Asynchronous plagiarism jobs live in a persistent SQLite queue; a separate
+# `python plagiarism_jobs.py` process normally runs them
+PLAGIARISM_JOB_WORKERS_INPROCESS = os.getenv("PLAGIARISM_JOB_WORKERS_INPROCESS", "false").lower() == "true"
+
+
+def get_plagiarism_jobs():
+    return get_service("plagiarism_jobs", PlagiarismJobStore)
+
+
+def get_plagiarism_checker():
+    """Per-process checker; importing plagiarism_checker loads the similarity engine"""
+    from plagiarism_checker import PlagiarismChecker
+
+    github_token = os.getenv('GITHUB_TOKEN', '')
+    if not github_token:
+        logger.warning("No GitHub token provided, analysis may be limited")
+    return get_service("plagiarism_checker", lambda: PlagiarismChecker(github_token))
+
+
+def start_job_workers():
+    """Run the job queue on background threads of this process; later calls reuse the pool"""
+
+    def start():
+        pool = PlagiarismJobWorkerPool(get_plagiarism_jobs())
+        pool.start()
+        return pool
+
+    return get_service("plagiarism_job_workers", start)
+
+
+@plagiarism_api.route("/check-plagiarism", methods=["POST"])
+def check_plagiarism():
+    """Check a GitHub repository for plagiarism"""
+    from plagiarism_checker import CancellationToken, CheckCancelled
+
+    global plagiarism_queued
+    try:
+        data = request.get_json(silent=True) or {}
+        repo_url = data.get('repository_url')
+
+        if not repo_url:
+            return jsonify({"error": "repository_url is required"}), 400
+
+        # Validate GitHub URL
+        if 'github.com' not in repo_url:
+            return jsonify({"error": "Only GitHub repositories are supported"}), 400
+
+        checker = get_plagiarism_checker()
+
+        # One deadline covers both the queue wait and the analysis itself, so no
+        # work outlives the request
+        cancellation = CancellationToken(PLAGIARISM_CHECK_TIMEOUT)
+
+        with plagiarism_queue_lock:
+            if plagiarism_queued >= MAX_QUEUED_PLAGIARISM_CHECKS:
+                return jsonify({
+                    "success": False,
+                    "error": "Plagiarism checker busy",
+                    "message": "Too many plagiarism checks are queued. Please retry shortly."
+                }), 503
+            plagiarism_queued += 1
+        try:
+            acquired = plagiarism_check_slots.acquire(timeout=cancellation.time_remaining())
+        finally:
+            with plagiarism_queue_lock:
+                plagiarism_queued -= 1
+
+        if not acquired:
+            logger.error(f"Plagiarism check timed out waiting for a slot: {repo_url}")
+            return jsonify({
+                "success": False,
+                "error": "Analysis timed out",
+                "message": "The plagiarism checker is busy. Please retry shortly."
+            }), 408
+
+        try:
+            result = checker.check_repository(repo_url, cancellation)
+        except CheckCancelled:
+            logger.error(f"Plagiarism check timed out for repository: {repo_url}")
+            return jsonify({
+                "success": False,
+                "error": "Analysis timed out",
+                "message": "Repository analysis took too long. Try with a smaller repository."
+            }), 408
+        finally:
+            plagiarism_check_slots.release()
+
+        if not result.get("complete", True):
+            logger.warning(f"Plagiarism check for {repo_url} returned a partial report: {result.get('incomplete_stages')}")
+
+        return jsonify({
+            "success": True,
+            "data": result
+        })
+
+    except ValueError as e:
+        logger.error(f"Invalid repository URL: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "Invalid repository URL",
+            "message": str(e)
+        }), 400
+
+    except Exception as e:
+        logger.error(f"Plagiarism check failed: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "Analysis failed",
+            "message": str(e)
+        }), 500
+
+
+@plagiarism_api.route("/githubrepocheck", methods=["POST"])
+def githubrepocheck():
+    """Original standalone check endpoint; same contract as /check-plagiarism"""
+    if not request.is_json:
+        return jsonify({
+            "success": False,
+            "error": "Bad Request",
+            "message": "Content-Type must be application/json"
+        }), 400
+    return check_plagiarism()
+
+
+@plagiarism_api.route("/plagiarism-jobs", methods=["POST"])
+@token_required
+def create_plagiarism_job():
+    """
+    Queue a plagiarism check and return its job id immediately.
+    Expected payload:
+    {
+        "repository_url": "https://github.com/owner/repo",
+        "callback_url": "https://example.com/hook"   // optional, receives the finished job; must be a public host
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    repo_url = data.get("repository_url")
+    callback_url = data.get("callback_url")
+
+    if not repo_url:
+        return jsonify({"error": "repository_url is required"}), 400
+    if 'github.com' not in repo_url:
+        return jsonify({"error": "Only GitHub repositories are supported"}), 400
+    if callback_url:
+        callback_error = callback_url_error(callback_url)
+        if callback_error:
+            return jsonify({"error": callback_error}), 400
+
+    try:
+        job = get_plagiarism_jobs().enqueue(repo_url, callback_url, g.user.get("email"))
+    except Exception as e:
+        logger.error(f"Failed to queue plagiarism job: {str(e)}")
+        return jsonify({"error": "Failed to queue plagiarism check", "details": str(e)}), 500
+
+    return jsonify({
+        "jobId": job["jobId"],
+        "status": job["status"],
+        "progress": job["progress"]
+    }), 202
+
+
+def _requested_by_user(job) -> bool:
+    """Whether the job was queued by the authenticated user; other users' jobs are reported as missing"""
+    email = (g.user.get("email") or "").lower()
+    return bool(job) and bool(email) and (job.get("requestedBy") or "").lower() == email
+
+
+@plagiarism_api.route("/plagiarism-jobs/<job_id>", methods=["GET"])
+@token_required
+def get_plagiarism_job(job_id):
+    """Get status, per-stage progress and (once finished) the report of a plagiarism job"""
+    try:
+        job = get_plagiarism_jobs().get(job_id)
+    except Exception as e:
+        logger.error(f"Failed to read plagiarism job {job_id}: {str(e)}")
+        return jsonify({"error": "Failed to fetch plagiarism job", "details": str(e)}), 500
+
+    if not _requested_by_user(job):
+        return jsonify({"error": "Job not found"}), 404
+
+    job.pop("callbackUrl", None)
+    return jsonify(job), 200
+
+
+@plagiarism_api.route("/plagiarism-jobs/<job_id>", methods=["DELETE"])
+@token_required
+def cancel_plagiarism_job(job_id):
+    """Cancel a queued plagiarism job; a job already running or finished is left as it is (409)"""
+    jobs = get_plagiarism_jobs()
+    try:
+        job = jobs.get(job_id)
+        if not _requested_by_user(job):
+            return jsonify({"error": "Job not found"}), 404
+        if not jobs.cancel(job_id):
+            return jsonify({"error": "Job is no longer queued", "status": jobs.get(job_id)["status"]}), 409
+    except Exception as e:
+        logger.error(f"Failed to cancel plagiarism job {job_id}: {str(e)}")
+        return jsonify({"error": "Failed to cancel plagiarism job", "details": str(e)}), 500
+
+    return jsonify({"jobId": job_id, "status": "cancelled"}), 200
+
+
+# --- Application factory ---
+def create_app():
+    """Build the standalone plagiarism service"""
+    started = time.perf_counter()
+    configure_logging()
+    flask_app = Flask(__name__)
+    flask_app.json = FastJSONProvider(flask_app)
+    metrics.init_app(flask_app)
+    tracing.init_app(flask_app)
+    compression.init_app(flask_app)
+    flask_app.register_blueprint(plagiarism_api)
+
+    @flask_app.errorhandler(404)
+    def not_found(error):
+        return jsonify({
+            "success": False,
+            "error": "Endpoint not found",
+            "message": "Endpoints are POST /check-plagiarism, POST /githubrepocheck and /plagiarism-jobs"
+        }), 404
+
+    @flask_app.errorhandler(500)
+    def internal_error(error):
+        return jsonify({
+            "success": False,
+            "error": "Internal server error",
+            "message": "An unexpected error occurred"
+        }), 500
+
+    if PLAGIARISM_JOB_WORKERS_INPROCESS:
+        start_job_workers()
+
+    if not os.getenv('GITHUB_TOKEN'):
+        logger.warning('GITHUB_TOKEN not set. API rate limits will be severely restricted.')
+    metrics.APP_STARTUP_SECONDS.set(time.perf_counter() - started, phase="create_app")
+    return flask_app
+
+
+if __name__ == "__main__":
+    create_app().run(host="0.0.0.0", port=int(os.getenv("PORT", "5001")), debug=True)
@@ -0,0 +1,45 @@
+"""
+Per-process service clients shared by the API and plagiarism service factories.
+
+Clients are created on first use and once per process (gunicorn forks workers
+after import, and gRPC channels, sqlite handles and HTTP connection pools must
+not cross a fork), so a worker boots without touching Firestore, SMTP or the
+plagiarism engine.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_services = {}
+_services_pid = None
+_services_lock = threading.RLock()
+
+
+def get_service(name, factory):
+    """Return this process's instance of a service, creating it on first use"""
+    global _services_pid
+    pid = os.getpid()
+    if _services_pid == pid and name in _services:
+        return _services[name]
+    with _services_lock:
+        if _services_pid != pid:
+            _services.clear()
+            _services_pid = pid
+        if name not in _services:
+            started = time.perf_counter()
+            _services[name] = factory()
+            logger.info("Initialized %s in %.0f ms", name, (time.perf_counter() - started) * 1000)
+        return _services[name]
+
+
+def cooperative_io():
+    """True when gevent has monkey-patched sockets (e.g. gunicorn -k gevent)"""
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched("socket")
@@ -0,0 +1,178 @@
+"""
+Sponsor registry of a hackathon.
+
+A hackathon's `sponsors` field is a map keyed by the normalized sponsor name
+(trimmed, lowercased), each entry holding the sponsor's name, tier, logo,
+website, showcase and an explicit `order`. Adding or updating a sponsor,
+deactivating or removing its showcase is a field-path update of that one
+entry, and a reorder is one update of the `order` fields, instead of a scan
+of the list and a rewrite of the whole array. API responses still carry
+`sponsors` as a list sorted by `order` (see as_list()).
+
+Hackathons created before the registry have a `sponsors` list, possibly with
+showcases missing `isActive` (read as active). Reads accept both forms and
+never write; the first sponsor change to such a hackathon converts it in the
+same update. All of them are converted at once with:
+
+    python sponsors.py
+
+or once on a background thread at startup when SPONSOR_MIGRATION_INPROCESS=true.
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_INPROCESS = os.getenv("SPONSOR_MIGRATION_INPROCESS", "false").lower() == "true"
+
+
+def sponsor_key(name: str) -> str:
+    return (name or "").strip().lower()
+
+
+def field(*parts: str) -> str:
+    """Field path of an entry (or one of its fields); keys may contain dots or spaces"""
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    return FieldPath("sponsors", *parts).to_api_repr()
+
+
+def registry(sponsors) -> Dict[str, Dict]:
+    """The registry map of a hackathon's `sponsors` field in either form"""
+    if isinstance(sponsors, dict):
+        return sponsors
+    entries = {}
+    for position, sponsor in enumerate(sponsors or []):
+        key = sponsor_key(sponsor.get("name"))
+        if not key or key in entries:
+            logger.warning("Dropping sponsor without a unique name: %r", sponsor.get("name"))
+            continue
+        entry = dict(sponsor, order=position)
+        if "showcase" in entry:
+            entry["showcase"] = dict({"isActive": True}, **entry["showcase"])
+        entries[key] = entry
+    return entries
+
+
+def ordered(entries: Dict[str, Dict]) -> List[str]:
+    """Keys by display order; ties (concurrent adds) by key"""
+    return sorted(entries, key=lambda key: (entries[key].get("order", 0), key))
+
+
+def as_list(sponsors) -> List[Dict]:
+    """Sponsors in display order, as the API returns them"""
+    if is_legacy(sponsors):
+        return [dict(s, showcase=dict({"isActive": True}, **s["showcase"])) if "showcase" in s else s
+                for s in sponsors]
+    entries = sponsors or {}
+    return [{k: v for k, v in entries[key].items() if k != "order"} for key in ordered(entries)]
+
+
+def with_list(hack: Dict) -> Dict:
+    """Copy of a hackathon document with its sponsors as a list"""
+    if "sponsors" in hack:
+        hack = dict(hack, sponsors=as_list(hack["sponsors"]))
+    return hack
+
+
+def is_legacy(sponsors) -> bool:
+    return sponsors is not None and not isinstance(sponsors, dict)
+
+
+def upsert_fields(sponsors, name: str, showcase: Dict, tier: str, logo: str, website: str) -> Dict:
+    """Update fields adding a sponsor, or setting its showcase and any non-empty details"""
+    key = sponsor_key(name)
+    entries = registry(sponsors)
+    if key not in entries:
+        order = max((e.get("order", 0) for e in entries.values()), default=-1) + 1
+        entry = {"name": name, "tier": tier, "logo": logo, "website": website, "showcase": showcase, "order": order}
+        if is_legacy(sponsors):
+            return {"sponsors": dict(entries, **{key: entry})}
+        return {field(key): entry}
+    details = {k: v for k, v in {"showcase": showcase, "tier": tier, "logo": logo, "website": website}.items() if v}
+    if is_legacy(sponsors):
+        return {"sponsors": dict(entries, **{key: dict(entries[key], **details)})}
+    return {field(key, k): v for k, v in details.items()}
+
+
+def showcase_fields(sponsors, name: str, action: str) -> Optional[Dict]:
+    """Update fields removing or deactivating a sponsor's showcase; None if it has none"""
+    from google.cloud.firestore_v1 import DELETE_FIELD
+
+    key = sponsor_key(name)
+    entries = registry(sponsors)
+    if "showcase" not in entries.get(key, {}):
+        return None
+    if is_legacy(sponsors):
+        entry = dict(entries[key])
+        if action == "remove":
+            del entry["showcase"]
+        else:
+            entry["showcase"] = dict(entry["showcase"], isActive=False)
+        return {"sponsors": dict(entries, **{key: entry})}
+    if action == "remove":
+        return {field(key, "showcase"): DELETE_FIELD}
+    return {field(key, "showcase", "isActive"): False}
+
+
+def reorder_fields(sponsors, names: List[str]):
+    """Update fields putting the named sponsors first, in that order, the rest after them as before
+
+    Returns (fields, names in the new order).
+    """
+    entries = registry(sponsors)
+    first = []
+    for name in names:
+        key = sponsor_key(name)
+        if key in entries and key not in first:
+            first.append(key)
+    placed = set(first)
+    keys = first + [key for key in ordered(entries) if key not in placed]
+    new_order = [entries[key].get("name", "") for key in keys]
+    if is_legacy(sponsors):
+        return {"sponsors": {key: dict(entries[key], order=i) for i, key in enumerate(keys)}}, new_order
+    return {field(key, "order"): i for i, key in enumerate(keys)}, new_order
+
+
+def migrate(db) -> int:
+    """Convert every hackathon's sponsors list to the registry; safe to re-run, returns how many"""
+    from google.api_core.exceptions import FailedPrecondition
+
+    migrated = 0
+    for hack_doc in db.collection("hackathons").stream():
+        sponsors = (hack_doc.to_dict() or {}).get("sponsors")
+        if not is_legacy(sponsors):
+            continue
+        try:
+            # Only if the document is unchanged since it was read; a concurrent sponsor change converts it itself
+            hack_doc.reference.update({"sponsors": registry(sponsors)},
+                                      option=db.write_option(last_update_time=hack_doc.update_time))
+        except FailedPrecondition:
+            logger.info("Hackathon %s changed during sponsor migration; skipped", hack_doc.id)
+            continue
+        migrated += 1
+    return migrated
+
+
+def start_migration(db_factory):
+    """Run migrate() once on a background thread"""
+
+    def run():
+        try:
+            migrated = migrate(db_factory())
+            logger.info("Converted sponsors of %d hackathons to the registry", migrated)
+        except Exception as e:
+            logger.error("Sponsor migration failed: %s", str(e))
+
+    threading.Thread(target=run, name="sponsor-migration", daemon=True).start()
+
+
+if __name__ == "__main__":
+    from logging_config import configure_logging
+    from app import get_db
+
+    configure_logging()
+    logger.info("Converted sponsors of %d hackathons to the registry", migrate(get_db()))
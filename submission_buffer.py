@@ -0,0 +1,144 @@
+"""
+Write coalescing for submission saves.
+
+Near a phase deadline teams autosave over and over. Instead of committing
+every save on its own, POST /submissions hands the save to this process's
+SubmissionBuffer and waits. A single flusher thread collects saves for
+SUBMISSION_COALESCE_MS, keeps only the newest one per (hackCode, teamId,
+phaseId), and writes them all with submission_log.write_versions(): one
+pointer read and one atomic batch for up to SUBMISSION_FLUSH_MAX_SAVES teams.
+Every waiting request is answered only after that commit succeeds, so an
+acknowledged save is durable; a save replaced by a newer one in the same
+window is acknowledged with the version that was written instead. If the
+group commit fails, each save is retried in a batch of its own, so one bad
+save fails only its own requests.
+
+With SUBMISSION_BUFFER_READS=true, reads of a team's latest submissions in
+this process also see saves still waiting for their flush.
+
+SUBMISSION_COALESCE_MS=0 turns coalescing off and every save is written on
+its own.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import metrics
+import submission_log
+
+logger = logging.getLogger(__name__)
+
+COALESCE_SECONDS = float(os.getenv("SUBMISSION_COALESCE_MS", "250")) / 1000.0
+# Each save is a version create plus a pointer write; Firestore allows 500 writes per batch
+FLUSH_MAX_SAVES = min(int(os.getenv("SUBMISSION_FLUSH_MAX_SAVES", "200")), 250)
+FLUSH_TIMEOUT = float(os.getenv("SUBMISSION_FLUSH_TIMEOUT", "15"))
+BUFFER_READS = os.getenv("SUBMISSION_BUFFER_READS", "false").lower() == "true"
+
+
+class SaveNotConfirmed(Exception):
+    """The save was not confirmed as written before the timeout (it may still land)"""
+
+
+class _PendingSave:
+    def __init__(self, hack_code: str, version: Dict):
+        self.hack_code = hack_code
+        self.version = version
+        self.done = threading.Event()
+        self.error = None
+
+
+class SubmissionBuffer:
+    """Per-process group commit of submission saves"""
+
+    def __init__(self, db_factory, window: float = COALESCE_SECONDS, max_saves: int = FLUSH_MAX_SAVES):
+        self.db_factory = db_factory
+        self.window = window
+        self.max_saves = max_saves
+        self._pending = {}  # (hackCode, teamId, phaseId) -> [newest version, waiters]
+        self._cond = threading.Condition()
+        self._flusher = None
+
+    def save(self, hack_code: str, team_id: str, phase_id, content: Dict,
+             submitted_by: Optional[str] = None, timeout: float = FLUSH_TIMEOUT) -> Dict:
+        """Queue a save and block until the version covering it is committed; returns that version"""
+        version = submission_log.new_version(team_id, phase_id, content, submitted_by)
+        if self.window <= 0:
+            submission_log.write_versions(self.db_factory(), [(hack_code, version)])
+            metrics.SUBMISSION_SAVES.inc(result="written")
+            return version
+
+        waiter = _PendingSave(hack_code, version)
+        key = (hack_code, team_id, submission_log.phase_key(phase_id))
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [version, [waiter]]
+            else:
+                entry[0] = version
+                entry[1].append(waiter)
+            self._ensure_flusher()
+            self._cond.notify()
+
+        if not waiter.done.wait(timeout):
+            raise SaveNotConfirmed(f"Submission for team {team_id} phase {phase_id} not confirmed in {timeout}s")
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.version
+
+    def pending(self, hack_code: str, team_id: str) -> List[Dict]:
+        """Saves of a team waiting to be flushed (read-your-writes)"""
+        with self._cond:
+            return [entry[0] for (code, team, _), entry in self._pending.items()
+                    if code == hack_code and team == team_id]
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run, name="submission-flush", daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Let the window fill before taking everything collected so far
+            time.sleep(self.window)
+            with self._cond:
+                pending, self._pending = self._pending, {}
+            entries = list(pending.items())
+            for i in range(0, len(entries), self.max_saves):
+                self._flush(entries[i:i + self.max_saves])
+
+    def _flush(self, entries):
+        saves = [(key[0], version) for key, (version, _) in entries]
+        db = self.db_factory()
+        try:
+            submission_log.write_versions(db, saves)
+            errors = [None] * len(saves)
+        except Exception as e:
+            if len(saves) == 1:
+                logger.error("Failed to write buffered submission: %s", str(e))
+                errors = [e]
+            else:
+                logger.error("Failed to write %d buffered submissions, retrying each alone: %s", len(saves), str(e))
+                errors = [self._write_alone(db, save) for save in saves]
+        for (_, (version, waiters)), error in zip(entries, errors):
+            metrics.SUBMISSION_SAVES.inc(result="failed" if error else "written")
+            if len(waiters) > 1 and not error:
+                metrics.SUBMISSION_SAVES.inc(len(waiters) - 1, result="coalesced")
+            for waiter in waiters:
+                waiter.version = version
+                waiter.error = error
+                waiter.done.set()
+
+    @staticmethod
+    def _write_alone(db, save) -> Optional[Exception]:
+        try:
+            submission_log.write_versions(db, [save])
+            return None
+        except Exception as e:
+            logger.error("Failed to write submission of team %s: %s", save[1]["teamId"], str(e))
+            return e
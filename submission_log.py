@@ -0,0 +1,187 @@
+"""
+Append-only submission history with a pointer to each team's latest version.
+
+Every save of a team's deliverables for a phase adds a version document
+
+    hackathons/{hackCode}/submissionLog/{teamId}_{phaseId}/versions/{versionId}
+
+and, in the same batch, replaces the content of the phase's pointer document
+
+    hackathons/{hackCode}/latestSubmissions/{teamId}_{phaseId}
+
+so a save is two small writes instead of a rewrite of the hackathon's whole
+registrations array, and earlier versions are kept. Version ids sort by save
+time, and a pointer only ever moves to a newer version. Judges' scores are
+stored on the pointer too.
+
+Teams inside the hackathon document still carry the submissions saved before
+the log existed; overlay_latest() merges the pointers into them so readers keep
+seeing one `submissions` list per team.
+"""
+
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+LATEST_COLLECTION = "latestSubmissions"
+LOG_COLLECTION = "submissionLog"
+VERSIONS_COLLECTION = "versions"
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+WRITE_ATTEMPTS = 3
+
+# Pointer fields replaced by a save; "score" is left alone so re-submitting keeps the grade
+CONTENT_FIELDS = ["teamId", "phaseId", "submissions", "versionId", "submittedAt", "submittedBy"]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def new_version_id() -> str:
+    """Time-ordered id; the suffix keeps two saves in the same microsecond apart"""
+    return f"{time.time_ns() // 1000:017d}-{uuid.uuid4().hex[:6]}"
+
+
+def phase_key(phase_id) -> str:
+    """Document-id form of a phase id, so 1 and "1" are the same phase"""
+    try:
+        return str(int(phase_id))
+    except (TypeError, ValueError):
+        return str(phase_id)
+
+
+def latest_collection(db, hack_code: str):
+    return db.collection("hackathons").document(hack_code).collection(LATEST_COLLECTION)
+
+
+def latest_ref(db, hack_code: str, team_id: str, phase_id):
+    return latest_collection(db, hack_code).document(f"{team_id}_{phase_key(phase_id)}")
+
+
+def versions_collection(db, hack_code: str, team_id: str, phase_id):
+    return (db.collection("hackathons").document(hack_code)
+            .collection(LOG_COLLECTION).document(f"{team_id}_{phase_key(phase_id)}")
+            .collection(VERSIONS_COLLECTION))
+
+
+def new_version(team_id: str, phase_id, content: Dict, submitted_by: Optional[str] = None) -> Dict:
+    return {
+        "teamId": team_id,
+        "phaseId": phase_id,
+        "versionId": new_version_id(),
+        "submissions": content,
+        "submittedAt": _now(),
+        "submittedBy": submitted_by,
+    }
+
+
+def write_versions(db, saves: List[Tuple[str, Dict]], attempts: int = WRITE_ATTEMPTS):
+    """
+    Append (hackCode, version) pairs and move their latest pointers, in one
+    read and one atomic batch. A pointer already holding a newer version (saved
+    through another process) is left alone, and a pointer that changes between
+    the read and the commit makes the batch retry, so the newest save always wins.
+    Several saves of one pointer all get their version, the pointer the newest.
+    """
+    from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+    newest = {}  # pointer path -> (ref, version)
+    for hack_code, version in saves:
+        ref = latest_ref(db, hack_code, version["teamId"], version["phaseId"])
+        if ref.path not in newest or newest[ref.path][1]["versionId"] < version["versionId"]:
+            newest[ref.path] = (ref, version)
+    for attempt in range(1, attempts + 1):
+        pointers = metrics.get_all(db, [ref for ref, _ in newest.values()])
+        batch = db.batch()
+        for hack_code, version in saves:
+            batch.create(versions_collection(db, hack_code, version["teamId"], version["phaseId"])
+                         .document(version["versionId"]), version)
+        for (ref, version), pointer in zip(newest.values(), pointers):
+            if not pointer.exists:
+                batch.create(ref, version)
+            elif (pointer.to_dict().get("versionId") or "") < version["versionId"]:
+                batch.update(ref, {field: version[field] for field in CONTENT_FIELDS},
+                             option=db.write_option(last_update_time=pointer.update_time))
+        try:
+            metrics.commit(batch, f"{LOG_COLLECTION},{LATEST_COLLECTION}")
+            return
+        except (AlreadyExists, FailedPrecondition):
+            # Version ids are unique, so only a pointer raced us; read it again
+            if attempt == attempts:
+                raise
+
+
+def record_submission(db, hack_code: str, team_id: str, phase_id, content: Dict,
+                      submitted_by: Optional[str] = None) -> Dict:
+    """Append a version and point the phase's latest entry at it, atomically"""
+    version = new_version(team_id, phase_id, content, submitted_by)
+    write_versions(db, [(hack_code, version)])
+    return version
+
+
+def record_score(db, hack_code: str, team_id: str, phase_id, score):
+    latest_ref(db, hack_code, team_id, phase_id).set(
+        {"teamId": team_id, "phaseId": phase_id, "score": score}, merge=["teamId", "phaseId", "score"])
+
+
+def team_latest(db, hack_code: str, team_id: str) -> List[Dict]:
+    """Latest pointer of every phase the team has saved, one query"""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    query = latest_collection(db, hack_code).where(filter=FieldFilter("teamId", "==", team_id))
+    return [snapshot.to_dict() for snapshot in metrics.stream(query, LATEST_COLLECTION)]
+
+
+def history(db, hack_code: str, team_id: str, phase_id, limit: int = HISTORY_PAGE_SIZE,
+            before: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Versions of one phase, newest first; returns the page and the cursor for the next one"""
+    from google.cloud.firestore_v1 import Query
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    query = versions_collection(db, hack_code, team_id, phase_id).order_by(
+        FieldPath.document_id(), direction=Query.DESCENDING)
+    if before:
+        query = query.start_after({FieldPath.document_id(): before})
+    # One extra row tells whether another page exists
+    versions = [snapshot.to_dict() for snapshot in metrics.stream(query.limit(limit + 1), VERSIONS_COLLECTION)]
+    next_cursor = versions[limit - 1]["versionId"] if len(versions) > limit else None
+    return versions[:limit], next_cursor
+
+
+def merge_entries(entries: List[Dict], pointers: List[Dict]) -> List[Dict]:
+    """Overlay latest pointers on a team's embedded submission entries (in place)"""
+    by_phase = {phase_key(entry.get("phaseId")): entry for entry in entries}
+    for pointer in pointers:
+        entry = by_phase.get(phase_key(pointer.get("phaseId")))
+        if entry is None:
+            entry = {"phaseId": pointer.get("phaseId")}
+            by_phase[phase_key(entry["phaseId"])] = entry
+            entries.append(entry)
+        for field in ("submissions", "score", "versionId", "submittedAt"):
+            if field in pointer:
+                entry[field] = pointer[field]
+    return entries
+
+
+def latest_snapshots(db, hack_code: str) -> List:
+    """Every latest pointer of a hackathon, one query"""
+    return list(metrics.stream(latest_collection(db, hack_code), LATEST_COLLECTION))
+
+
+def overlay_latest(db, hack_code: str, hack: Dict, snapshots: Optional[List] = None) -> Dict:
+    """Merge every team's latest submissions and scores into hack["registrations"]"""
+    pointers = {}
+    for snapshot in snapshots if snapshots is not None else latest_snapshots(db, hack_code):
+        pointer = snapshot.to_dict()
+        pointers.setdefault(pointer.get("teamId"), []).append(pointer)
+    if pointers:
+        for team in hack.get("registrations", []):
+            team_pointers = pointers.get(team.get("teamId"))
+            if team_pointers:
+                team["submissions"] = merge_entries(list(team.get("submissions") or []), team_pointers)
+    return hack
@@ -0,0 +1,272 @@
+"""
+Lightweight per-request tracing.
+
+Every request gets a trace id (g.trace_id, echoed in X-Trace-Id). Code wraps
+slow calls in ``span(...)``; spans nest through context variables, so work
+submitted with ``propagating(...)`` to other threads stays in the same trace.
+Finished traces are exported off the request path:
+
+    TRACING_EXPORT=jsonl   TRACING_JSONL_PATH=traces.jsonl
+    TRACING_EXPORT=otlp    TRACING_OTLP_ENDPOINT=http://localhost:4318/v1/traces
+    TRACING_SERVER_TIMING=true   adds a Server-Timing header summarizing spans
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import requests
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORT = os.getenv("TRACING_EXPORT", "").lower()
+TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "traces.jsonl")
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACING_SERVER_TIMING = os.getenv("TRACING_SERVER_TIMING", "false").lower() == "true"
+SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "hatch-api")
+MAX_SPANS_PER_TRACE = 2000
+
+TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span_id = contextvars.ContextVar("current_span_id", default=None)
+
+
+class Trace:
+    """Spans collected for one request or background job"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.parent_span_id = parent_span_id
+        self.spans: List[Dict] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total duration and count per span name"""
+        totals = OrderedDict()
+        with self._lock:
+            for span in self.spans:
+                duration, count = totals.get(span["name"], (0.0, 0))
+                totals[span["name"]] = (duration + span["durationMs"], count + 1)
+        return ", ".join(
+            f'{re.sub(r"[^A-Za-z0-9_.-]", "_", name)};desc="x{count}";dur={duration:.1f}'
+            for name, (duration, count) in totals.items()
+        )
+
+
+def _new_span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def traceparent() -> Optional[str]:
+    """W3C traceparent header continuing the current span in another service"""
+    trace = _current_trace.get()
+    span_id = _current_span_id.get()
+    if trace is None or span_id is None:
+        return None
+    return f"00-{trace.trace_id}-{span_id}-01"
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a child of the current span; a no-op outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield attributes
+        return
+    span_id = _new_span_id()
+    parent_id = _current_span_id.get()
+    token = _current_span_id.set(span_id)
+    started_wall = time.time()
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException as e:
+        status = "error"
+        attributes.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        _current_span_id.reset(token)
+        trace.add({
+            "traceId": trace.trace_id,
+            "spanId": span_id,
+            "parentSpanId": parent_id,
+            "name": name,
+            "start": started_wall,
+            "durationMs": round((time.perf_counter() - started) * 1000, 3),
+            "status": status,
+            "attributes": attributes,
+        })
+
+
+@contextmanager
+def start_trace(name: str, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None):
+    """Collect spans for a unit of work (used for background jobs) and export them at the end"""
+    trace = Trace(name, trace_id, parent_span_id)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span_id.set(parent_span_id)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current_span_id.reset(span_token)
+        _current_trace.reset(trace_token)
+        export(trace)
+
+
+def propagating(fn: Callable) -> Callable:
+    """Bind fn to the caller's trace context so it can run on another thread"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+# --- Export ---
+_export_queue = queue.SimpleQueue()
+_exporter_lock = threading.Lock()
+_exporter_pid = None
+
+
+def _to_otlp(trace: Trace) -> Dict:
+    def attribute(key, value):
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    spans = []
+    for s in trace.spans:
+        start_ns = int(s["start"] * 1e9)
+        spans.append({
+            "traceId": s["traceId"],
+            "spanId": s["spanId"],
+            "parentSpanId": s["parentSpanId"] or "",
+            "name": s["name"],
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(s["durationMs"] * 1e6)),
+            "status": {"code": 2 if s["status"] == "error" else 1},
+            "attributes": [attribute(k, v) for k, v in s["attributes"].items()],
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [attribute("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": "hatch.tracing"}, "spans": spans}],
+    }]}
+
+
+def _write(trace: Trace):
+    if TRACING_EXPORT == "jsonl":
+        with open(TRACING_JSONL_PATH, "a") as f:
+            for s in trace.spans:
+                f.write(json.dumps(s, default=str) + "\n")
+    elif TRACING_EXPORT == "otlp":
+        requests.post(TRACING_OTLP_ENDPOINT, json=_to_otlp(trace), timeout=5)
+
+
+def _run_exporter():
+    while True:
+        trace = _export_queue.get()
+        try:
+            _write(trace)
+        except Exception as e:
+            logger.warning("Trace export failed for %s: %s", trace.trace_id, e)
+
+
+def _drain():
+    while True:
+        try:
+            trace = _export_queue.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            _write(trace)
+        except Exception as e:
+            logger.warning("Trace export failed for %s: %s", trace.trace_id, e)
+
+
+def export(trace: Trace):
+    """Hand a finished trace to the background exporter"""
+    global _exporter_pid
+    if not TRACING_EXPORT or not trace.spans:
+        return
+    if _exporter_pid != os.getpid():
+        with _exporter_lock:
+            if _exporter_pid != os.getpid():
+                threading.Thread(target=_run_exporter, name="trace-exporter", daemon=True).start()
+                if _exporter_pid is None:
+                    atexit.register(_drain)
+                _exporter_pid = os.getpid()
+    _export_queue.put(trace)
+
+
+# --- Flask integration ---
+def init_app(app):
+    """Start a trace for every request and expose its id"""
+
+    @app.before_request
+    def _start_request_trace():
+        trace_id, parent_span_id = None, None
+        match = TRACEPARENT_RE.match(request.headers.get("traceparent", ""))
+        if match:
+            trace_id, parent_span_id = match.groups()
+        trace = Trace(f"{request.method} {request.path}", trace_id, parent_span_id)
+        g.trace_id = trace.trace_id
+        g.trace = trace
+        g.trace_tokens = (_current_trace.set(trace), _current_span_id.set(parent_span_id))
+        root = span(trace.name, method=request.method, path=request.path)
+        root.__enter__()
+        g.trace_root = root
+
+    @app.after_request
+    def _add_trace_headers(response):
+        trace = g.get("trace")
+        if trace is not None:
+            response.headers["X-Trace-Id"] = trace.trace_id
+            if TRACING_SERVER_TIMING:
+                timing = trace.server_timing()
+                if timing:
+                    response.headers["Server-Timing"] = timing
+        return response
+
+    @app.teardown_request
+    def _finish_request_trace(exc):
+        root = g.pop("trace_root", None)
+        trace = g.pop("trace", None)
+        tokens = g.pop("trace_tokens", None)
+        if root is None:
+            return
+        if exc is not None:
+            root.__exit__(type(exc), exc, exc.__traceback__)
+        else:
+            root.__exit__(None, None, None)
+        if tokens is not None:
+            _current_span_id.reset(tokens[1])
+            _current_trace.reset(tokens[0])
+        export(trace)
@@ -0,0 +1,13 @@
+"""
+WSGI entry point of the API:
+
+    gunicorn wsgi:app
+    gunicorn -c gunicorn_gevent.conf.py wsgi:app
+
+Importing this module builds the app once; app.py itself only defines the
+create_app() factory.
+"""
+
+from app import create_app
+
+app = create_app()